@@ -0,0 +1,31 @@
+import os
+import uvicorn
+from dotenv import load_dotenv
+from masumi_agent_server import create_host_app, setup_logging
+from masumi_agent_server.host import parse_agents
+
+# Configure logging
+logger = setup_logging()
+
+# Load environment variables
+load_dotenv(override=True)
+
+# Agents served by this process, as "prefix=directory" pairs
+DEFAULT_AGENTS = ",".join([
+    "seo=../crewai_seo_agent",
+    "pr-writer=../crewai-pr-writer-agent",
+    "coding-tutorial=../crewai-coding-tutorial-agent",
+    "meeting=../crewai_meeting_agent",
+])
+# Relative directories are resolved against this file, not the working directory
+here = os.path.dirname(os.path.abspath(__file__))
+agents = {
+    prefix: os.path.join(here, path)
+    for prefix, path in parse_agents(os.getenv("HOSTED_AGENTS", DEFAULT_AGENTS)).items()
+}
+logger.info(f"Hosting agents: {agents}")
+
+app = create_host_app(agents)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
@@ -0,0 +1,42 @@
+import os
+import httpx
+from dotenv import load_dotenv
+from masumi_agent_server import get_logger, get_search_cache
+
+load_dotenv()
+
+logger = get_logger(__name__)
+
+SERPER_URL = "https://google.serper.dev/search"
+
+
+def search_websites(query: str, num_results: int = 5) -> list[str]:
+    """
+    Searches the web for tutorials on `query` through Serper
+
+    Repeat queries are answered from the shared search cache instead of
+    the API.
+
+    Args:
+        query: Programming topic entered by the user
+        num_results: Number of result URLs to return
+
+    Returns:
+        The URLs of the top organic results
+    """
+    search = {"q": f"{query} tutorial", "num": num_results}
+
+    def fetch():
+        response = httpx.post(
+            SERPER_URL,
+            json=search,
+            headers={"X-API-KEY": os.getenv("SERPER_API_KEY", ""), "Content-Type": "application/json"},
+            timeout=15
+        )
+        response.raise_for_status()
+        return response.json()
+
+    results = get_search_cache().get_or_fetch(search, fetch)
+    links = [item["link"] for item in results.get("organic", []) if item.get("link")]
+    logger.info(f"Found {len(links)} websites for: {query}")
+    return links
@@ -1,5 +1,5 @@
 from crewai import Agent, Crew, Task
-from logging_config import get_logger
+from masumi_agent_server import get_logger
 from pydantic import BaseModel
 from tools.scrapflyscraper import WebScraper
 from tools.contacttool import ContactScraper
@@ -1,7 +1,71 @@
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlparse
 from crewai import Agent, Crew, Task
-from logging_config import get_logger
+from masumi_agent_server import get_logger
 from pydantic import BaseModel
-from tools.scrapflyscraper import WebScraper
+from tools.scrapflyscraper import WebScraper, scrape_page
+
+# Regex matches that are asset names or tracking addresses rather than contacts
+_NON_CONTACT_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.js', '.css')
+_NON_CONTACT_DOMAINS = ('example.com', 'sentry.io', 'wixpress.com', 'domain.com', 'email.com')
+
+# Signs of a blog or news page, which the validator task skips; such pages are left to the LLM
+_EDITORIAL_OG_TYPES = ('article', 'blog', 'news', 'newsarticle')
+_EDITORIAL_PATH_SEGMENTS = {'blog', 'blogs', 'news', 'article', 'articles', 'post', 'posts', 'press',
+                            'magazine', 'stories', 'insights'}
+_EDITORIAL_SUBDOMAINS = ('blog.', 'news.', 'press.')
+_EDITORIAL_DOMAINS = ('medium.com', 'substack.com', 'wordpress.com', 'blogspot.com', 'tumblr.com',
+                      'forbes.com', 'techcrunch.com', 'businessinsider.com', 'reuters.com', 'bloomberg.com',
+                      'theverge.com', 'wired.com', 'venturebeat.com', 'nytimes.com', 'bbc.co.uk', 'cnn.com')
+# /2024/05/... style permalinks
+_DATED_PATH = re.compile(r'/(19|20)\d{2}/\d{1,2}/')
+
+# How many URLs were resolved by the pre-filter ("fast_path") or needed the LLM ("llm")
+_path_counts = Counter()
+_path_lock = threading.Lock()
+
+def get_validation_counts() -> dict:
+    """Returns how many URLs took each validation path since startup"""
+    with _path_lock:
+        return dict(_path_counts)
+
+def _count_path(path: str, job_counts: Counter | None) -> None:
+    with _path_lock:
+        _path_counts[path] += 1
+        if job_counts is not None:
+            job_counts[path] += 1
+
+def plausible_emails(emails) -> list[str]:
+    """Drops regex matches that are not real contact addresses (image names, placeholders, trackers)"""
+    plausible = []
+    for email in emails:
+        email = email.strip('.').lower()
+        domain = email.rsplit('@', 1)[-1]
+        tld = domain.rsplit('.', 1)[-1]
+        if email.endswith(_NON_CONTACT_SUFFIXES) or domain in _NON_CONTACT_DOMAINS or not tld.isalpha():
+            continue
+        plausible.append(email)
+    return sorted(set(plausible))
+
+def looks_editorial(url: str, page: dict) -> bool:
+    """Whether the URL or its page looks like a blog post or news story rather than a company site"""
+    if page.get("og_type", "") in _EDITORIAL_OG_TYPES:
+        return True
+    for candidate in (url, page.get("canonical", "")):
+        if not candidate:
+            continue
+        parts = urlparse(candidate)
+        host = parts.netloc.lower().removeprefix("www.")
+        if host.startswith(_EDITORIAL_SUBDOMAINS):
+            return True
+        if any(host == domain or host.endswith("." + domain) for domain in _EDITORIAL_DOMAINS):
+            return True
+        path = parts.path.lower()
+        if _DATED_PATH.search(path) or _EDITORIAL_PATH_SEGMENTS.intersection(path.split("/")):
+            return True
+    return False
 
 
 
@@ -46,4 +110,48 @@ class ValidatorCrew():
         )
         self.logger.info("Crew setup completed")
         return crew
+
+    def resolve_without_llm(self, url: str) -> dict | None:
+        """
+        Builds the validator result straight from the scraped page
+
+        Only trivially resolvable pages qualify: the page declares a
+        canonical URL and exactly one plausible contact email, and neither
+        the URL nor the page look like a blog or news site, which the
+        validator task skips. Anything else is ambiguous and returns None
+        so the LLM decides.
+        """
+        try:
+            page = scrape_page(url)
+        except Exception as e:
+            self.logger.warning(f"Pre-filter could not scrape {url}: {str(e)}")
+            return None
+        if looks_editorial(url, page):
+            return None
+        emails = plausible_emails(page["emails"])
+        if not page["canonical"] or len(emails) != 1:
+            return None
+        domain = urlparse(page["canonical"]).netloc.lower().removeprefix("www.")
+        if "." not in domain:
+            return None
+        return {"result": domain, "canonical": page["canonical"], "email": emails[0]}
+
+    def validate(self, url: str, job_counts: Counter = None):
+        """
+        Returns the company domain, canonical URL and contact email for a URL
+
+        Tries the deterministic pre-filter first and only kicks off the
+        validator crew for pages it cannot resolve on its own.
+
+        Args:
+            url: Search result URL
+            job_counts: Optional Counter that also records which path this URL took
+        """
+        output = self.resolve_without_llm(url)
+        if output is not None:
+            _count_path("fast_path", job_counts)
+            self.logger.info(f"Resolved {url} without the LLM")
+            return output
+        _count_path("llm", job_counts)
+        return self.crew.kickoff(inputs={"text": url})
     
@@ -1,20 +1,17 @@
 import os
 import uvicorn
-import uuid
+import threading
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, HTTPException
-from pydantic import BaseModel
-from masumi_crewai.config import Config
-from masumi_crewai.payment import Payment, Amount
+from masumi_agent_server import MasumiAgent, create_app, report_progress, setup_logging
 from crews.crew_definition import ResearchCrew
 from crews.crunchbase_definition import CrunchbaseCrew
 from crews.validator_definition import ValidatorCrew
 from crews.contact_definition import ContactCrew
-from logging_config import setup_logging
-import botocore
-import boto3
-import uuid
-from datetime import datetime
+from result_upload import StreamingResultUpload, get_result_store, result_url
 
 # Configure logging
 logger = setup_logging()
@@ -22,343 +19,133 @@ logger = setup_logging()
 # Load environment variables
 load_dotenv(override=True)
 
-# Retrieve API Keys and URLs
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
-PAYMENT_API_KEY = os.getenv("PAYMENT_API_KEY")
-NETWORK = os.getenv("NETWORK")
-
 logger.info("Starting application with configuration:")
-logger.info(f"PAYMENT_SERVICE_URL: {PAYMENT_SERVICE_URL}")
-
-# Initialize FastAPI
-app = FastAPI(
-    title="API following the Masumi API Standard",
-    description="API for running Agentic Services tasks with Masumi payment integration",
-    version="1.0.0"
-)
+logger.info(f"PAYMENT_SERVICE_URL: {os.getenv('PAYMENT_SERVICE_URL')}")
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Temporary in-memory job store (DO NOT USE IN PRODUCTION)
+# CrewAI Task Execution
 # ─────────────────────────────────────────────────────────────────────────────
-jobs = {}
-payment_instances = {}
+# Per-stage fan-out of the enrichment pipeline (concurrent crew kickoffs per stage)
+STAGE_CONCURRENCY = {
+    "validator": int(os.getenv("VALIDATOR_CONCURRENCY", "8")),
+    "crunchbase": int(os.getenv("CRUNCHBASE_CONCURRENCY", "4")),
+    "contact": int(os.getenv("CONTACT_CONCURRENCY", "4")),
+}
+
+# Crew instances are not safe to kick off from several threads at once,
+# so every pipeline thread builds its own set and reuses it for later URLs
+_thread_crews = threading.local()
+
+def get_thread_crews() -> tuple:
+    if not hasattr(_thread_crews, "crews"):
+        _thread_crews.crews = (
+            ValidatorCrew(logger=logger),
+            CrunchbaseCrew(logger=logger),
+            ContactCrew(logger=logger),
+        )
+    return _thread_crews.crews
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Initialize Masumi Payment Config
-# ─────────────────────────────────────────────────────────────────────────────
-config = Config(
-    payment_service_url=PAYMENT_SERVICE_URL,
-    payment_api_key=PAYMENT_API_KEY
-)
+def enrich_company(url: str, prompt: str, stage_limits: dict, path_counts: Counter) -> str:
+    """
+    Runs one URL through the validator, crunchbase and contact stages
 
-# ─────────────────────────────────────────────────────────────────────────────
-# Pydantic Models
-# ─────────────────────────────────────────────────────────────────────────────
-class StartJobRequest(BaseModel):
-    identifier_from_purchaser: str
-    input_data: dict[str, str]
-    
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "identifier_from_purchaser": "example_purchaser_123",
-                "input_data": {
-                    "text": "AI companies in USA using .com after 2000-01-01 and before 2025-06-25",
-                }
-            }
-        }
+    Each stage holds its own semaphore, so a URL moves on to the next stage
+    as soon as its previous one finished instead of waiting for every
+    other URL.
 
-class ProvideInputRequest(BaseModel):
-    job_id: str
+    Returns:
+        The contact email found for the company (or the last stage's answer)
+    """
+    validator, crunchbase, contact_finder = get_thread_crews()
 
-# ─────────────────────────────────────────────────────────────────────────────
-# CrewAI Task Execution
-# ─────────────────────────────────────────────────────────────────────────────
+    with stage_limits["validator"]:
+        output = validator.validate(url, path_counts)
+    email = output["email"]
+    if 'www.' in output["canonical"] and url != output["canonical"][:-1]:
+        canonical = output["canonical"]
+    else:
+        canonical = ""
+
+    target = url
+    if "@" not in email:
+        with stage_limits["crunchbase"]:
+            crunchbase_contact = crunchbase.crew.kickoff(inputs={"text": url, "canonical": canonical, "prompt": prompt, "email": email})
+        email = crunchbase_contact["result"]
+        target = canonical
+
+    if "@" not in email:
+        with stage_limits["contact"]:
+            contact_url = contact_finder.crew.kickoff(inputs={"text": target})
+        email = contact_url["contact"]
 
-async def execute_crew_task(query: str) -> str:
-    """ Execute a CrewAI task with Research and Writing Agents using data from a CSV file """
+    return email
+
+def run_crew(input_data: dict) -> str:
+    """ Execute a CrewAI task with Research and Writing Agents (called from a worker) """
+    query = input_data["text"]
     logger.info(f"Starting CrewAI task with query: {query}")
 
     researcher = ResearchCrew(logger=logger)
-    validator = ValidatorCrew(logger=logger)
-    crunchbase = CrunchbaseCrew(logger=logger)
-    contact_finder = ContactCrew(logger=logger)
     date = datetime.now().strftime("%Y%m%d_%H%M%S")
     links = researcher.crew.kickoff(inputs={"text": query})
-    result = links["result"]
+    urls = links["result"]
     prompt = links["prompt"]
 
-    names =[]
-    urls = []
-    emails = []
-    canonical = []
-
-    for url in result:
-        output = validator.crew.kickoff(inputs={"text":url})
-        names.append(output["result"])
-        emails.append(output["email"])
-        if 'www.' in output["canonical"] and url != output["canonical"][:-1]:
-            canonical.append(output["canonical"])
-        else:
-            canonical.append("")
-        urls.append(url)
-        
-    for i in range(len(result)):
-        if "@" not in emails[i]:
-            crunchbase_contact = crunchbase.crew.kickoff(inputs={"text":result[i],"canonical":canonical[i],"prompt":prompt,"email":emails[i]})
-            emails[i] = crunchbase_contact["result"]
-            result[i] = canonical[i]
+    # Enough threads to keep every stage at its limit
+    stage_limits = {stage: threading.BoundedSemaphore(limit) for stage, limit in STAGE_CONCURRENCY.items()}
+    max_workers = max(1, min(len(urls), sum(STAGE_CONCURRENCY.values())))
+    logger.info(f"Enriching {len(urls)} companies with stage limits {STAGE_CONCURRENCY}")
+    path_counts = Counter()
 
-    for i in range(len(result)):
-        if "@" not in emails[i]:
-            contact_url = contact_finder.crew.kickoff(inputs={"text":result[i]})
-            emails[i] = contact_url["contact"]
-
-    
-    # If result is a CSV string, save it directly
+    # Each company is streamed to the result object as soon as it is enriched
     filename = f"{query}_company_list_{date}.csv"
-    with open(filename, "w", encoding="utf-8") as f:
-        for url, email in zip(urls, emails):
-            f.write(f"{url} - {email}\n")
-
-
-    # Upload to S3/Spaces
-    session = boto3.session.Session()
-    client = session.client(
-        's3',
-        endpoint_url=os.getenv('DO_SPACE_ENDPOINT'),
-        config=botocore.config.Config(s3={'addressing_style': 'virtual'}),
-        region_name=os.getenv('DO_SPACE_REGION'),
-        aws_access_key_id=os.getenv('DO_SPACE_KEY'),
-        aws_secret_access_key=os.getenv('DO_SPACE_SECRET')
-    )
-
-    with open(filename, "rb") as f:
-        client.put_object(
-            Bucket='crewai-outreach-list',
-            Key=filename,
-            Body=f,
-            ACL='public-read',
-            ContentType='text/csv'
-        )
-
-    logger.info("CrewAI task completed successfully")
-    download_url = f'https://crewai-outreach-list.{os.getenv("SPACES_REGION")}.digitaloceanspaces.com/{filename}'
-    return download_url
-    
-    
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 1) Start Job (MIP-003: /start_job)
-# ─────────────────────────────────────────────────────────────────────────────
-
-@app.post("/start_job")
-async def start_job(data: StartJobRequest):
-    """ Initiates a job and creates a payment request """
-    print(f"Received data: {data}")
-    print(f"Received data.input_data: {data.input_data}")
-    try:
-        job_id = str(uuid.uuid4())
-        agent_identifier = os.getenv("AGENT_IDENTIFIER")
-        
-        # Log the input text (truncate if too long)
-        input_text = data.input_data["text"]
-        truncated_input = input_text[:100] + "..." if len(input_text) > 100 else input_text
-        logger.info(f"Received job request with input: '{truncated_input}'")
-        logger.info(f"Starting job {job_id} with agent {agent_identifier}")
-
-        # Define payment amounts
-        payment_amount = os.getenv("PAYMENT_AMOUNT", "10000000")  # Default 10 ADA
-        payment_unit = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
-
-        amounts = [Amount(amount=payment_amount, unit=payment_unit)]
-        logger.info(f"Using payment amount: {payment_amount} {payment_unit}")
-        
-        # Create a payment request using Masumi
-        payment = Payment(
-            agent_identifier=agent_identifier,
-            #amounts=amounts,
-            config=config,
-            identifier_from_purchaser=data.identifier_from_purchaser,
-            input_data=data.input_data,
-            network=NETWORK
-        )
-        
-        logger.info("Creating payment request...")
-        payment_request = await payment.create_payment_request()
-        payment_id = payment_request["data"]["blockchainIdentifier"]
-        payment.payment_ids.add(payment_id)
-        logger.info(f"Created payment request with ID: {payment_id}")
-
-        # Store job info (Awaiting payment)
-        jobs[job_id] = {
-            "status": "awaiting_payment",
-            "payment_status": "pending",
-            "payment_id": payment_id,
-            "input_data": data.input_data,
-            "result": None,
-            "identifier_from_purchaser": data.identifier_from_purchaser
-        }
-
-        async def payment_callback(payment_id: str):
-            await handle_payment_status(job_id, payment_id)
-
-        # Start monitoring the payment status
-        payment_instances[job_id] = payment
-        logger.info(f"Starting payment status monitoring for job {job_id}")
-        await payment.start_status_monitoring(payment_callback)
-
-        # Return the response in the required format
-        return {
-            "status": "success",
-            "job_id": job_id,
-            "blockchainIdentifier": payment_request["data"]["blockchainIdentifier"],
-            "submitResultTime": payment_request["data"]["submitResultTime"],
-            "unlockTime": payment_request["data"]["unlockTime"],
-            "externalDisputeUnlockTime": payment_request["data"]["externalDisputeUnlockTime"],
-            "agentIdentifier": agent_identifier,
-            "sellerVkey": os.getenv("SELLER_VKEY"),
-            "identifierFromPurchaser": data.identifier_from_purchaser,
-            "amounts": amounts,
-            "input_hash": payment.input_hash
+    upload = StreamingResultUpload(get_result_store().client, filename,
+                                   partial_interval=float(os.getenv("PARTIAL_RESULT_INTERVAL", "30")))
+    with upload, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="company-enrich") as pool:
+        # Each task runs in a copy of the job's context, so its retries count against the job's budget
+        futures = {
+            pool.submit(contextvars.copy_context().run, enrich_company, url, prompt, stage_limits, path_counts): url
+            for url in urls
         }
-    except KeyError as e:
-        logger.error(f"Missing required field in request: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Bad Request: If input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-    except Exception as e:
-        logger.error(f"Error in start_job: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 2) Process Payment and Execute AI Task
-# ─────────────────────────────────────────────────────────────────────────────
-async def handle_payment_status(job_id: str, payment_id: str) -> None:
-    """ Executes CrewAI task after payment confirmation """
-    try:
-        logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
-        
-        # Update job status to running
-        jobs[job_id]["status"] = "running"
-        logger.info(f"Input data: {jobs[job_id]["input_data"]}")
-
-        # Execute the AI task
-        result = await execute_crew_task(jobs[job_id]["input_data"])
-        result_dict = result.json_dict
-        logger.info(f"Crew task completed for job {job_id}")
-        
-        # Mark payment as completed on Masumi
-        # Use a shorter string for the result hash
-        await payment_instances[job_id].complete_payment(payment_id, result_dict)
-        logger.info(f"Payment completed for job {job_id}")
-
-        # Update job status
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["payment_status"] = "completed"
-        jobs[job_id]["result"] = result
-
-        # Stop monitoring payment status
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-    except Exception as e:
-        logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
-        
-        # Still stop monitoring to prevent repeated failures
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 3) Check Job and Payment Status (MIP-003: /status)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/status")
-async def get_status(job_id: str):
-    """ Retrieves the current status of a specific job """
-    logger.info(f"Checking status for job {job_id}")
-    if job_id not in jobs:
-        logger.warning(f"Job {job_id} not found")
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    job = jobs[job_id]
-
-    # Check latest payment status if payment instance exists
-    if job_id in payment_instances:
-        try:
-            status = await payment_instances[job_id].check_payment_status()
-            job["payment_status"] = status.get("data", {}).get("status")
-            logger.info(f"Updated payment status for job {job_id}: {job['payment_status']}")
-        except ValueError as e:
-            logger.warning(f"Error checking payment status: {str(e)}")
-            job["payment_status"] = "unknown"
-        except Exception as e:
-            logger.error(f"Error checking payment status: {str(e)}", exc_info=True)
-            job["payment_status"] = "error"
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                line = f"{url} - {future.result()}"
+            except Exception as e:
+                # One company failing must not throw away the others
+                logger.error(f"Enriching {url} failed: {str(e)}", exc_info=True)
+                path_counts["error"] += 1
+                line = f"{url} - error: {str(e)}"
+            if upload.write_line(line):
+                report_progress(partial_result_url=result_url(upload.partial_key),
+                                companies_done=upload.lines_written, companies_total=len(urls))
+    logger.info(f"Validation paths for this job: fast_path={path_counts['fast_path']}, llm={path_counts['llm']}, "
+                f"failed companies: {path_counts['error']}")
 
-
-    result_data = job.get("result")
-    result = result_data.raw if result_data and hasattr(result_data, "raw") else None
-
-    return {
-        "job_id": job_id,
-        "status": job["status"],
-        "payment_status": job["payment_status"],
-        "result": result
-    }
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 4) Check Server Availability (MIP-003: /availability)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/availability")
-async def check_availability():
-    """ Checks if the server is operational """
-
-    return {"status": "available", "type": "masumi-agent", "message": "Server operational."}
-    # Commented out for simplicity sake but its recommended to include the agentIdentifier
-    #return {"status": "available","agentIdentifier": os.getenv("AGENT_IDENTIFIER"), "message": "The server is running smoothly."}
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 5) Retrieve Input Schema (MIP-003: /input_schema)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/input_schema")
-async def input_schema():
-    """
-    Returns the expected input schema for the /start_job endpoint.
-    Fulfills MIP-003 /input_schema endpoint.
-    """
-    return {
-        "input_data": [
-            {
-                "id": "text",
-                "type": "string",
-                "name": "Task Description",
-                "data": {
-                    "description": "The text input for the AI task",
-                    "placeholder": "Enter your task description here"
-                }
+    logger.info("CrewAI task completed successfully")
+    return result_url(filename)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Agent Registration (endpoints are provided by masumi_agent_server)
+# ─────────────────────────────────────────────────────────────────────────────
+agent = MasumiAgent(
+    name="company-finder",
+    run=run_crew,
+    input_schema=[
+        {
+            "id": "text",
+            "type": "string",
+            "name": "Task Description",
+            "data": {
+                "description": "The text input for the AI task",
+                "placeholder": "Enter your task description here"
             }
-        ]
-    }
+        }
+    ],
+    example_input={"text": "AI companies in USA using .com after 2000-01-01 and before 2025-06-25"}
+)
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 6) Health Check
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/health")
-async def health():
-    """
-    Returns the health of the server.
-    """
-    return {
-        "status": "healthy"
-    }
+app = create_app(agent)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main Logic if Called as a Script
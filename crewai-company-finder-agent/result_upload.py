@@ -0,0 +1,189 @@
+import io
+import os
+import time
+import logging
+import tempfile
+import threading
+from masumi_agent_server import get_object_store
+
+logger = logging.getLogger(__name__)
+
+RESULT_BUCKET = 'crewai-outreach-list'
+
+# S3 rejects multipart parts below 5 MiB, except for the last one
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+def get_result_store():
+    """Returns the process-wide client of the DigitalOcean Space holding the result lists"""
+    return get_object_store("DO_SPACE")
+
+
+def result_url(key: str) -> str:
+    """Returns the download URL of an object in the result bucket"""
+    return get_result_store().download_url(RESULT_BUCKET, key)
+
+
+class _SpoolSlice(io.RawIOBase):
+    """
+    Read-only view of the first `length` bytes of a file
+
+    Reads with os.pread, so the writers' file position is never moved and
+    the lines appended while the slice is being uploaded are not part of it.
+    """
+
+    def __init__(self, file, length: int):
+        self._fd = file.fileno()
+        self._length = length
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._length}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._length - self._position)
+        if size <= 0:
+            return 0
+        data = os.pread(self._fd, size, self._position)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+class StreamingResultUpload:
+    """
+    Streams result lines to an object while the job is still running
+
+    Lines are sent to the final object through a multipart upload as soon as
+    a 5 MiB part is full, so memory use does not grow with the number of
+    results. Multipart objects only become readable once completed, so the
+    lines written so far are also published as a separate partial object at
+    most every `partial_interval` seconds, streamed from a temporary file on
+    disk. Partial uploads run outside the lock, one at a time, and only read
+    the bytes written when they started, so writers are not held up by them
+    and the file is never loaded into memory. The partial object is deleted
+    once the final one is complete; on error the multipart upload is aborted
+    and the partial object deleted as well.
+
+    Use it as a context manager. Safe to write from several threads.
+
+    Args:
+        client: S3 client
+        key: Object key of the final result
+        partial_key: Object key of the partial result (default: "partial/" + key)
+        partial_interval: Minimum seconds between two partial uploads
+    """
+
+    def __init__(self, client, key: str, partial_key: str = None, partial_interval: float = 30):
+        self.client = client
+        self.key = key
+        self.partial_key = partial_key or f"partial/{key}"
+        self.partial_interval = partial_interval
+        self.lines_written = 0
+        self._upload_id = None
+        self._parts = []
+        self._part = io.BytesIO()
+        self._spool = None
+        self._last_partial = 0
+        self._lock = threading.Lock()
+        # Set while no partial upload is in flight
+        self._partial_idle = threading.Event()
+        self._partial_idle.set()
+
+    def __enter__(self) -> "StreamingResultUpload":
+        self._upload_id = self.client.create_multipart_upload(
+            Bucket=RESULT_BUCKET, Key=self.key, ACL='public-read', ContentType='text/csv'
+        )["UploadId"]
+        self._spool = tempfile.TemporaryFile()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                self._complete()
+            else:
+                self._abort()
+        finally:
+            self._spool.close()
+
+    def write_line(self, line: str) -> bool:
+        """
+        Appends a line to the result
+
+        Returns:
+            True if the partial object was refreshed with this line
+        """
+        data = (line + "\n").encode("utf-8")
+        with self._lock:
+            self._part.write(data)
+            self._spool.write(data)
+            self.lines_written += 1
+            if self._part.tell() >= MIN_PART_SIZE:
+                self._upload_part()
+            if time.monotonic() - self._last_partial < self.partial_interval or not self._partial_idle.is_set():
+                return False
+            self._partial_idle.clear()
+            self._last_partial = time.monotonic()
+            self._spool.flush()
+            length = self._spool.tell()
+        self._publish_partial(length)
+        return True
+
+    def _upload_part(self) -> None:
+        part_number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=RESULT_BUCKET, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=self._part.getvalue()
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._part = io.BytesIO()
+
+    def _publish_partial(self, length: int) -> None:
+        """Uploads the first `length` bytes of the spool file as the partial object"""
+        try:
+            self.client.put_object(
+                Bucket=RESULT_BUCKET, Key=self.partial_key, Body=_SpoolSlice(self._spool, length),
+                ContentLength=length, ACL='public-read', ContentType='text/csv'
+            )
+        except Exception as e:
+            # Partial results are a convenience, the final upload must go on
+            logger.warning(f"Could not publish partial result {self.partial_key}: {str(e)}")
+        finally:
+            self._partial_idle.set()
+
+    def _complete(self) -> None:
+        # A partial upload still in flight would recreate the partial object after its deletion
+        self._partial_idle.wait()
+        with self._lock:
+            # The last (or only) part may be smaller than 5 MiB, even empty
+            if self._part.tell() or not self._parts:
+                self._upload_part()
+            self.client.complete_multipart_upload(
+                Bucket=RESULT_BUCKET, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts}
+            )
+            if self._last_partial:
+                self.client.delete_object(Bucket=RESULT_BUCKET, Key=self.partial_key)
+
+    def _abort(self) -> None:
+        try:
+            self.client.abort_multipart_upload(Bucket=RESULT_BUCKET, Key=self.key, UploadId=self._upload_id)
+        finally:
+            # Wait for a partial upload in flight, it would recreate the object after its deletion
+            self._partial_idle.wait()
+            if self._last_partial:
+                try:
+                    self.client.delete_object(Bucket=RESULT_BUCKET, Key=self.partial_key)
+                except Exception as e:
+                    logger.warning(f"Could not delete partial result {self.partial_key}: {str(e)}")
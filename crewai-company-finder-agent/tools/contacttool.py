@@ -1,8 +1,6 @@
 from crewai.tools import BaseTool
 from dotenv import load_dotenv
-import http.client
-import json
-import os
+from tools.serper_client import get_serper_client
 
 load_dotenv()
 
@@ -12,22 +10,10 @@ class ContactScraper(BaseTool):
 
     def _run(self, url:str) -> list[dict]:
 
-        conn = http.client.HTTPSConnection("google.serper.dev")
-     
-        payload = json.dumps({
+        result = get_serper_client().search_sync({
         "q": f"{url} \"contact\" \"email\"",
         "num": 10})
 
-        headers = {
-        'X-API-KEY': os.getenv("SERPER_API_KEY"),
-        'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/search", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-
-
-        result = json.loads(data.decode("utf-8"))
         links = [item['link'] for item in result.get("organic", [])]
 
         return links
@@ -1,8 +1,6 @@
 from crewai.tools import BaseTool
 from dotenv import load_dotenv
-import http.client
-import json
-import os
+from tools.serper_client import get_serper_client
 
 load_dotenv()
 
@@ -12,23 +10,10 @@ class CrunchbaseSearch(BaseTool):
 
     def _run(self, domain: str,canonical:str,prompt:str) -> list[dict]:
 
-        conn = http.client.HTTPSConnection("google.serper.dev")
-
-      
-        payload = json.dumps({
+        result = get_serper_client().search_sync({
         "q": f"{domain} {canonical} {prompt} \"contact\" \"email\" site:crunchbase.com",
         "num": 10})
 
-        headers = {
-        'X-API-KEY': os.getenv("SERPER_API_KEY"),
-        'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/search", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-
-
-        result = json.loads(data.decode("utf-8"))
         snippets = [item.get("snippet", "") for item in result.get("organic", [])]
 
         return snippets
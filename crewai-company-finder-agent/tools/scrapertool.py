@@ -1,8 +1,6 @@
 from crewai.tools import BaseTool
 from dotenv import load_dotenv
-import http.client
-import json
-import os
+from tools.serper_client import get_serper_client
 
 load_dotenv()
 
@@ -12,27 +10,16 @@ class Scraper(BaseTool):
 
     def _run(self, url: str,country: str,domain_list:list,after:str,before:str) -> list[dict]:
 
-        conn = http.client.HTTPSConnection("google.serper.dev")
         domains = ""
         for domain in domain_list:
             domains += str(domain)
             if domain != domain_list[-1]:
                 domains += " OR "
-        payload = json.dumps({
+        result = get_serper_client().search_sync({
         "q": f"{url} (\"About Us\" OR \"Our Company\") site:*{domains} -site:forbes.com -site:nytimes.com -site:mckinsey.com -site:cnn.com -site:medium.com -site:linkedin.com -site:twitter.com -site:facebook.com -site:youtube.com -site:reddit.com -site:quora.com -inurl:blog -inurl:blogs -inurl:article -inurl:insights after:{after} before:{before}",
         "gl": country,
         "num": 100})
 
-        headers = {
-        'X-API-KEY': os.getenv("SERPER_API_KEY"),
-        'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/search", payload, headers)
-        res = conn.getresponse()
-        data = res.read()
-
-
-        result = json.loads(data.decode("utf-8"))
         links = [item['link'] for item in result.get("organic", [])]
 
         return links
@@ -4,50 +4,130 @@ import requests
 from bs4 import BeautifulSoup
 import os
 import re
+from functools import lru_cache
+from masumi_agent_server import CachedPage, get_page_cache, CircuitOpenError, get_retry_policy
 
 load_dotenv()
 key = os.getenv("SCRAPE_KEY")
 
-class WebScraper(BaseTool):
-    name: str = "scrapfly content extractor"
-    description: str = "Extract all visible, readable text from a web page using Scrapfly."
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+')
+
+# Render options the company finder scrapes with, part of the page cache key
+SCRAPFLY_OPTIONS = {"renderer": "scrapfly", "render_js": True, "country": "us"}
+
+SCRAPFLY_HOST = "api.scrapfly.io"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Seconds a Scrapfly request may take, JavaScript rendering included
+SCRAPFLY_TIMEOUT = float(os.getenv("SCRAPFLY_TIMEOUT", "90"))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Connection errors, timeouts, throttling and server errors are worth another attempt"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def fetch_page(url: str) -> CachedPage:
+    """
+    Renders a page through Scrapfly, answering repeat requests from the shared page cache
+
+    Failed scrapes are retried under the shared "scrapfly" retry policy.
+    """
+    def scrape():
+        response = requests.get(f"https://{SCRAPFLY_HOST}/scrape", params={
+            "url": url, "country": "us", "render_js": "true", "key": key
+        }, timeout=SCRAPFLY_TIMEOUT)
+        # Failed scrapes raise so they are not cached
+        response.raise_for_status()
+        return response
+
+    def fetch():
+        response = get_retry_policy("scrapfly").call(SCRAPFLY_HOST, scrape, retryable=is_retryable)
+        result = response.json().get('result', {})
+        headers = {name.lower(): value for name, value in (result.get('response_headers') or {}).items()}
+        return CachedPage(
+            result.get('content', ''),
+            status_code=result.get('status_code', response.status_code),
+            etag=headers.get('etag'),
+            last_modified=headers.get('last-modified')
+        )
+
+    return get_page_cache().get_or_fetch(url, fetch, SCRAPFLY_OPTIONS)
 
-    def _run(self, url: str) -> str:
-        # Compose the Scrapfly API URL
-        api_url = f"https://api.scrapfly.io/scrape?url={url}&country=us&render_js=true&key={key}"
-        response = requests.get(api_url)
-        data = response.json()
-        html = data.get('result', {}).get('content', '')
 
-        # 1. Extract all email addresses from the raw HTML
-        email_pattern = r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+'
-        emails = set(re.findall(email_pattern, html))
+def scrape_page(url: str) -> dict:
+    """
+    Scrapes a page through Scrapfly and extracts what the validator needs
 
-        soup = BeautifulSoup(html, 'html.parser')
+    The render is shared with later jobs through the page cache.
 
-        # 2. Extract canonical URL
-        canonical_url = ""
-        canonical_tag = soup.find('link', rel='canonical')
-        if canonical_tag and canonical_tag.get('href'):
-            canonical_url = canonical_tag.get('href')
+    Returns:
+        dict with "canonical" and "og_type" (may be empty), "emails" (sorted tuple) and "text"
 
-        # 3. Remove script, style, and other non-visible elements
-        for tag in soup(['script', 'style', 'noscript', 'header', 'footer', 'svg', 'form', 'nav', 'meta', 'link']):
-            tag.decompose()
+    Raises:
+        requests.RequestException: The scrape failed
+        CircuitOpenError: Scrapfly's circuit is open
+    """
+    return parse_page(fetch_page(url).html)
 
-        # 4. Get all visible text
-        text = soup.get_text(separator='\n', strip=True)
 
-        # 5. Clean up excessive blank lines
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        clean_text = '\n'.join(lines)
+@lru_cache(maxsize=64)
+def parse_page(html: str) -> dict:
+    """
+    Extracts the canonical URL, og:type, emails and visible text of a page
+
+    Cached by content, so the deterministic pre-filter and a following LLM
+    validation of the same page only parse it once, while a page the page
+    cache refreshed is parsed again.
+    """
+    # 1. Extract all email addresses from the raw HTML
+    emails = set(EMAIL_PATTERN.findall(html))
+
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # 2. Extract canonical URL
+    canonical_url = ""
+    canonical_tag = soup.find('link', rel='canonical')
+    if canonical_tag and canonical_tag.get('href'):
+        canonical_url = canonical_tag.get('href')
+
+    # Open Graph type, "article" on blog posts and news stories
+    og_type_tag = soup.find('meta', attrs={'property': 'og:type'})
+    og_type = (og_type_tag.get('content') or '').strip().lower() if og_type_tag else ''
+
+    # 3. Remove script, style, and other non-visible elements
+    for tag in soup(['script', 'style', 'noscript', 'header', 'footer', 'svg', 'form', 'nav', 'meta', 'link']):
+        tag.decompose()
+
+    # 4. Get all visible text
+    text = soup.get_text(separator='\n', strip=True)
+
+    # 5. Clean up excessive blank lines
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+    return {"canonical": canonical_url, "og_type": og_type, "emails": tuple(sorted(emails)), "text": '\n'.join(lines)}
+
+
+class WebScraper(BaseTool):
+    name: str = "scrapfly content extractor"
+    description: str = "Extract all visible, readable text from a web page using Scrapfly."
+
+    def _run(self, url: str) -> str:
+        try:
+            page = scrape_page(url)
+        except (requests.RequestException, CircuitOpenError) as e:
+            return f"Error: could not scrape {url}: {str(e)}"
+        clean_text = page["text"]
 
-        # 6. Add canonical URL at the top if found
-        if canonical_url:
-            clean_text = f"[Canonical URL: {canonical_url}]\n\n{clean_text}"
+        # Add canonical URL at the top if found
+        if page["canonical"]:
+            clean_text = f"[Canonical URL: {page['canonical']}]\n\n{clean_text}"
 
-        # 7. Append found emails at the end (or handle as you wish)
-        if emails:
-            clean_text += "\n\n[Extracted Emails]\n" + "\n".join(sorted(emails))
+        # Append found emails at the end (or handle as you wish)
+        if page["emails"]:
+            clean_text += "\n\n[Extracted Emails]\n" + "\n".join(page["emails"])
 
-        return clean_text
\ No newline at end of file
+        return clean_text
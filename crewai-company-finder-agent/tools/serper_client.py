@@ -0,0 +1,192 @@
+import os
+import asyncio
+import logging
+import threading
+import httpx
+from dotenv import load_dotenv
+from masumi_agent_server import SearchCache, get_search_cache, RetryableError, CircuitOpenError, get_retry_policy
+from masumi_agent_server.progress import as_job, current_job_id
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SERPER_HOST = "google.serper.dev"
+SERPER_URL = f"https://{SERPER_HOST}/search"
+
+# Serper accepts up to 100 queries in one batched request
+MAX_BATCH_SIZE = 100
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+class SerperClient:
+    """
+    Pooled async client for the Serper search API
+
+    All searches of the process share one httpx.AsyncClient, so hundreds of
+    queries per job reuse a handful of keep-alive (HTTP/2 when `h2` is
+    installed) connections. Results are cached by normalized query, so a
+    question asked before is answered without an API call. Queries submitted
+    at about the same time (e.g. by parallel pipeline threads) are sent as
+    one batched request. Requests time out, and 429/5xx responses and
+    connection errors are retried under the shared "serper" retry policy
+    (jittered exponential backoff, circuit breaker, per-job retry budget).
+
+    The client runs on its own event loop thread; the crew tools are
+    synchronous and call search_sync() from worker threads.
+
+    Args:
+        api_key: Serper API key (default: SERPER_API_KEY)
+        timeout: Seconds per request (default: SERPER_TIMEOUT or 15)
+        max_retries: Retries after the first attempt (default: SERPER_MAX_RETRIES or 3)
+        max_connections: Pool size (default: SERPER_MAX_CONNECTIONS or 10)
+        batch_window: Seconds to collect concurrent queries into one batched request,
+                      0 to send each query on its own (default: SERPER_BATCH_WINDOW or 0.05)
+        cache: Search result cache consulted before each request, None to always ask Serper
+    """
+
+    def __init__(self, api_key: str = None, timeout: float = None, max_retries: int = None,
+                 max_connections: int = None, batch_window: float = None, cache: SearchCache = None):
+        self.api_key = api_key or os.getenv("SERPER_API_KEY")
+        self.timeout = timeout or float(os.getenv("SERPER_TIMEOUT", "15"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("SERPER_MAX_RETRIES", "3"))
+        self.max_connections = max_connections or int(os.getenv("SERPER_MAX_CONNECTIONS", "10"))
+        self.batch_window = batch_window if batch_window is not None else float(os.getenv("SERPER_BATCH_WINDOW", "0.05"))
+        self.cache = cache
+        self._client = None
+        self._loop = None
+        self._pending = []
+        self._flush_handle = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="serper-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created on the client's own loop, the first time a request runs there
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={"X-API-KEY": self.api_key or "", "Content-Type": "application/json"}
+            )
+        return self._client
+
+    async def _post(self, payload):
+        async def attempt():
+            try:
+                response = await self._get_client().post(SERPER_URL, json=payload)
+            except httpx.TransportError as e:
+                raise RetryableError(f"{type(e).__name__}: {str(e)}") from e
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f"HTTP {response.status_code}", response.headers.get("retry-after"))
+            response.raise_for_status()
+            return response.json()
+
+        try:
+            return await get_retry_policy("serper").acall(SERPER_HOST, attempt, max_attempts=self.max_retries + 1)
+        except (RetryableError, CircuitOpenError) as e:
+            raise RuntimeError(f"Serper search failed: {str(e)}") from e
+
+    async def _search(self, query: dict) -> dict:
+        # Runs on the client's loop; the cache may hit SQLite, so it is read and
+        # written on worker threads to keep the batcher's loop responsive
+        cached = await asyncio.to_thread(self.cache.get, query) if self.cache else None
+        if cached is not None:
+            return cached
+        result = await self._submit(query)
+        if self.cache:
+            await asyncio.to_thread(self.cache.put, query, result)
+        return result
+
+    async def _submit(self, query: dict) -> dict:
+        # Queries arriving within batch_window are coalesced into one batched request
+        if self.batch_window <= 0:
+            return await self._post(query)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= MAX_BATCH_SIZE:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            asyncio.get_running_loop().create_task(self._send_batch(pending))
+
+    async def _send_batch(self, pending: list) -> None:
+        try:
+            if len(pending) == 1:
+                results = [await self._post(pending[0][0])]
+            else:
+                results = await self._post([query for query, _ in pending])
+            for (_, future), result in zip(pending, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _search_all(self, queries: list[dict]) -> list[dict]:
+        return list(await asyncio.gather(*(self._search(query) for query in queries)))
+
+    def _run(self, coro):
+        # The job id goes along to the client's loop, so retries are taken from the job's budget
+        return asyncio.run_coroutine_threadsafe(as_job(coro, current_job_id()), self._get_loop())
+
+    async def search(self, query: dict) -> dict:
+        """
+        Runs one search
+
+        Args:
+            query: Serper request body, e.g. {"q": "...", "num": 10}
+
+        Returns:
+            The Serper response (with "organic" results)
+        """
+        return await asyncio.wrap_future(self._run(self._search(query)))
+
+    async def search_many(self, queries: list[dict]) -> list[dict]:
+        """Runs several searches in batched requests, returning the responses in order"""
+        return await asyncio.wrap_future(self._run(self._search_all(queries)))
+
+    def search_sync(self, query: dict) -> dict:
+        """Blocking search() for synchronous callers such as crew tools"""
+        return self._run(self._search(query)).result()
+
+    def search_many_sync(self, queries: list[dict]) -> list[dict]:
+        """Blocking search_many() for synchronous callers"""
+        return self._run(self._search_all(queries)).result()
+
+
+_serper_client = None
+_serper_client_lock = threading.Lock()
+
+
+def get_serper_client() -> SerperClient:
+    """Returns the process-wide Serper client"""
+    global _serper_client
+    with _serper_client_lock:
+        if _serper_client is None:
+            _serper_client = SerperClient(cache=get_search_cache())
+        return _serper_client
@@ -0,0 +1,164 @@
+"""
+Precompiled JMESPath parsers (x_parser) vs jmespath.search() on every tweet
+
+    python benchmarks/x_parser.py [--tweets 5000] [--repeat 5]
+
+results/tweet.json and results/profile.json hold parsed output, so the raw
+GraphQL datasets are rebuilt from them first. Both parsers must produce the
+same result for them before anything is timed.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import jmespath
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from x_parser import parse_profile, parse_tweets  # noqa: E402
+
+RESULTS = os.path.join(os.path.dirname(__file__), "..", "results")
+
+
+def load_fixture(name: str) -> dict:
+    # The fixtures were written on Windows and are not UTF-8
+    with open(os.path.join(RESULTS, name), encoding="cp1252") as f:
+        return json.load(f)
+
+
+def raw_profile(profile: dict) -> dict:
+    """Rebuilds the user result parse_profile() flattened"""
+    legacy = {k: v for k, v in profile.items() if k not in ("id", "rest_id", "verified")}
+    return {"id": profile["id"], "rest_id": profile["rest_id"], "is_blue_verified": profile["verified"],
+            "legacy": legacy}
+
+
+# Card binding value keys of the poll fields parse_tweet() renames
+POLL_KEYS = {"end": "end_datetime_utc", "updated": "last_updated_datetime_utc", "ended": "counts_are_final",
+             "duration": "duration_minutes"}
+
+
+def raw_tweet(tweet: dict) -> dict:
+    """Rebuilds the tweet result parse_tweet() read its fields from"""
+    entities = {
+        "urls": [{"expanded_url": url} for url in tweet["attached_urls"] or []],
+        "user_mentions": [{"screen_name": name} for name in tweet["tagged_users"] or []],
+        "hashtags": [{"text": tag} for tag in tweet["tagged_hashtags"] or []],
+    }
+    if tweet["attached_urls2"] is not None:
+        entities["url"] = {"urls": [{"expanded_url": url} for url in tweet["attached_urls2"]]}
+    if tweet["attached_media"] is not None:
+        entities["media"] = [{"media_url_https": url} for url in tweet["attached_media"]]
+    raw = {
+        "legacy": {
+            "created_at": tweet["created_at"],
+            "entities": entities,
+            "favorite_count": tweet["favorite_count"],
+            "bookmark_count": tweet["bookmark_count"],
+            "quote_count": tweet["quote_count"],
+            "reply_count": tweet["reply_count"],
+            "retweet_count": tweet["retweet_count"],
+            "full_text": tweet["text"],
+            "is_quote_status": tweet["is_quote"],
+            "retweeted": tweet["is_retweet"],
+            "lang": tweet["language"],
+            "user_id_str": tweet["user_id"],
+            "id_str": tweet["id"],
+            "conversation_id_str": tweet["conversation_id"],
+        },
+        "source": tweet["source"],
+        "views": {"count": tweet["views"]},
+    }
+    if tweet.get("poll"):
+        raw["card"] = {"legacy": {"binding_values": [
+            {"key": POLL_KEYS.get(key, key), "value": {"boolean_value" if key == "ended" else "string_value": value}}
+            for key, value in tweet["poll"].items()
+        ]}}
+    if tweet.get("user"):
+        raw["core"] = {"user_results": {"result": raw_profile(tweet["user"])}}
+    return raw
+
+
+def parse_tweet_search(data: dict) -> dict:
+    """The previous scrapFly.parse_tweet, which hands the expression strings to jmespath.search()"""
+    result = jmespath.search(
+        """{
+        created_at: legacy.created_at,
+        attached_urls: legacy.entities.urls[].expanded_url,
+        attached_urls2: legacy.entities.url.urls[].expanded_url,
+        attached_media: legacy.entities.media[].media_url_https,
+        tagged_users: legacy.entities.user_mentions[].screen_name,
+        tagged_hashtags: legacy.entities.hashtags[].text,
+        favorite_count: legacy.favorite_count,
+        bookmark_count: legacy.bookmark_count,
+        quote_count: legacy.quote_count,
+        reply_count: legacy.reply_count,
+        retweet_count: legacy.retweet_count,
+        quote_count: legacy.quote_count,
+        text: legacy.full_text,
+        is_quote: legacy.is_quote_status,
+        is_retweet: legacy.retweeted,
+        language: legacy.lang,
+        user_id: legacy.user_id_str,
+        id: legacy.id_str,
+        conversation_id: legacy.conversation_id_str,
+        source: source,
+        views: views.count
+    }""",
+        data,
+    )
+    result["poll"] = {}
+    poll_data = jmespath.search("card.legacy.binding_values", data) or []
+    for poll_entry in poll_data:
+        key, value = poll_entry["key"], poll_entry["value"]
+        if "choice" in key:
+            result["poll"][key] = value["string_value"]
+        elif "end_datetime" in key:
+            result["poll"]["end"] = value["string_value"]
+        elif "last_updated_datetime" in key:
+            result["poll"]["updated"] = value["string_value"]
+        elif "counts_are_final" in key:
+            result["poll"]["ended"] = value["boolean_value"]
+        elif "duration_minutes" in key:
+            result["poll"]["duration"] = value["string_value"]
+    user_data = jmespath.search("core.user_results.result", data)
+    if user_data:
+        result["user"] = parse_profile(user_data)
+    return result
+
+
+def run(label: str, parse_all, tweets: list, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in parse_all(tweets):
+            pass
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{label:>12}: {best * 1000:8.1f} ms best of {repeat}, "
+          f"{best / len(tweets) * 1e6:6.1f} us/tweet (median {statistics.median(timings) * 1000:.1f} ms)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tweets", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tweet = load_fixture("tweet.json")
+    raw = raw_tweet(tweet)
+    assert parse_tweet_search(raw) == tweet, "the rebuilt dataset does not parse back to results/tweet.json"
+    assert next(parse_tweets([raw])) == tweet, "x_parser disagrees with the previous parser"
+    profile = load_fixture("profile.json")
+    assert parse_profile(raw_profile(profile)) == profile
+
+    tweets = [raw] * args.tweets
+    search = run("search()", lambda items: map(parse_tweet_search, items), tweets, args.repeat)
+    compiled = run("compiled", parse_tweets, tweets, args.repeat)
+    print(f"speedup: {search / compiled:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from crewai import Agent, Crew, Task
-from logging_config import get_logger
+from masumi_agent_server import get_logger
+import os
 import pandas as pd
 from typing import Generator, Type
 from crewai_tools import ScrapeWebsiteTool
@@ -10,6 +11,43 @@ class result(BaseModel):
     result: str
     filename: str
 
+
+# Column names (lowercased) hinting at website and X handle columns of the contact CSV
+URL_COLUMN_HINTS = ("url", "website", "site", "domain", "link")
+HANDLE_COLUMN_HINTS = ("twitter", "handle", "x.com")
+
+
+def _is_handle_column(name: str) -> bool:
+    name = name.strip().lower()
+    return name == "x" or name.startswith(("x ", "x_", "x-")) or any(hint in name for hint in HANDLE_COLUMN_HINTS)
+
+
+def _is_url_column(name: str) -> bool:
+    name = name.strip().lower()
+    return not _is_handle_column(name) and any(hint in name for hint in URL_COLUMN_HINTS)
+
+
+def normalize_contacts(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes a chunk of the contact CSV with column-wise string operations
+
+    - whitespace is trimmed and collapsed (not removed, company names keep their spaces)
+    - website columns get an https:// scheme when they have none
+    - X handle columns hold "@handle", also when the CSV has an x.com/twitter.com URL
+    - rows without any value are dropped
+    """
+    frame = frame.apply(lambda column: column.str.strip().str.replace(r"\s+", " ", regex=True))
+    for name in frame.columns:
+        column = frame[name]
+        if _is_handle_column(name):
+            handle = column.str.extract(r"(?:x|twitter)\.com/@?([A-Za-z0-9_]+)", expand=False)
+            handle = handle.fillna(column.str.lstrip("@").str.split(" ").str[0])
+            frame[name] = ("@" + handle).where(handle != "", "")
+        elif _is_url_column(name):
+            has_scheme = column.str.match(r"^https?://", case=False)
+            frame[name] = column.where(has_scheme | (column == ""), "https://" + column)
+    return frame[(frame != "").any(axis=1)]
+
 class ResearchCrew():
     def __init__(self, csv_path: str,source :str ,verbose=True, logger=None):
         self.verbose = verbose
@@ -52,7 +90,7 @@ class ResearchCrew():
             agents=[fileReader,validator,email_generator],
             tasks=[
                 Task(
-                    description='Analyse: {text} and return a concise list of all URLS, with their corresponding X handles and contacts beside them for each company.',
+                    description='Analyse the following contact records (a JSON list with one object per company, keyed by the CSV columns): {text} and return a concise list of all URLS, with their corresponding X handles and contacts beside them for each company.',
                     expected_output="""A concise list of all URLS, with their corresponding X handles and contacts beside them, DO not include things in brackets.
                                         for each company, the output MUST adhere to the following output structure:
 
@@ -93,6 +131,7 @@ class ResearchCrew():
                                             - EMAIL: Email
 
                                         For scraping the X handle, use the XScraper tool. pass in a valid HTTP URL e.g. https://x.com/username
+                                        Pass the X URLs of all companies in the context at once, separated by commas, so they are scraped together.
                                         A valid Url MUST be passed in the tool. If one isnt found for a company i.e., it was only a username and not a url in the input,
                                         Construct a URL for the username.
                                         The twitter username will ALWAYS start with an @ in the input. ignore ALL text before the @ when looking for the twitter handle.
@@ -135,13 +174,21 @@ class ResearchCrew():
         self.logger.info("Crew setup completed")
         return crew
     
-    def read_csv_in_chunks(self,chunk_size: int = 1) -> Generator[pd.DataFrame, None, None]:
-        processed_chunks = []
-        for chunk in pd.read_csv(self.csv_path,chunksize = chunk_size):
-            chunk_data = chunk.to_string(index=False)  # Convert DataFrame to string without index
-            chunk_data = chunk_data.replace(" ", "")  # Remove all spaces
-            chunk_data = chunk_data.replace("\n", "")
-            chunk_data = chunk_data.replace("NaN"," ")
-
-            processed_chunks.append(chunk_data)
-        return processed_chunks
\ No newline at end of file
+    def read_csv_in_batches(self, batch_size: int = None) -> Generator[list[dict], None, None]:
+        """
+        Streams the contact CSV as batches of normalized records
+
+        The file is parsed by pandas in chunks of `batch_size` rows, so only
+        one batch is in memory at a time and the first kickoff starts before
+        the rest of the file is read. Values are normalized column-wise (see
+        normalize_contacts) and every row becomes a {column: value} record.
+
+        Args:
+            batch_size: Rows per batch, i.e. companies per crew kickoff
+                        (default: CONTACT_BATCH_SIZE or 5)
+        """
+        batch_size = batch_size or int(os.getenv("CONTACT_BATCH_SIZE", "5"))
+        for chunk in pd.read_csv(self.csv_path, chunksize=batch_size, dtype=str, keep_default_na=False):
+            records = normalize_contacts(chunk).to_dict("records")
+            if records:
+                yield records
@@ -1,19 +1,16 @@
 import os
+import json
+import time
+import random
+import itertools
+import threading
+import contextvars
 import uvicorn
-import uuid
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, HTTPException
-from pydantic import BaseModel, Field, field_validator
-from masumi.config import Config
-from masumi.payment import Payment, Amount
+from masumi_agent_server import MasumiAgent, create_app, get_object_store, report_progress, setup_logging
 from crew_definition import ResearchCrew
-from logging_config import setup_logging
-from typing import Generator
-import botocore
-import boto3
-import uuid
-from datetime import datetime
 
 # Configure logging
 logger = setup_logging()
@@ -21,315 +18,125 @@ logger = setup_logging()
 # Load environment variables
 load_dotenv(override=True)
 
-# Retrieve API Keys and URLs
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
-PAYMENT_API_KEY = os.getenv("PAYMENT_API_KEY")
-NETWORK = os.getenv("NETWORK")
-
 logger.info("Starting application with configuration:")
-logger.info(f"PAYMENT_SERVICE_URL: {PAYMENT_SERVICE_URL}")
-
-# Initialize FastAPI
-app = FastAPI(
-    title="API following the Masumi API Standard",
-    description="API for running Agentic Services tasks with Masumi payment integration",
-    version="1.0.0"
-)
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Temporary in-memory job store (DO NOT USE IN PRODUCTION)
-# ─────────────────────────────────────────────────────────────────────────────
-jobs = {}
-payment_instances = {}
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Initialize Masumi Payment Config
-# ─────────────────────────────────────────────────────────────────────────────
-config = Config(
-    payment_service_url=PAYMENT_SERVICE_URL,
-    payment_api_key=PAYMENT_API_KEY
-)
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Pydantic Models
-# ─────────────────────────────────────────────────────────────────────────────
-class StartJobRequest(BaseModel):
-    identifier_from_purchaser: str
-    input_data: dict[str, str]
-    
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "identifier_from_purchaser": "example_purchaser_123",
-                "input_data": {
-                    "text": "Write a story about a robot learning to paint",
-                    "source":"user company URL"
-                }
-            }
-        }
-
-class ProvideInputRequest(BaseModel):
-    job_id: str
+logger.info(f"PAYMENT_SERVICE_URL: {os.getenv('PAYMENT_SERVICE_URL')}")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CrewAI Task Execution
 # ─────────────────────────────────────────────────────────────────────────────
+# Batches validated at the same time and retries of a failed batch kickoff
+BATCH_CONCURRENCY = int(os.getenv("CONTACT_BATCH_CONCURRENCY", "4"))
+BATCH_RETRIES = int(os.getenv("CONTACT_BATCH_RETRIES", "2"))
 
-async def execute_crew_task(file_path: str, source: str) -> list[str]:
-    """ Execute a CrewAI task with Research and Writing Agents using data from a CSV file """
-    logger.info(f"Starting CrewAI task with file: {file_path}")
-
-    result = ""
-    filename = datetime.now()
-    crew = ResearchCrew(csv_path=file_path,source=source,logger=logger)
-  
-    processed_chunks = crew.read_csv_in_chunks() 
-
-    for chunk in processed_chunks:
-        output = crew.crew.kickoff(inputs={"text": chunk, "url": source})  # or maybe just output["result"]
-
-# Then navigate as needed if output_data is a list
-        result += output["result"] 
-        result += "\n"
-
-    session = boto3.session.Session()
-    client = session.client('s3',
-                            endpoint_url = os.getenv('DO_SPACE_ENDPOINT'), # Find your endpoint in the control panel, under Settings. Prepend "https://".
-                            config=botocore.config.Config(s3={'addressing_style': 'virtual'}), # Configures to use subdomain/virtual calling format.
-                            region_name=os.getenv('DO_SPACE_REGION'), # Use the region in your endpoint.
-                            aws_access_key_id= os.getenv('DO_SPACE_KEY'), # Access key pair. You can create access key pairs using the control panel or API.
-                            aws_secret_access_key=os.getenv('DO_SPACE_SECRET')) # Secret access key defined through an environment variable.
-        # Step 3: Call the put_object command and specify the file to upload. # Open the PDF file in binary mode
-    client.put_object(
-        Bucket='crewai-outreach-agent',  # The path to the directory you want to upload the object to, starting with your Space name.
-        Key=f'{filename}',  # Object key, referenced whenever you want to access this file later.
-        Body=result.encode('utf-8'),  # The object's contents.
-        ACL='public-read', 
-        ContentType='text/plain' # Defines Access-control List (ACL) permissions, such as private or public.
-        )
-
-    logger.info("CrewAI task completed successfully")
-
-    download_url = f'https://{'crewai-outreach-agent'}.{os.getenv('SPACES_REGION')}.digitaloceanspaces.com/{filename}'
-    return download_url
-    
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 1) Start Job (MIP-003: /start_job)
-# ─────────────────────────────────────────────────────────────────────────────
-
-@app.post("/force_run")
-async def force_run(data:StartJobRequest):
-    result = await execute_crew_task(data.input_data.get("text"),data.input_data.get("source")) 
-    return result
-
-@app.post("/start_job")
-async def start_job(data: StartJobRequest):
-    """ Initiates a job and creates a payment request """
-    print(f"Received data: {data}")
-    print(f"Received data.input_data: {data.input_data}")
-    try:
-        job_id = str(uuid.uuid4())
-        agent_identifier = os.getenv("AGENT_IDENTIFIER")
-        
-        # Log the input text (truncate if too long)
-        input_text = data.input_data["text"]
-        truncated_input = input_text[:100] + "..." if len(input_text) > 100 else input_text
-        logger.info(f"Received job request with input: '{truncated_input}'")
-        logger.info(f"Starting job {job_id} with agent {agent_identifier}")
-
-        # Define payment amounts
-        payment_amount = os.getenv("PAYMENT_AMOUNT", "10000000")  # Default 10 ADA
-        payment_unit = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
-
-        amounts = [Amount(amount=payment_amount, unit=payment_unit)]
-        logger.info(f"Using payment amount: {payment_amount} {payment_unit}")
-        
-        # Create a payment request using Masumi
-        payment = Payment(
-            agent_identifier=agent_identifier,
-            #amounts=amounts,
-            config=config,
-            identifier_from_purchaser=data.identifier_from_purchaser,
-            input_data=data.input_data,
-            network=NETWORK
-        )
-        
-        logger.info("Creating payment request...")
-        payment_request = await payment.create_payment_request()
-        payment_id = payment_request["data"]["blockchainIdentifier"]
-        payment.payment_ids.add(payment_id)
-        logger.info(f"Created payment request with ID: {payment_id}")
-
-        # Store job info (Awaiting payment)
-        jobs[job_id] = {
-            "status": "awaiting_payment",
-            "payment_status": "pending",
-            "payment_id": payment_id,
-            "input_data": data.input_data,
-            "result": None,
-            "identifier_from_purchaser": data.identifier_from_purchaser
-        }
-
-        async def payment_callback(payment_id: str):
-            await handle_payment_status(job_id, payment_id)
-
-        # Start monitoring the payment status
-        payment_instances[job_id] = payment
-        logger.info(f"Starting payment status monitoring for job {job_id}")
-        await payment.start_status_monitoring(payment_callback)
-
-        # Return the response in the required format
-        return {
-            "status": "success",
-            "job_id": job_id,
-            "blockchainIdentifier": payment_request["data"]["blockchainIdentifier"],
-            "submitResultTime": payment_request["data"]["submitResultTime"],
-            "unlockTime": payment_request["data"]["unlockTime"],
-            "externalDisputeUnlockTime": payment_request["data"]["externalDisputeUnlockTime"],
-            "agentIdentifier": agent_identifier,
-            "sellerVkey": os.getenv("SELLER_VKEY"),
-            "identifierFromPurchaser": data.identifier_from_purchaser,
-            "amounts": amounts,
-            "input_hash": payment.input_hash
-        }
-    except KeyError as e:
-        logger.error(f"Missing required field in request: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Bad Request: If input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-    except Exception as e:
-        logger.error(f"Error in start_job: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 2) Process Payment and Execute AI Task
-# ─────────────────────────────────────────────────────────────────────────────
-async def handle_payment_status(job_id: str, payment_id: str) -> None:
-    """ Executes CrewAI task after payment confirmation """
-    try:
-        logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
-        
-        # Update job status to running
-        jobs[job_id]["status"] = "running"
-        logger.info(f"Input data: {jobs[job_id]["input_data"]}")
-
-        # Execute the AI task
-        result = await execute_crew_task(jobs[job_id]["input_data"])
-        result_dict = result.json_dict
-        logger.info(f"Crew task completed for job {job_id}")
-        
-        # Mark payment as completed on Masumi
-        # Use a shorter string for the result hash
-        await payment_instances[job_id].complete_payment(payment_id, result_dict)
-        logger.info(f"Payment completed for job {job_id}")
-
-        # Update job status
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["payment_status"] = "completed"
-        jobs[job_id]["result"] = result
-
-        # Stop monitoring payment status
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-    except Exception as e:
-        logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
-        
-        # Still stop monitoring to prevent repeated failures
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 3) Check Job and Payment Status (MIP-003: /status)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/status")
-async def get_status(job_id: str):
-    """ Retrieves the current status of a specific job """
-    logger.info(f"Checking status for job {job_id}")
-    if job_id not in jobs:
-        logger.warning(f"Job {job_id} not found")
-        raise HTTPException(status_code=404, detail="Job not found")
+def validate_batch(crews: threading.local, file_path: str, source: str, batch: list[dict]) -> tuple[str, bool]:
+    """
+    Runs one batch of companies through the crew, retrying failed kickoffs
 
-    job = jobs[job_id]
+    Crew instances are not safe to kick off from several threads at once,
+    so every batch thread builds its own and reuses it for later batches.
 
-    # Check latest payment status if payment instance exists
-    if job_id in payment_instances:
+    Returns:
+        The crew's result (or an error note once all retries failed) and whether it succeeded
+    """
+    if not hasattr(crews, "crew"):
+        crews.crew = ResearchCrew(csv_path=file_path, source=source, logger=logger)
+    for attempt in range(BATCH_RETRIES + 1):
         try:
-            status = await payment_instances[job_id].check_payment_status()
-            job["payment_status"] = status.get("data", {}).get("status")
-            logger.info(f"Updated payment status for job {job_id}: {job['payment_status']}")
-        except ValueError as e:
-            logger.warning(f"Error checking payment status: {str(e)}")
-            job["payment_status"] = "unknown"
+            output = crews.crew.crew.kickoff(inputs={"text": json.dumps(batch, ensure_ascii=False), "url": source})
+            return output["result"], True
         except Exception as e:
-            logger.error(f"Error checking payment status: {str(e)}", exc_info=True)
-            job["payment_status"] = "error"
-
-
-    result_data = job.get("result")
-    result = result_data.raw if result_data and hasattr(result_data, "raw") else None
+            if attempt == BATCH_RETRIES:
+                logger.error(f"Batch failed after {attempt + 1} attempts: {str(e)}", exc_info=True)
+                companies = ", ".join(str(next(iter(record.values()), "")) for record in batch)
+                return f"Validation failed for: {companies} ({str(e)})", False
+            delay = 2 ** attempt + random.uniform(0, 1)
+            logger.warning(f"Batch kickoff failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def run_crew(input_data: dict) -> str:
+    """ Execute a CrewAI task with Research and Writing Agents using data from a CSV file (called from a worker) """
+    file_path = input_data["text"]
+    source = input_data["source"]
+    logger.info(f"Starting CrewAI task with file: {file_path}")
 
-    return {
-        "job_id": job_id,
-        "status": job["status"],
-        "payment_status": job["payment_status"],
-        "result": result
-    }
+    filename = datetime.now()
+    reader = ResearchCrew(csv_path=file_path,source=source,logger=logger)
+
+    # Batches run in parallel; at most twice the concurrency are read ahead of the running ones
+    crews = threading.local()
+    batches = enumerate(reader.read_csv_in_batches())
+    results = {}
+    pending = {}
+    companies_done = batches_failed = 0
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="contact-batch") as pool:
+        while True:
+            for index, batch in itertools.islice(batches, 2 * BATCH_CONCURRENCY - len(pending)):
+                # Run in a copy of the job's context, so the batch's retries count against the job's budget
+                future = pool.submit(contextvars.copy_context().run, validate_batch, crews, file_path, source, batch)
+                pending[future] = (index, len(batch))
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, size = pending.pop(future)
+                results[index], ok = future.result()
+                companies_done += size
+                batches_failed += not ok
+            # The counters live in this thread only; the batch threads never report progress themselves
+            report_progress(companies_done=companies_done, batches_done=len(results), batches_failed=batches_failed)
+
+    # Reassemble in file order
+    result = "".join(results[index] + "\n" for index in sorted(results))
+    logger.info(f"Validated {companies_done} companies in {len(results)} batches ({batches_failed} failed)")
+
+    # Upload through the process-wide Spaces client, reused across jobs
+    store = get_object_store("DO_SPACE")
+    store.put(
+        'crewai-outreach-agent',  # The path to the directory you want to upload the object to, starting with your Space name.
+        f'{filename}',  # Object key, referenced whenever you want to access this file later.
+        result.encode('utf-8'),  # The object's contents.
+        ACL='public-read',  # Defines Access-control List (ACL) permissions, such as private or public.
+        ContentType='text/plain'
+    )
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 4) Check Server Availability (MIP-003: /availability)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/availability")
-async def check_availability():
-    """ Checks if the server is operational """
+    logger.info("CrewAI task completed successfully")
 
-    return {"status": "available", "type": "masumi-agent", "message": "Server operational."}
-    # Commented out for simplicity sake but its recommended to include the agentIdentifier
-    #return {"status": "available","agentIdentifier": os.getenv("AGENT_IDENTIFIER"), "message": "The server is running smoothly."}
+    return store.download_url('crewai-outreach-agent', f'{filename}')
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 5) Retrieve Input Schema (MIP-003: /input_schema)
+# Agent Registration (endpoints are provided by masumi_agent_server)
 # ─────────────────────────────────────────────────────────────────────────────
-@app.get("/input_schema")
-async def input_schema():
-    """
-    Returns the expected input schema for the /start_job endpoint.
-    Fulfills MIP-003 /input_schema endpoint.
-    """
-    return {
-        "input_data": [
-            {
-                "id": "text",
-                "type": "string",
-                "name": "Task Description",
-                "data": {
-                    "description": "The text input for the AI task",
-                    "placeholder": "Enter your task description here"
-                }
+agent = MasumiAgent(
+    name="contact-validator",
+    run=run_crew,
+    input_schema=[
+        {
+            "id": "text",
+            "type": "string",
+            "name": "Contact List",
+            "data": {
+                "description": "Path or URL of the CSV file with the contacts to validate",
+                "placeholder": "Enter the CSV file location here"
+            }
+        },
+        {
+            "id": "source",
+            "type": "string",
+            "name": "Company URL",
+            "data": {
+                "description": "URL of your company, used to judge how relevant each contact is",
+                "placeholder": "https://example.com"
             }
-        ]
-    }
+        }
+    ],
+    example_input={
+        "text": "https://example.com/contacts.csv",
+        "source": "https://example.com"
+    },
+    allow_force_run=True
+)
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 6) Health Check
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/health")
-async def health():
-    """
-    Returns the health of the server.
-    """
-    return {
-        "status": "healthy"
-    }
+app = create_app(agent)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main Logic if Called as a Script
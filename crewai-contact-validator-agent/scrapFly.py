@@ -7,17 +7,26 @@ $ export $SCRAPFLY_KEY="your key from https://scrapfly.io/dashboard"
 """
 import json
 import os
-import jmespath
+import re
+import asyncio
+import threading
 
-from typing import Dict
+from typing import Dict, List
+from urllib.parse import urlparse
 
 from loguru import logger as log
 from scrapfly import ScrapeConfig, ScrapflyClient
 from dotenv import load_dotenv
+from masumi_agent_server import ResultCache, RetryableError, get_retry_policy
+from masumi_agent_server.progress import as_job, current_job_id
+from x_parser import parse_profile, parse_tweet
 
 load_dotenv()
 
-SCRAPFLY = ScrapflyClient(key=os.getenv("SCRAPE_KEY"))
+# Profile scrapes running at the same time, across every crew thread of the process
+SCRAPE_CONCURRENCY = int(os.getenv("X_SCRAPE_CONCURRENCY", "8"))
+
+SCRAPFLY = ScrapflyClient(key=os.getenv("SCRAPE_KEY"), max_concurrency=SCRAPE_CONCURRENCY)
 BASE_CONFIG = {
     # X.com (Twitter) requires Anti Scraping Protection bypass feature.
     # for more: https://scrapfly.io/docs/scrape-api/anti-scraping-protection
@@ -27,77 +36,139 @@ BASE_CONFIG = {
     "render_js": True,
 }
 
+# Parsed profiles and tweets, keyed by handle and tweet id. A profile checked
+# by one job is served to later ones for X_PROFILE_CACHE_TTL seconds; expired
+# entries stay on disk for X_PROFILE_CACHE_KEEP_STALE seconds more and are
+# returned when their rescrape fails.
+PROFILE_CACHE = ResultCache(
+    path=os.getenv("X_PROFILE_CACHE_PATH", "data/x_profile_cache.db") or None,
+    ttl=float(os.getenv("X_PROFILE_CACHE_TTL", str(7 * 24 * 3600))),
+    max_entries=int(os.getenv("X_PROFILE_CACHE_MAX_ENTRIES", "1024")),
+    keep_stale=float(os.getenv("X_PROFILE_CACHE_KEEP_STALE", str(30 * 24 * 3600))),
+    table="x_cache"
+)
 
-async def _scrape_twitter_app(url: str, _retries: int = 0, **scrape_config) -> Dict:
-    """Scrape X.com (Twitter) page and scroll to the end of the page if possible"""
-    if not _retries:
-        log.info("scraping {}", url)
-    else:
-        log.info("retrying {}/2 {}", _retries, url)
-    result = await SCRAPFLY.async_scrape(
-        ScrapeConfig(url, auto_scroll=True, lang=["en-US"], **scrape_config, **BASE_CONFIG)
-    )
-    if "Something went wrong, but" in result.content:
-        if _retries > 2:
-            raise Exception("Twitter web app crashed too many times")
-        return await _scrape_twitter_app(url, _retries=_retries + 1, **scrape_config)
+# When cached entries are rescraped:
+#   stale  - only once expired (incremental refresh, the default)
+#   always - on every request, the cache is only a fallback for failed scrapes
+#   never  - never while an entry exists, even an expired one
+REFRESH_MODES = ("stale", "always", "never")
+REFRESH_MODE = os.getenv("X_PROFILE_REFRESH", "stale")
+
+_TWEET_ID = re.compile(r"/status(?:es)?/(\d+)")
+
+
+def profile_cache_key(url: str) -> str:
+    """Returns the cache key of a profile URL or @handle, the lowercased handle"""
+    url = url.strip()
+    if "/" in url:
+        url = urlparse(url if "://" in url else f"https://{url}").path.strip("/").split("/")[0]
+    return "profile:" + url.lstrip("@").lower()
+
+
+def tweet_cache_key(url: str) -> str:
+    """Returns the cache key of a tweet URL, its status id"""
+    match = _TWEET_ID.search(url)
+    return "tweet:" + (match.group(1) if match else url.strip().lower())
+
+
+async def _cached(key: str, scrape, refresh: str = None):
+    """
+    Returns the cached entry of `key` or awaits `scrape()` for a new one,
+    following the refresh mode. Failed scrapes (error strings) are not
+    cached and fall back to the expired entry if there is one.
+    """
+    refresh = refresh or REFRESH_MODE
+    if refresh not in REFRESH_MODES:
+        raise ValueError(f"Unknown refresh mode {refresh!r}, expected one of {REFRESH_MODES}")
+    cached, fresh = PROFILE_CACHE.lookup(key)
+    if cached is not None and (refresh == "never" or (refresh == "stale" and fresh)):
+        return cached
+    result = await scrape()
+    if isinstance(result, dict):
+        PROFILE_CACHE.put(key, result)
+        return result
+    if cached is not None:
+        log.warning("serving expired cache entry {} after failed rescrape", key)
+        return cached
     return result
 
 
-def parse_tweet(data: Dict) -> Dict:
-    """Parse X.com (Twitter) tweet JSON dataset for the most important fields"""
-    result = jmespath.search(
-        """{
-        created_at: legacy.created_at,
-        attached_urls: legacy.entities.urls[].expanded_url,
-        attached_urls2: legacy.entities.url.urls[].expanded_url,
-        attached_media: legacy.entities.media[].media_url_https,
-        tagged_users: legacy.entities.user_mentions[].screen_name,
-        tagged_hashtags: legacy.entities.hashtags[].text,
-        favorite_count: legacy.favorite_count,
-        bookmark_count: legacy.bookmark_count,
-        quote_count: legacy.quote_count,
-        reply_count: legacy.reply_count,
-        retweet_count: legacy.retweet_count,
-        quote_count: legacy.quote_count,
-        text: legacy.full_text,
-        is_quote: legacy.is_quote_status,
-        is_retweet: legacy.retweeted,
-        language: legacy.lang,
-        user_id: legacy.user_id_str,
-        id: legacy.id_str,
-        conversation_id: legacy.conversation_id_str,
-        source: source,
-        views: views.count
-    }""",
-        data,
+# All scrapes run on one event loop thread, so the concurrency limit holds
+# for the sync crew tools of every worker thread and for async callers alike
+_loop = None
+_loop_lock = threading.Lock()
+_semaphore = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="scrapfly-x", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # Created on the scraper loop the first time a scrape runs there
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+    return _semaphore
+
+
+async def _on_scraper_loop(coro):
+    """Awaits `coro` on the scraper loop from any other loop"""
+    future = asyncio.run_coroutine_threadsafe(as_job(coro, current_job_id()), _get_loop())
+    return await asyncio.wrap_future(future)
+
+
+async def _scrape_twitter_app(url: str, **scrape_config) -> Dict:
+    """
+    Scrape X.com (Twitter) page and scroll to the end of the page if possible
+
+    Crashes of the X web app ("Something went wrong") and failed scrapes are
+    retried with backoff under the shared Scrapfly retry policy, which also
+    stops scraping X for a while after repeated failures.
+    """
+    log.info("scraping {}", url)
+
+    async def attempt():
+        async with _get_semaphore():
+            result = await SCRAPFLY.async_scrape(
+                ScrapeConfig(url, auto_scroll=True, lang=["en-US"], **scrape_config, **BASE_CONFIG)
+            )
+        if "Something went wrong, but" in result.content:
+            raise RetryableError("Twitter web app crashed")
+        return result
+
+    return await get_retry_policy("scrapfly").acall(
+        urlparse(url).netloc or "x.com", attempt, retryable=_is_retryable_scrape
     )
-    result["poll"] = {}
-    poll_data = jmespath.search("card.legacy.binding_values", data) or []
-    for poll_entry in poll_data:
-        key, value = poll_entry["key"], poll_entry["value"]
-        if "choice" in key:
-            result["poll"][key] = value["string_value"]
-        elif "end_datetime" in key:
-            result["poll"]["end"] = value["string_value"]
-        elif "last_updated_datetime" in key:
-            result["poll"]["updated"] = value["string_value"]
-        elif "counts_are_final" in key:
-            result["poll"]["ended"] = value["boolean_value"]
-        elif "duration_minutes" in key:
-            result["poll"]["duration"] = value["string_value"]
-    user_data = jmespath.search("core.user_results.result", data)
-    if user_data:
-        result["user"] = parse_profile(user_data)
-    return result
 
 
-async def scrape_tweet(url: str) -> Dict:
+def _is_retryable_scrape(error: Exception) -> bool:
+    # Scrapfly errors say themselves whether they are worth retrying (throttling, upstream failures)
+    return isinstance(error, RetryableError) or getattr(error, "is_retryable", False)
+
+
+async def scrape_tweet(url: str, refresh: str = None) -> Dict:
     """
     Scrape a single tweet page for Tweet thread e.g.:
     https://twitter.com/Scrapfly_dev/status/1667013143904567296
     Return parent tweet, reply tweets and recommended tweets
+    Served from PROFILE_CACHE unless `refresh` (default: X_PROFILE_REFRESH) asks for a rescrape
     """
+    return await _on_scraper_loop(_scrape_tweet(url, refresh))
+
+
+async def _scrape_tweet(url: str, refresh: str = None) -> Dict:
+    return await _cached(tweet_cache_key(url), lambda: _fetch_tweet(url), refresh)
+
+
+async def _fetch_tweet(url: str) -> Dict:
     try:
         result = await _scrape_twitter_app(url, wait_for_selector="[data-testid='tweet']")
         # capture background requests and extract ones that request Tweet data
@@ -113,17 +184,40 @@ async def scrape_tweet(url: str) -> Dict:
         return "ERROR: Unable to scrape tweet."
 
 
-def parse_profile(data: Dict) -> Dict:
-    """parse X.com (Twitter) user profile JSON dataset as a flat structure"""
-    return {"id": data["id"], "rest_id": data["rest_id"], "verified": data["is_blue_verified"], **data["legacy"]}
-
-
-async def scrape_profile(url: str) -> Dict:
+async def scrape_profile(url: str, refresh: str = None) -> Dict:
     """
     Scrapes X.com (Twitter) user profile page e.g.:
     https://x.com/scrapfly_dev
     returns user data and latest tweets
+    Served from PROFILE_CACHE unless `refresh` (default: X_PROFILE_REFRESH) asks for a rescrape
+    """
+    return await _on_scraper_loop(_scrape_profile(url, refresh))
+
+
+async def scrape_profiles(urls: List[str], refresh: str = None) -> List[Dict]:
+    """
+    Scrapes several X.com (Twitter) profiles concurrently (at most
+    SCRAPE_CONCURRENCY at a time) and returns them in the order of `urls`
     """
+    return await _on_scraper_loop(_scrape_profiles(urls, refresh))
+
+
+def scrape_profiles_sync(urls: List[str], refresh: str = None) -> List[Dict]:
+    """Blocking scrape_profiles() for synchronous callers such as crew tools"""
+    return asyncio.run_coroutine_threadsafe(
+        as_job(_scrape_profiles(urls, refresh), current_job_id()), _get_loop()
+    ).result()
+
+
+async def _scrape_profiles(urls: List[str], refresh: str = None) -> List[Dict]:
+    return list(await asyncio.gather(*(_scrape_profile(url, refresh) for url in urls)))
+
+
+async def _scrape_profile(url: str, refresh: str = None) -> Dict:
+    return await _cached(profile_cache_key(url), lambda: _fetch_profile(url), refresh)
+
+
+async def _fetch_profile(url: str) -> Dict:
     try:
         result = await _scrape_twitter_app(url, wait_for_selector="[data-testid='primaryColumn']")
         # capture background requests and extract ones that contain user data
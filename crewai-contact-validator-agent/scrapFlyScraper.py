@@ -1,31 +1,37 @@
 from crewai.tools import BaseTool
-import os
-from dotenv import load_dotenv
+from typing import Type
+from pydantic import BaseModel, Field
+import re
 import json
 import scrapFly
-import asyncio
+
+
+class XScraperInput(BaseModel):
+    """Input for XScraper"""
+    url: str = Field(..., description="X profile URL e.g. https://x.com/username, or several separated by commas")
+
+
+def _profile_urls(url: str) -> list[str]:
+    return [part for part in re.split(r"[,\s]+", url.strip().strip('"')) if part]
+
+
+def _format_profiles(urls: list[str], profiles: list) -> str:
+    if len(urls) == 1:
+        return json.dumps(profiles[0], indent=2)
+    return json.dumps(dict(zip(urls, profiles)), indent=2)
+
 
 class XScraper(BaseTool):
     name: str = "X handle scraper"
-    description: str = "Search the X handle for the latest posts"
+    description: str = """Search the X handle for the latest posts.
+    Pass every profile URL of the batch at once, separated by commas, to scrape them concurrently."""
+    args_schema: Type[BaseModel] = XScraperInput
 
     def _run(self, url: str) -> str:
-        try:
-            # Check if the loop is already running
-            loop = asyncio.get_running_loop()
-        except RuntimeError:
-            # No event loop, create one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            profile = loop.run_until_complete(scrapFly.scrape_profile(url))
-        else:
-            # Loop is already running; use asyncio.create_task and run it synchronously
-            future = asyncio.ensure_future(scrapFly.scrape_profile(url))
-            # Requires a way to wait without blocking — use asyncio-compatible structure
-            import nest_asyncio
-            nest_asyncio.apply()
-            profile = loop.run_until_complete(future)
-
-        profile_data = profile  # assuming `scrape_profile` already returns a dict
-       
-        return json.dumps(profile_data, indent=2)
+        # Sync crew tools hand the scrapes to the shared scraper loop and wait
+        urls = _profile_urls(url)
+        return _format_profiles(urls, scrapFly.scrape_profiles_sync(urls))
+
+    async def _arun(self, url: str) -> str:
+        urls = _profile_urls(url)
+        return _format_profiles(urls, await scrapFly.scrape_profiles(urls))
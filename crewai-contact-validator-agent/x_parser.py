@@ -0,0 +1,169 @@
+"""
+Parsers for the X.com (Twitter) GraphQL datasets captured by scrapFly
+
+The JMESPath expressions are compiled once at import instead of on every
+parse, which dominates when thousands of tweets are parsed from XHR
+captures: first by jmespath into a syntax tree, then into nested Python
+functions, so evaluating them skips jmespath's tree walking too.
+benchmarks/x_parser.py compares this with jmespath.search().
+"""
+from typing import Callable, Dict, Iterable, Iterator
+
+import jmespath
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _field(name: str) -> Callable:
+    def field(value):
+        return value.get(name) if isinstance(value, dict) else None
+    return field
+
+
+def _path(names: list) -> Callable:
+    # a.b.c, the most common expression, in one loop
+    def path(value):
+        for name in names:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(name)
+        return value
+    return path
+
+
+def _chain(steps: list) -> Callable:
+    def chain(value):
+        for step in steps:
+            value = step(value)
+        return value
+    return chain
+
+
+def _build(node: dict) -> Callable:
+    """Turns a jmespath syntax tree node into a function with TreeInterpreter's semantics"""
+    kind = node["type"]
+    if kind == "field":
+        return _field(node["value"])
+    if kind in ("subexpression", "pipe", "index_expression"):
+        if all(child["type"] == "field" for child in node["children"]):
+            return _path([child["value"] for child in node["children"]])
+        return _chain([_build(child) for child in node["children"]])
+    if kind in ("identity", "current"):
+        return lambda value: value
+    if kind == "literal":
+        literal = node["value"]
+        return lambda value: literal
+    if kind == "key_val_pair":
+        return _build(node["children"][0])
+    if kind == "multi_select_dict":
+        pairs = [(child["value"], _build(child)) for child in node["children"]]
+
+        def multi_select_dict(value):
+            if value is None:
+                return None
+            return {key: select(value) for key, select in pairs}
+        return multi_select_dict
+    if kind == "projection":
+        base, each = _build(node["children"][0]), _build(node["children"][1])
+
+        def projection(value):
+            items = base(value)
+            if not isinstance(items, list):
+                return None
+            return [item for item in map(each, items) if item is not None]
+        return projection
+    if kind == "flatten":
+        base = _build(node["children"][0])
+
+        def flatten(value):
+            items = base(value)
+            if not isinstance(items, list):
+                return None
+            merged = []
+            for item in items:
+                if isinstance(item, list):
+                    merged.extend(item)
+                else:
+                    merged.append(item)
+            return merged
+        return flatten
+    raise _Unsupported(kind)
+
+
+def compile_expression(expression: str) -> Callable[[Dict], object]:
+    """
+    Compiles a JMESPath expression into a function of the data
+
+    Fields, sub-expressions, pipes, multi-select hashes, projections and
+    flattening are turned into plain functions; anything else (filters,
+    functions, ...) is evaluated by jmespath's own interpreter.
+    """
+    parsed = jmespath.compile(expression)
+    try:
+        return _build(parsed.parsed)
+    except _Unsupported:
+        return parsed.search
+
+
+TWEET_FIELDS = compile_expression(
+    """{
+    created_at: legacy.created_at,
+    attached_urls: legacy.entities.urls[].expanded_url,
+    attached_urls2: legacy.entities.url.urls[].expanded_url,
+    attached_media: legacy.entities.media[].media_url_https,
+    tagged_users: legacy.entities.user_mentions[].screen_name,
+    tagged_hashtags: legacy.entities.hashtags[].text,
+    favorite_count: legacy.favorite_count,
+    bookmark_count: legacy.bookmark_count,
+    quote_count: legacy.quote_count,
+    reply_count: legacy.reply_count,
+    retweet_count: legacy.retweet_count,
+    text: legacy.full_text,
+    is_quote: legacy.is_quote_status,
+    is_retweet: legacy.retweeted,
+    language: legacy.lang,
+    user_id: legacy.user_id_str,
+    id: legacy.id_str,
+    conversation_id: legacy.conversation_id_str,
+    source: source,
+    views: views.count
+}"""
+)
+POLL_VALUES = compile_expression("card.legacy.binding_values")
+TWEET_USER = compile_expression("core.user_results.result")
+
+
+def parse_profile(data: Dict) -> Dict:
+    """parse X.com (Twitter) user profile JSON dataset as a flat structure"""
+    return {"id": data["id"], "rest_id": data["rest_id"], "verified": data["is_blue_verified"], **data["legacy"]}
+
+
+def parse_tweet(data: Dict) -> Dict:
+    """Parse X.com (Twitter) tweet JSON dataset for the most important fields"""
+    result = TWEET_FIELDS(data)
+    result["poll"] = {}
+    poll_data = POLL_VALUES(data) or []
+    for poll_entry in poll_data:
+        key, value = poll_entry["key"], poll_entry["value"]
+        if "choice" in key:
+            result["poll"][key] = value["string_value"]
+        elif "end_datetime" in key:
+            result["poll"]["end"] = value["string_value"]
+        elif "last_updated_datetime" in key:
+            result["poll"]["updated"] = value["string_value"]
+        elif "counts_are_final" in key:
+            result["poll"]["ended"] = value["boolean_value"]
+        elif "duration_minutes" in key:
+            result["poll"]["duration"] = value["string_value"]
+    user_data = TWEET_USER(data)
+    if user_data:
+        result["user"] = parse_profile(user_data)
+    return result
+
+
+def parse_tweets(tweets: Iterable[Dict]) -> Iterator[Dict]:
+    """Parses tweet datasets one at a time, e.g. from a large XHR capture, without holding all results"""
+    for data in tweets:
+        yield parse_tweet(data)
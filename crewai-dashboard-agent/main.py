@@ -1,13 +1,8 @@
 import os
 import uvicorn
-import uuid
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, HTTPException
-from pydantic import BaseModel, Field, field_validator
-from masumi.config import Config
-from masumi.payment import Payment, Amount
+from masumi_agent_server import MasumiAgent, create_app, setup_logging
 from crew_definition import ResearchCrew
-from logging_config import setup_logging
 
 # Configure logging
 logger = setup_logging()
@@ -15,300 +10,70 @@ logger = setup_logging()
 # Load environment variables
 load_dotenv(override=True)
 
-# Retrieve API Keys and URLs
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
-PAYMENT_API_KEY = os.getenv("PAYMENT_API_KEY")
-
 logger.info("Starting application with configuration:")
-logger.info(f"PAYMENT_SERVICE_URL: {PAYMENT_SERVICE_URL}")
-
-# Initialize FastAPI
-app = FastAPI(
-    title="API following the Masumi API Standard",
-    description="API for running Agentic Services tasks with Masumi payment integration",
-    version="1.0.0"
-)
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Temporary in-memory job store (DO NOT USE IN PRODUCTION)
-# ─────────────────────────────────────────────────────────────────────────────
-jobs = {}
-payment_instances = {}
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Initialize Masumi Payment Config
-# ─────────────────────────────────────────────────────────────────────────────
-config = Config(
-    payment_service_url=PAYMENT_SERVICE_URL,
-    payment_api_key=PAYMENT_API_KEY
-)
-
-# ─────────────────────────────────────────────────────────────────────────────
-# Pydantic Models
-# ─────────────────────────────────────────────────────────────────────────────
-class StartJobRequest(BaseModel):
-    identifier_from_purchaser: str
-    input_data: dict[str, str]
-
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "identifier_from_purchaser": "example_purchaser_123",
-                "input_data": {
-                    "text": "Write a story about a robot learning to paint"
-                }
-            }
-        }
-
-class ProvideInputRequest(BaseModel):
-    job_id: str
+logger.info(f"PAYMENT_SERVICE_URL: {os.getenv('PAYMENT_SERVICE_URL')}")
 
 # ─────────────────────────────────────────────────────────────────────────────
 # CrewAI Task Execution
 # ─────────────────────────────────────────────────────────────────────────────
-async def execute_crew_task(input_data: str) -> str:
-    """ Execute a CrewAI task with Research and Writing Agents """
+def run_crew(input_data: dict):
+    """ Execute a CrewAI task with Research and Writing Agents (called from a worker) """
     logger.info(f"Starting CrewAI task with input: {input_data}")
     crew = ResearchCrew(logger=logger)
-    result = crew.crew.kickoff(inputs={"text": input_data})
+    result = crew.crew.kickoff(inputs={"text": input_data["text"]})
     logger.info("CrewAI task completed successfully")
     return result
 
 # ─────────────────────────────────────────────────────────────────────────────
-# 1) Start Job (MIP-003: /start_job)
+# Agent Registration (endpoints are provided by masumi_agent_server)
 # ─────────────────────────────────────────────────────────────────────────────
-@app.post("/start_job")
-async def start_job(data: StartJobRequest):
-    """ Initiates a job and creates a payment request """
-    try:
-        job_id = str(uuid.uuid4())
-        agent_identifier = os.getenv("AGENT_IDENTIFIER")
-        
-        # Log the input text (truncate if too long)
-        input_text = data.input_data["text"]
-        truncated_input = input_text[:100] + "..." if len(input_text) > 100 else input_text
-        logger.info(f"Received job request with input: '{truncated_input}'")
-        logger.info(f"Starting job {job_id} with agent {agent_identifier}")
-
-        # Define payment amounts
-        payment_amount = os.getenv("PAYMENT_AMOUNT", "10000000")  # Default 10 ADA
-        payment_unit = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
-
-        amounts = [Amount(amount=payment_amount, unit=payment_unit)]
-        logger.info(f"Using payment amount: {payment_amount} {payment_unit}")
-        
-        # Create a payment request using Masumi
-        payment = Payment(
-            agent_identifier=agent_identifier,
-            #amounts=amounts,
-            config=config,
-            identifier_from_purchaser=data.identifier_from_purchaser,
-            input_data=data.input_data
-        )
-        
-        logger.info("Creating payment request...")
-        payment_request = await payment.create_payment_request()
-        payment_id = payment_request["data"]["blockchainIdentifier"]
-        payment.payment_ids.add(payment_id)
-        logger.info(f"Created payment request with ID: {payment_id}")
-
-        # Store job info (Awaiting payment)
-        jobs[job_id] = {
-            "status": "awaiting_payment",
-            "payment_status": "pending",
-            "payment_id": payment_id,
-            "input_data": data.input_data,
-            "result": None,
-            "identifier_from_purchaser": data.identifier_from_purchaser
-        }
-
-        async def payment_callback(payment_id: str):
-            await handle_payment_status(job_id, payment_id)
-
-        # Start monitoring the payment status
-        payment_instances[job_id] = payment
-        logger.info(f"Starting payment status monitoring for job {job_id}")
-        await payment.start_status_monitoring(payment_callback)
-
-        # Return the response in the required format
-        return {
-            "status": "success",
-            "job_id": job_id,
-            "blockchainIdentifier": payment_request["data"]["blockchainIdentifier"],
-            "submitResultTime": payment_request["data"]["submitResultTime"],
-            "unlockTime": payment_request["data"]["unlockTime"],
-            "externalDisputeUnlockTime": payment_request["data"]["externalDisputeUnlockTime"],
-            "agentIdentifier": agent_identifier,
-            "sellerVkey": os.getenv("SELLER_VKEY"),
-            "identifierFromPurchaser": data.identifier_from_purchaser,
-            "amounts": amounts,
-            "input_hash": payment.input_hash
-        }
-    except KeyError as e:
-        logger.error(f"Missing required field in request: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Bad Request: If input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-    except Exception as e:
-        logger.error(f"Error in start_job: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=400,
-            detail="Input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
-        )
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 2) Process Payment and Execute AI Task
-# ─────────────────────────────────────────────────────────────────────────────
-async def handle_payment_status(job_id: str, payment_id: str) -> None:
-    """ Executes CrewAI task after payment confirmation """
-    try:
-        logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
-        
-        # Update job status to running
-        jobs[job_id]["status"] = "running"
-        logger.info(f"Input data: {jobs[job_id]["input_data"]}")
-
-        # Execute the AI task
-        result = await execute_crew_task(jobs[job_id]["input_data"])
-        logger.info(f"Crew task completed for job {job_id}")
-
-        # Convert result to string if it's not already
-        result_str = str(result)
-        
-        # Mark payment as completed on Masumi
-        # Use a shorter string for the result hash
-        result_hash = result_str[:64] if len(result_str) >= 64 else result_str
-        await payment_instances[job_id].complete_payment(payment_id, result_hash)
-        logger.info(f"Payment completed for job {job_id}")
-
-        # Update job status
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["payment_status"] = "completed"
-        jobs[job_id]["result"] = result
-
-        # Stop monitoring payment status
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-    except Exception as e:
-        logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
-        
-        # Still stop monitoring to prevent repeated failures
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 3) Check Job and Payment Status (MIP-003: /status)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/status")
-async def get_status(job_id: str):
-    """ Retrieves the current status of a specific job """
-    logger.info(f"Checking status for job {job_id}")
-    if job_id not in jobs:
-        logger.warning(f"Job {job_id} not found")
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    job = jobs[job_id]
-
-    # Check latest payment status if payment instance exists
-    if job_id in payment_instances:
-        try:
-            status = await payment_instances[job_id].check_payment_status()
-            job["payment_status"] = status.get("data", {}).get("status")
-            logger.info(f"Updated payment status for job {job_id}: {job['payment_status']}")
-        except ValueError as e:
-            logger.warning(f"Error checking payment status: {str(e)}")
-            job["payment_status"] = "unknown"
-        except Exception as e:
-            logger.error(f"Error checking payment status: {str(e)}", exc_info=True)
-            job["payment_status"] = "error"
-
-    return {
-        "job_id": job_id,
-        "status": job["status"],
-        "payment_status": job["payment_status"],
-        "result": job.get("result")
-    }
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 4) Check Server Availability (MIP-003: /availability)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/availability")
-async def check_availability():
-    """ Checks if the server is operational """
-    return {
-        "status": "available",
-        "agentIdentifier": os.getenv("AGENT_IDENTIFIER"),
-        "message": "The server is running smoothly."
-    }
-
-# ─────────────────────────────────────────────────────────────────────────────
-# 5) Retrieve Input Schema (MIP-003: /input_schema)
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/input_schema")
-async def input_schema():
-    """
-    Returns the expected input schema for the /start_job endpoint.
-    Fulfills MIP-003 /input_schema endpoint.
-    """
-    return {
-        "input_data": [
-            {
-                "id": "text",
-                "type": "string",
-                "name": "Dashboard Request",
-                "data": {
-                    "description": "Natural language description of the dashboard you want to create",
-                    "placeholder": "Create a sales dashboard showing monthly trends and top products"
-                }
-            },
-            {
-                "id": "data_source",
-                "type": "string",
-                "name": "Data Source",
-                "data": {
-                    "description": "Path or URL to your data source (CSV, Google Sheets, etc.)",
-                    "placeholder": "data/sales.csv"
-                }
-            },
-            {
-                "id": "output_format",
-                "type": "string",
-                "name": "Output Format",
-                "data": {
-                    "description": "Desired output format (jupyter, web, or pdf)",
-                    "placeholder": "jupyter",
-                    "enum": ["jupyter", "web", "pdf"]
-                }
-            },
-            {
-                "id": "interactive",
-                "type": "boolean",
-                "name": "Interactive Widgets",
-                "data": {
-                    "description": "Include interactive widgets in Jupyter notebook",
-                    "default": true
-                }
+agent = MasumiAgent(
+    name="dashboard",
+    run=run_crew,
+    input_schema=[
+        {
+            "id": "text",
+            "type": "string",
+            "name": "Dashboard Request",
+            "data": {
+                "description": "Natural language description of the dashboard you want to create",
+                "placeholder": "Create a sales dashboard showing monthly trends and top products"
+            }
+        },
+        {
+            "id": "data_source",
+            "type": "string",
+            "name": "Data Source",
+            "data": {
+                "description": "Path or URL to your data source (CSV, Google Sheets, etc.)",
+                "placeholder": "data/sales.csv"
             }
-        ]
-    }
+        },
+        {
+            "id": "output_format",
+            "type": "string",
+            "name": "Output Format",
+            "data": {
+                "description": "Desired output format (jupyter, web, or pdf)",
+                "placeholder": "jupyter",
+                "enum": ["jupyter", "web", "pdf"]
+            }
+        },
+        {
+            "id": "interactive",
+            "type": "boolean",
+            "name": "Interactive Widgets",
+            "data": {
+                "description": "Include interactive widgets in Jupyter notebook",
+                "default": True
+            }
+        }
+    ],
+    example_input={"text": "Write a story about a robot learning to paint"},
+    required_inputs=["text"]
+)
 
-# ─────────────────────────────────────────────────────────────────────────────
-# 6) Health Check
-# ─────────────────────────────────────────────────────────────────────────────
-@app.get("/health")
-async def health():
-    """
-    Returns the health of the server.
-    """
-    return {
-        "status": "healthy"
-    }
+app = create_app(agent)
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Main Logic if Called as a Script
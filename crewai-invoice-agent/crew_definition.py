@@ -6,7 +6,7 @@ import logging
 import os
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel
-from logging_config import get_logger 
+from masumi_agent_server import get_logger
 
 logger = logging.getLogger(__name__)
 # Define the Pydantic model for the blog
@@ -7,10 +7,28 @@ from datetime import datetime
 from langfuse.callback import CallbackHandler
 from langchain_openai import ChatOpenAI
 from langfuse.decorators import observe
+from masumi_agent_server import get_search_cache
 import time
 
 dotenv.load_dotenv()
 
+
+class CachedSerperDevTool(SerperDevTool):
+    """SerperDevTool that answers repeat searches from the shared search cache"""
+
+    def _run(self, **kwargs):
+        query = {
+            "q": kwargs.get("search_query") or kwargs.get("query"),
+            "type": getattr(self, "search_type", "search"),
+            "num": self.n_results,
+            "gl": getattr(self, "country", None) or None,
+            "hl": getattr(self, "locale", None) or None,
+            "location": getattr(self, "location", None) or None,
+        }
+        fetch = super()._run
+        return get_search_cache().get_or_fetch(query, lambda: fetch(**kwargs))
+
+
 @observe(as_type="generation")
 class MeetingPreparationAgent:
     def __init__(
@@ -54,7 +72,7 @@ class MeetingPreparationAgent:
             openai_api_key=self.openai_api_key,
             callbacks=[langfuse_handler]
         )
-        self.search_tool = SerperDevTool()
+        self.search_tool = CachedSerperDevTool()
         # Store verbosity and process configuration
         self.verbose = verbose
         self.process = process
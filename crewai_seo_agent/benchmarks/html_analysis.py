@@ -0,0 +1,190 @@
+"""
+Single-pass analyze_html() vs BrowserlessScraper's previous six-pass analysis
+
+    python benchmarks/html_analysis.py [--corpus DIR] [--pages 50] [--repeat 3]
+
+--corpus is a directory of saved pages (*.html), e.g. Browserless renders
+written out with `curl`. Without it a reproducible synthetic corpus of
+pages of increasing size is generated. Reports the CPU time per page of
+each implementation, and on how many pages their results differ.
+"""
+import os
+import re
+import sys
+import glob
+import time
+import random
+import argparse
+import statistics
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from tools.html_analysis import LXML, analyze_html, calculate_readability  # noqa: E402
+
+BASE_URL = "https://example.com/"
+
+WORDS = ("search engine optimization content page ranking keyword audit mobile speed index crawl link "
+         "image metadata structured data performance visitor conversion analytics report").split()
+
+
+def analyze_multipass(document: str, base_url: str):
+    """The previous BrowserlessScraper analysis: html.parser, then one tree search per aspect"""
+    soup = BeautifulSoup(document, 'html.parser')
+    if not soup.find('html'):
+        return None
+
+    meta_analysis = defaultdict(list)
+    for tag in soup.find_all('meta'):
+        name = tag.get('name', tag.get('property', ''))
+        content = tag.get('content', '')
+        if name and content:
+            meta_analysis[name].append(content)
+
+    headings = {}
+    for level in range(1, 7):
+        h_tags = soup.find_all(f'h{level}')
+        if h_tags:
+            headings[f'h{level}'] = [h.get_text().strip() for h in h_tags]
+
+    words = re.findall(r'\b\w+\b', soup.get_text().lower())
+    stop_words = {'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i',
+                  'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at'}
+    words = [word for word in words if word not in stop_words and len(word) > 2]
+    word_freq = Counter(words)
+    keywords = {
+        'frequencies': dict(word_freq.most_common(20)),
+        'density': {word: (count / len(words)) * 100 for word, count in word_freq.most_common(20)},
+        'total_words': len(words),
+        'unique_words': len(set(words))
+    }
+
+    base_domain = urlparse(base_url).netloc
+    internal_links, external_links = [], []
+    for link in soup.find_all('a', href=True):
+        href = link.get('href', '').strip()
+        text = link.get_text().strip()
+        if href.startswith(('http://', 'https://')):
+            if urlparse(href).netloc == base_domain:
+                internal_links.append({'url': href, 'text': text})
+            else:
+                external_links.append({'url': href, 'text': text})
+        elif href.startswith('/'):
+            internal_links.append({'url': f"{base_url.rstrip('/')}{href}", 'text': text})
+
+    images, missing_alt = [], 0
+    for img in soup.find_all('img'):
+        if not img.get('alt', ''):
+            missing_alt += 1
+        images.append({'src': img.get('src', ''), 'alt': img.get('alt', ''),
+                       'width': img.get('width', ''), 'height': img.get('height', '')})
+
+    paragraphs = soup.find_all('p')
+    text_content = ' '.join(p.get_text().strip() for p in paragraphs)
+
+    return {
+        'meta_tags': dict(meta_analysis),
+        'headings': headings,
+        'keywords': keywords,
+        'links': {'internal_links': internal_links, 'external_links': external_links,
+                  'total_internal': len(internal_links), 'total_external': len(external_links)},
+        'images': {'total_images': len(images), 'missing_alt': missing_alt, 'images': images},
+        'content_stats': {
+            'paragraph_count': len(paragraphs),
+            'total_length': len(text_content),
+            'average_paragraph_length': len(text_content) / len(paragraphs) if paragraphs else 0,
+            'readability_score': calculate_readability(text_content)
+        }
+    }
+
+
+def synthetic_page(rng: random.Random, sections: int) -> str:
+    """A rendered marketing page: head metadata, navigation, sections of headings, text, links and images"""
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+    parts = ['<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">',
+             f'<title>{sentence()}</title>',
+             f'<meta name="description" content="{sentence()}">',
+             f'<meta property="og:title" content="{sentence()}">',
+             '<meta name="viewport" content="width=device-width, initial-scale=1">',
+             '<style>body { font-family: sans-serif; } .hero { color: #333; }</style>',
+             '<script>window.dataLayer = window.dataLayer || []; function gtag(){}</script>',
+             '</head><body><header><nav>']
+    for i in range(12):
+        parts.append(f'<a href="/section-{i}">{rng.choice(WORDS).title()}</a>')
+    parts.append('</nav></header><main>')
+    for s in range(sections):
+        parts.append(f'<section><h2>{sentence()}</h2><!-- section {s} -->')
+        for _ in range(rng.randint(2, 5)):
+            link = rng.choice([f'<a href="/blog/{rng.randint(1, 999)}">{rng.choice(WORDS)}</a>',
+                               f'<a href="https://partner{rng.randint(1, 9)}.org/x">{rng.choice(WORDS)} &amp; more</a>',
+                               f'<a href="{BASE_URL}pricing"><b>{rng.choice(WORDS)}</b></a>'])
+            parts.append(f'<p>{sentence()} {link} {sentence()} <em>{sentence()}</em></p>')
+        if rng.random() < 0.5:
+            parts.append(f'<h3>{sentence()}</h3><ul>' +
+                         ''.join(f'<li>{sentence()}</li>' for _ in range(rng.randint(3, 8))) + '</ul>')
+        alt = f' alt="{sentence()}"' if rng.random() < 0.7 else ''
+        parts.append(f'<img src="/img/{s}.webp"{alt} width="640" height="360"></section>')
+    parts.append(f'</main><footer><p>&copy; 2024 {sentence()}</p>'
+                 '<script type="application/ld+json">{"@type": "Organization"}</script></footer></body></html>')
+    return "".join(parts)
+
+
+def load_corpus(corpus: str | None, pages: int) -> list:
+    if corpus:
+        documents = []
+        for path in sorted(glob.glob(os.path.join(corpus, "*.html")))[:pages]:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                documents.append(f.read())
+        return documents
+    rng = random.Random(42)
+    return [synthetic_page(rng, sections=5 + 4 * i) for i in range(pages)]
+
+
+def cpu_per_page(analyze, documents: list, repeat: int) -> list:
+    """Returns the best CPU seconds of each page over `repeat` runs"""
+    timings = []
+    for document in documents:
+        best = None
+        for _ in range(repeat):
+            start = time.process_time()
+            analyze(document, BASE_URL)
+            elapsed = time.process_time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of saved *.html pages (default: synthetic pages)")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus, args.pages)
+    if not documents:
+        sys.exit(f"No *.html pages in {args.corpus}")
+    sizes = [len(document) for document in documents]
+    print(f"{len(documents)} pages, {statistics.median(sizes) / 1024:.0f} KiB median, {max(sizes) / 1024:.0f} KiB max")
+
+    implementations = {"six passes": analyze_multipass,
+                       "one pass (soup)": lambda d, u: analyze_html(d, u, parser="html.parser")}
+    if LXML:
+        implementations["one pass (lxml)"] = analyze_html
+
+    baseline = None
+    for label, analyze in implementations.items():
+        timings = cpu_per_page(analyze, documents, args.repeat)
+        mean = statistics.mean(timings)
+        baseline = baseline or mean
+        differing = sum(analyze(d, BASE_URL) != analyze_multipass(d, BASE_URL) for d in documents)
+        print(f"{label:>16}: {mean * 1000:7.2f} ms CPU/page mean, {max(timings) * 1000:7.2f} ms max, "
+              f"{baseline / mean:4.1f}x, results differ on {differing} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from tools.BrowserlessScraper import BrowserlessScraper
 import asyncio
 from typing import Dict, Any, List
 import logging
-from logging_config import get_logger
+from masumi_agent_server import get_logger
 
 logger = logging.getLogger(__name__)
 
@@ -1,13 +1,9 @@
 from crewai.tools import BaseTool
-from typing import Type, Optional, Dict
+from typing import Type, Dict
 from pydantic import BaseModel, Field
-from bs4 import BeautifulSoup
-from collections import Counter, defaultdict
 import requests
-import json
-import os
-import re
-from urllib.parse import urlparse
+from .browserless_client import BrowserlessError, fetch_page
+from .html_analysis import analyze_html
 
 class BrowserlessScraperInput(BaseModel):
     """Input for BrowserlessScraper"""
@@ -34,48 +30,24 @@ class BrowserlessScraper(BaseTool):
             if not website_url.startswith(('http://', 'https://')):
                 website_url = 'https://' + website_url
 
-            # Configure scraping request with shorter timeout
-            scrape_url = f'https://chrome.browserless.io/content?token={os.getenv("BROWSERLESS_API_KEY")}'
-            
-            payload = {
-                'url': website_url,
-                'gotoOptions': {
-                    'waitUntil': 'domcontentloaded',  # Changed from networkidle0
-                    'timeout': 10000  # 10 seconds timeout
-                }
-            }
-
-            response = requests.post(
-                scrape_url,
-                json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=15  # 15 seconds total timeout
-            )
-
-            if response.status_code != 200:
-                return f"Error: Browserless returned status code {response.status_code}. Response: {response.text}"
+            # Plain GET when the page is server-rendered, browserless render otherwise (cached across tools)
+            try:
+                page = fetch_page(website_url, timeout=15, goto_timeout=10000)
+            except BrowserlessError as e:
+                return f"Error: Browserless returned status code {e.status_code}. Response: {e.text}"
 
             # Parse HTML content directly from response
-            html_content = response.text
+            html_content = page.html
             if not html_content or len(html_content) < 100:  # Basic validation
                 return "Error: Received empty or invalid response from browserless"
 
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
+            # Analyze meta tags, headings, keywords, links, images and paragraphs in one pass
+            analysis = analyze_html(html_content, website_url)
+
             # Verify we got actual HTML content
-            if not soup.find('html'):
+            if analysis is None:
                 return "Error: No HTML content found in response"
 
-            # Analyze page elements
-            analysis = {
-                'meta_tags': self._analyze_meta_tags(soup),
-                'headings': self._analyze_headings(soup),
-                'keywords': self._analyze_keywords(soup),
-                'links': self._analyze_links(soup, website_url),
-                'images': self._analyze_images(soup),
-                'content_stats': self._analyze_content(soup)
-            }
-
             return self._format_results(analysis)
 
         except requests.Timeout:
@@ -85,131 +57,6 @@ class BrowserlessScraper(BaseTool):
         except Exception as e:
             return f"Error scraping website: {str(e)}"
 
-    def _analyze_meta_tags(self, soup: BeautifulSoup) -> Dict:
-        """Analyzes meta tags and their content"""
-        meta_tags = soup.find_all('meta')
-        meta_analysis = defaultdict(list)
-        
-        for tag in meta_tags:
-            name = tag.get('name', tag.get('property', ''))
-            content = tag.get('content', '')
-            if name and content:
-                meta_analysis[name].append(content)
-        
-        return dict(meta_analysis)
-
-    def _analyze_headings(self, soup: BeautifulSoup) -> Dict:
-        """Analyzes heading structure and content"""
-        headings = {}
-        for level in range(1, 7):
-            h_tags = soup.find_all(f'h{level}')
-            if h_tags:
-                headings[f'h{level}'] = [h.get_text().strip() for h in h_tags]
-        return headings
-
-    def _analyze_keywords(self, soup: BeautifulSoup) -> Dict:
-        """Analyzes keyword frequency and density"""
-        # Get text content
-        text = soup.get_text()
-        
-        # Clean and tokenize
-        words = re.findall(r'\b\w+\b', text.lower())
-        
-        # Remove common stop words
-        stop_words = {'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i', 
-                     'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at'}
-        words = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        # Count frequencies
-        word_freq = Counter(words)
-        total_words = len(words)
-        
-        # Calculate density
-        keyword_density = {
-            word: (count / total_words) * 100 
-            for word, count in word_freq.most_common(20)
-        }
-        
-        return {
-            'frequencies': dict(word_freq.most_common(20)),
-            'density': keyword_density,
-            'total_words': total_words,
-            'unique_words': len(set(words))
-        }
-
-    def _analyze_links(self, soup: BeautifulSoup, base_url: str) -> Dict:
-        """Analyzes internal and external links"""
-        base_domain = urlparse(base_url).netloc
-        internal_links = []
-        external_links = []
-        
-        for link in soup.find_all('a', href=True):
-            href = link.get('href', '').strip()
-            text = link.get_text().strip()
-            
-            if href.startswith(('http://', 'https://')):
-                domain = urlparse(href).netloc
-                if domain == base_domain:
-                    internal_links.append({'url': href, 'text': text})
-                else:
-                    external_links.append({'url': href, 'text': text})
-            elif href.startswith('/'):
-                internal_links.append({'url': f"{base_url.rstrip('/')}{href}", 'text': text})
-        
-        return {
-            'internal_links': internal_links,
-            'external_links': external_links,
-            'total_internal': len(internal_links),
-            'total_external': len(external_links)
-        }
-
-    def _analyze_images(self, soup: BeautifulSoup) -> Dict:
-        """Analyzes images and their attributes"""
-        images = []
-        missing_alt = 0
-        
-        for img in soup.find_all('img'):
-            src = img.get('src', '')
-            alt = img.get('alt', '')
-            if not alt:
-                missing_alt += 1
-            images.append({
-                'src': src,
-                'alt': alt,
-                'width': img.get('width', ''),
-                'height': img.get('height', '')
-            })
-        
-        return {
-            'total_images': len(images),
-            'missing_alt': missing_alt,
-            'images': images
-        }
-
-    def _analyze_content(self, soup: BeautifulSoup) -> Dict:
-        """Analyzes overall content structure and statistics"""
-        paragraphs = soup.find_all('p')
-        text_content = ' '.join(p.get_text().strip() for p in paragraphs)
-        
-        return {
-            'paragraph_count': len(paragraphs),
-            'total_length': len(text_content),
-            'average_paragraph_length': len(text_content) / len(paragraphs) if paragraphs else 0,
-            'readability_score': self._calculate_readability(text_content)
-        }
-
-    def _calculate_readability(self, text: str) -> float:
-        """Calculates a basic readability score"""
-        sentences = len(re.split(r'[.!?]+', text))
-        words = len(re.findall(r'\b\w+\b', text))
-        syllables = len(re.findall(r'[aeiou]+', text.lower()))
-        
-        if sentences == 0 or words == 0:
-            return 0
-            
-        # Simple Flesch Reading Ease score
-        return 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
-
     def _format_results(self, analysis: Dict) -> str:
         """Formats the analysis results into a readable report"""
         report = ["=== Website Content Analysis ===\n"]
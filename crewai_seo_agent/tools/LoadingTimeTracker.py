@@ -2,21 +2,17 @@
 # - crewai.tools.BaseTool: Base class for creating custom tools
 # - typing: For type hints
 # - pydantic: For data validation and settings management
-# - requests: For making HTTP requests
-# - time: For timing measurements
-# - urlparse: For parsing URLs
-# - os: For environment variable access
-# - statistics: For statistical calculations
+# - sqlite3: For errors of the history store
 # - datetime: For date and time operations
+# - load_timing: For concurrent, per-phase timing samples
+# - load_history: For the load times of earlier audits
 from crewai.tools import BaseTool
-from typing import Type, Dict
+from typing import Type, Dict, List
 from pydantic import BaseModel, Field
-import requests
-import time
-import os
-import statistics
+import sqlite3
 from datetime import datetime
-from urllib.parse import urlparse
+from .load_timing import PERCENTILES, measure, summarize
+from .load_history import get_load_history
 
 # Define input schema requiring a URL to test
 class LoadingTimeInput(BaseModel):
@@ -29,89 +25,59 @@ class LoadingTimeTracker(BaseTool):
     # Tool metadata
     name: str = "Loading Time Tracker"
     description: str = """
-    Tracks website loading times using browserless.io:
-    - Measures full page load time
-    - Takes multiple samples
-    - Provides min/max/average times
-    - Tracks network requests
+    Tracks website loading times:
+    - Takes multiple samples concurrently
+    - Breaks each load down into DNS, connect, TLS, time to first byte and download
+    - Provides p50/p90/p99 and min/max/average times
+    - Reports the page size transferred
+    - Compares with earlier audits of the site (change, trend, regressions)
     """
     args_schema: Type[BaseModel] = LoadingTimeInput
 
     def _run(self, website_url: str, samples: int = 3) -> str:
         """Runs the loading time analysis"""
         try:
-            # Reduce samples for faster analysis
-            samples = min(samples, 10)  # Maximum 2 samples instead of 3
-            
+            samples = max(1, min(samples, 10))
+
             # Clean up URL
             website_url = website_url.strip('"')
             if not website_url.startswith(('http://', 'https://')):
                 website_url = 'https://' + website_url
 
-            # Get browserless API key
-            browserless_api_key = os.getenv('BROWSERLESS_API_KEY')
-            if not browserless_api_key:
-                return "Error: BROWSERLESS_API_KEY not found in environment variables"
+            # All samples at once, the analysis takes about as long as the slowest one
+            results = measure(website_url, samples)
+            summary = summarize(results)
+            if summary is None:
+                errors = {sample.error or f"status code {sample.status_code}" for sample in results}
+                return f"Error: Could not collect loading time samples ({'; '.join(sorted(errors))})"
 
-            # Configure browserless request
-            scrape_url = f'https://chrome.browserless.io/content?token={browserless_api_key}'
-
-            load_times = []
-            total_sizes = []
-            
-            for i in range(samples):
-                try:
-                    start_time = time.time()
-                    
-                    # Basic payload for content endpoint
-                    payload = {
-                        'url': website_url,
-                        'gotoOptions': {
-                            'waitUntil': 'domcontentloaded',
-                            'timeout': 15000
-                        }
-                    }
-
-                    response = requests.post(
-                        scrape_url,
-                        json=payload,
-                        headers={'Content-Type': 'application/json'},
-                        timeout=20
-                    )
-
-                    if response.status_code == 200:
-                        end_time = time.time()
-                        load_time = end_time - start_time
-                        load_times.append(load_time)
-                        total_sizes.append(len(response.content) / (1024 * 1024))  # Size in MB
-                        
-                    time.sleep(1)  # Reduced from 2
-                    
-                except Exception as e:
-                    print(f"Error in sample {i + 1}: {str(e)}")
-                    continue
-
-            if not load_times:
-                return "Error: Could not collect loading time samples"
-
-            # Calculate statistics
-            avg_load_time = statistics.mean(load_times)
-            min_load_time = min(load_times)
-            max_load_time = max(load_times)
-            std_dev = statistics.stdev(load_times) if len(load_times) > 1 else 0
-            avg_size = statistics.mean(total_sizes)
+            total = summary['total']
+            phases = summary['phases']
 
             # Format results
             report = [
                 f"\n=== Loading Time Analysis for {website_url} ===\n",
-                f"Samples collected: {len(load_times)}",
-                f"Average load time: {avg_load_time:.2f} seconds",
-                f"Minimum load time: {min_load_time:.2f} seconds",
-                f"Maximum load time: {max_load_time:.2f} seconds",
-                f"Standard deviation: {std_dev:.2f} seconds",
-                f"Average page size: {avg_size:.2f} MB",
+                f"Samples collected: {summary['samples']}" + (f" ({summary['failed']} failed)" if summary['failed'] else ""),
+                f"Median load time: {total['p50']:.2f} seconds",
+                *(f"p{q} load time: {total[f'p{q}']:.2f} seconds" for q in PERCENTILES if q != 50),
+                f"Average load time: {total['mean']:.2f} seconds",
+                f"Minimum load time: {total['min']:.2f} seconds",
+                f"Maximum load time: {total['max']:.2f} seconds",
+                f"Standard deviation: {total['stdev']:.2f} seconds",
+                f"Average page size: {summary['size'] / 1024:.1f} KB",
+                "\nMedian time per phase:",
+                f"DNS lookup: {phases['dns'] * 1000:.0f} ms",
+                f"TCP connect: {phases['connect'] * 1000:.0f} ms",
+                f"TLS handshake: {phases['tls'] * 1000:.0f} ms",
+                f"Time to first byte: {phases['ttfb'] * 1000:.0f} ms",
+                f"Download: {phases['download'] * 1000:.0f} ms",
+            ]
+            if summary['redirects']:
+                report.append(f"Redirects: {summary['redirects']} (included in the times above)")
+            report += self._history_report(website_url, summary)
+            report += [
                 "\nPerformance Rating:",
-                self._get_performance_rating(avg_load_time)
+                self._get_performance_rating(total['p50'])
             ]
 
             return "\n".join(report)
@@ -119,13 +85,40 @@ class LoadingTimeTracker(BaseTool):
         except Exception as e:
             return f"Error tracking loading time: {str(e)}"
 
-    def _get_performance_rating(self, avg_load_time: float) -> str:
-        """Returns a performance rating based on average load time"""
-        if avg_load_time <= 2:
+    def _history_report(self, url: str, summary: Dict) -> List[str]:
+        """Compares the measurement with earlier audits of the site, then stores it"""
+        try:
+            history = get_load_history()
+            previous = history.compare(url, summary)
+            regression = history.regression(url, summary)
+            history.append(url, summary)
+            trend = history.trend(url)
+        except sqlite3.Error as e:
+            return [f"\nHistory: unavailable ({str(e)})"]
+
+        if previous is None:
+            return ["\nHistory: first audit of this site"]
+        change = previous['change']
+        since = datetime.fromtimestamp(previous['measured_at']).strftime('%Y-%m-%d')
+        lines = [
+            "\nHistory:",
+            f"Median load time {'up' if change >= 0 else 'down'} {abs(change) * 100:.0f}% since the last audit "
+            f"({since}, {previous['p50']:.2f} seconds)"
+        ]
+        if regression['regressed']:
+            lines.append(f"Regression: {regression['change'] * 100:.0f}% slower than the median of the last "
+                         f"{regression['measurements']} audits ({regression['baseline']:.2f} seconds)")
+        if trend is not None:
+            lines.append(f"Trend: {trend * 100:+.1f}% per day over the recent audits")
+        return lines
+
+    def _get_performance_rating(self, load_time: float) -> str:
+        """Returns a performance rating based on the median load time"""
+        if load_time <= 2:
             return "Excellent (Under 2 seconds)"
-        elif avg_load_time <= 3:
+        elif load_time <= 3:
             return "Good (2-3 seconds)"
-        elif avg_load_time <= 5:
+        elif load_time <= 5:
             return "Fair (3-5 seconds)"
         else:
             return "Poor (Over 5 seconds)"
@@ -139,53 +132,38 @@ class LoadingTimeTracker(BaseTool):
             num_samples: Number of samples to take (default 3)
             
         Returns:
-            Dict containing average, min and max load times in seconds
+            Dict containing average, min, max and p50/p90/p99 load times in seconds
         """
         # Ensure URL has protocol
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
-            
-        load_times = []
-        
-        # Take multiple samples of load time measurements
-        for _ in range(num_samples):
-            try:
-                start_time = time.time()
-                response = requests.get(url, timeout=10)  # 10 second timeout
-                end_time = time.time()
-                
-                if response.status_code == 200:
-                    load_time = end_time - start_time
-                    load_times.append(load_time)
-                    
-            except (requests.RequestException, TimeoutError):
-                continue
-                
-            time.sleep(0.5)  # Reduced pause between requests
-            
+
+        summary = summarize(measure(url, num_samples, timeout=10))
+
         # Return null results if no measurements succeeded
-        if not load_times:
+        if summary is None:
             return {
                 'average': None,
                 'min': None,
                 'max': None,
                 'samples': 0
             }
-            
+
         # Calculate statistics from measurements
+        total = summary['total']
         results = {
-            'average': sum(load_times) / len(load_times),
-            'min': min(load_times),
-            'max': max(load_times),
-            'samples': len(load_times)
+            'average': total['mean'],
+            'min': total['min'],
+            'max': total['max'],
+            'samples': summary['samples'],
+            **{f'p{q}': total[f'p{q}'] for q in PERCENTILES}
         }
-        
-        # Store the average in history keyed by domain
-        domain = urlparse(url).netloc
-        self.history[domain] = results['average']
-        
+
+        # Store the measurement in the history, keyed by domain
+        get_load_history().append(url, summary)
+
         return results
-    
+
     def get_history(self) -> Dict[str, float]:
-        """Get the history of average load times by domain"""
-        return self.history
+        """Get the latest average load time of every domain"""
+        return get_load_history().latest()
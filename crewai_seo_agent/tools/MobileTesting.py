@@ -1,135 +1,111 @@
 # Import required libraries:
 # - crewai.tools.BaseTool: Base class for creating custom tools
-# - selenium: For browser automation and testing
 # - pydantic: For data validation and settings management
 # - typing: For type hints
+# - mobile_audit: For parsing and auditing the pages
 from crewai.tools import BaseTool
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from typing import Dict, Optional, Type
+from typing import Dict, List, Type
 from pydantic import BaseModel, Field
-from selenium.common.exceptions import TimeoutException
+import re
+import asyncio
 import logging
-import os
-import time
-import requests
-import json
+from contextvars import copy_context
+from concurrent.futures import ThreadPoolExecutor
+from .browserless_client import MOBILE_VIEWPORT, BrowserlessError, fetch_page, fetch_stylesheet
+from .mobile_audit import audit_pages
 
 logger = logging.getLogger(__name__)
 
+# Pages of a batch fetched at the same time
+BATCH_CONCURRENCY = 4
+
 # Define input schema for the mobile testing tool
 class MobileTestingInput(BaseModel):
     """Input for MobileTesting"""
-    url: str = Field(..., description="The URL to test for mobile optimization")
+    url: str = Field(..., description="The URL to test for mobile optimization, or several separated by commas")
     timeout: int = Field(default=30, description="Timeout in seconds for the test")
 
 # Main mobile optimization testing tool
 class MobileOptimizationTool(BaseTool):
     """Tool that tests websites for mobile-friendliness by checking:
-    - Viewport meta tag
-    - Text readability 
-    - Tap target sizes
+    - Viewport meta tag (device width, pinch-zoom)
+    - Text readability (font-size declarations)
+    - Tap target counts and sizes
     - Responsive images
+    - Media queries of the page's styles
     """
     
     # Tool metadata
     name: str = "Mobile Optimization Tester"
-    description: str = "Tests website for mobile optimization and responsiveness"
+    description: str = """Tests website for mobile optimization and responsiveness.
+    Pass several page URLs separated by commas to test the pages of a crawl in one batch."""
     args_schema: Type[BaseModel] = MobileTestingInput
 
-    def __init__(self):
-        super().__init__()
-
-    def _setup_driver(self):
-        chrome_options = Options()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--window-size=375,812')  # iPhone X dimensions
-        
-        # Add proxy support if needed
-        if os.getenv('PROXY_URL'):
-            chrome_options.add_argument(f'--proxy-server={os.getenv("PROXY_URL")}')
-            
-        return webdriver.Chrome(options=chrome_options)
-
     def _run(self, url: str, timeout: int = 30) -> Dict:
-        """Run mobile optimization tests using browserless.io API directly"""
-        try:
-            # Clean URL
-            url = url.strip('"')
-            if not url.startswith(('http://', 'https://')):
-                url = 'https://' + url
+        """Runs the mobile optimization tests on one page, or on a batch of pages"""
+        urls = _page_urls(url)
+        with ThreadPoolExecutor(max_workers=min(len(urls), BATCH_CONCURRENCY) or 1) as pool:
+            # Copy the context, so the fetches are attributed to the job
+            fetched = list(pool.map(lambda page_url: copy_context().run(_fetch, page_url, timeout), urls))
+        return self._report(urls, fetched)
 
-            # Use browserless.io API directly
-            api_url = f'https://chrome.browserless.io/content?token={os.getenv("BROWSERLESS_API_KEY")}'
-            
-            payload = {
-                'url': url,
-                'gotoOptions': {
-                    'waitUntil': 'domcontentloaded',
-                    'timeout': timeout * 1000
-                },
-                'viewport': {
-                    'width': 375,  # Mobile viewport
-                    'height': 667,
-                    'deviceScaleFactor': 2,
-                    'isMobile': True,
-                    'hasTouch': True
-                }
-            }
+    async def _arun(self, url: str, timeout: int = 30) -> Dict:
+        """Async version of _run, fetching and auditing in worker threads"""
+        urls = _page_urls(url)
+        limit = asyncio.Semaphore(BATCH_CONCURRENCY)
 
-            response = requests.post(api_url, json=payload, timeout=timeout)
-            
-            if response.status_code != 200:
-                return {
-                    "error": f"Failed to fetch content: {response.status_code}",
-                    "status": "error"
-                }
+        async def fetch(page_url):
+            async with limit:
+                return await asyncio.to_thread(_fetch, page_url, timeout)
 
-            # Parse the content
-            content = response.text
-            
-            return {
-                "viewport_meta": "viewport" in content.lower(),
-                "touch_elements": self._analyze_touch_elements(content),
-                "font_sizes": self._analyze_font_sizes(content),
-                "responsive_images": self._analyze_responsive_images(content),
-                "status": "success"
-            }
+        fetched = await asyncio.gather(*(fetch(page_url) for page_url in urls))
+        return await asyncio.to_thread(self._report, urls, fetched)
 
+    def _report(self, urls: List[str], fetched: List) -> Dict:
+        """Audits the fetched pages in one pass, sharing their stylesheets"""
+        if not urls:
+            return {"error": "No URL given", "status": "error"}
+        try:
+            documents = {page_url: content for page_url, content in zip(urls, fetched) if isinstance(content, str)}
+            reports = audit_pages(documents, fetch_stylesheet)
+            results = {}
+            for page_url, content in zip(urls, fetched):
+                if page_url in reports:
+                    results[page_url] = {**reports[page_url], "status": "success"}
+                else:
+                    results[page_url] = {"error": content["error"], "status": "error"}
         except Exception as e:
             logger.error(f"Mobile testing error: {str(e)}")
             return {
                 "error": str(e),
                 "status": "error"
             }
+        if len(urls) == 1:
+            return results[urls[0]]
+        return {"pages": results, "status": "success"}
 
-    def _analyze_touch_elements(self, content: str) -> Dict:
-        """Analyze touch elements in content"""
-        return {
-            "clickable_elements": content.count("<a ") + content.count("<button"),
-            "status": "success"
-        }
 
-    def _analyze_font_sizes(self, content: str) -> Dict:
-        """Analyze font sizes in content"""
-        return {
-            "text_elements": content.count("<p") + content.count("<span"),
-            "status": "success"
-        }
+def _page_urls(url: str) -> List[str]:
+    """Splits and cleans up the URLs of the tool input"""
+    urls = []
+    for part in re.split(r'[,\s]+', url.strip().strip('"')):
+        part = part.strip('"')
+        if not part:
+            continue
+        if not part.startswith(('http://', 'https://')):
+            part = 'https://' + part
+        if part not in urls:
+            urls.append(part)
+    return urls
 
-    def _analyze_responsive_images(self, content: str) -> Dict:
-        """Analyze responsive images in content"""
-        return {
-            "total_images": content.count("<img"),
-            "responsive_images": content.count("srcset=") + content.count("sizes="),
-            "status": "success"
-        }
 
-    async def _arun(self, url: str, timeout: int = 180) -> Dict:
-        """Async version - not implemented"""
-        raise NotImplementedError("Async not implemented")
+def _fetch(url: str, timeout: int):
+    """Returns the HTML of a page as a mobile device gets it, or {"error": ...}"""
+    try:
+        # Plain GET with a mobile user agent, or a browserless render with a mobile viewport
+        return fetch_page(url, timeout=timeout, viewport=MOBILE_VIEWPORT).html
+    except BrowserlessError as e:
+        return {"error": f"Failed to fetch content: {e.status_code}"}
+    except Exception as e:
+        logger.error(f"Mobile testing error for {url}: {str(e)}")
+        return {"error": str(e)}
@@ -1,12 +1,10 @@
 from crewai.tools import BaseTool
-from typing import Type, Optional, Dict, List
+from typing import Type, Optional, Dict, List, Tuple
 from pydantic import BaseModel, Field
-import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
 import logging
-import time
-import os
+from .browserless_client import BrowserlessError, fetch_page
+from .crawler import crawl_sync, crawler_from_env
 
 logger = logging.getLogger(__name__)
 
@@ -15,103 +13,66 @@ class SubpageAnalyzerInput(BaseModel):
     website_url: str = Field(..., description="The URL of the website to analyze")
     max_pages: int = Field(default=10, description="Maximum number of subpages to analyze")
     min_content_length: int = Field(default=100, description="Minimum content length to consider")
+    max_depth: Optional[int] = Field(default=None, description="Link distance from the start page to crawl (default: 2)")
 
 class SubpageAnalyzer(BaseTool):
     name: str = "Subpage Analyzer"
     description: str = """
     Analyzes website subpages by:
-    - Finding all accessible pages
+    - Crawling the accessible pages of the site
     - Analyzing content quality
     - Measuring user engagement signals
     - Ranking pages by importance
     """
     args_schema: Type[BaseModel] = SubpageAnalyzerInput
 
-    def _run(self, website_url: str, max_pages: int = 10, min_content_length: int = 100) -> str:
+    def _run(self, website_url: str, max_pages: int = 10, min_content_length: int = 100,
+             max_depth: Optional[int] = None) -> str:
         try:
-            # Use browserless.io for initial page fetch
-            api_url = f'https://chrome.browserless.io/content?token={os.getenv("BROWSERLESS_API_KEY")}'
-            
-            payload = {
-                'url': website_url,
-                'gotoOptions': {
-                    'waitUntil': 'domcontentloaded',
-                    'timeout': 30000
-                }
-            }
-
-            response = requests.post(api_url, json=payload, timeout=30)
-            
-            if response.status_code != 200:
-                return "No subpages found or analysis failed"
-
-            # Parse content and find links
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = self._extract_links(soup, website_url)
-            
-            # Analyze found pages
-            analyzed_pages = []
-            for link in links[:max_pages]:
-                page_data = self._analyze_page(link)
-                if page_data and page_data.get('content_length', 0) >= min_content_length:
-                    analyzed_pages.append(page_data)
+            # Crawl the subpages concurrently, the root only provides links
+            crawler = crawler_from_env(self._visit, max_pages=max_pages, max_depth=max_depth)
+            pages = crawl_sync(crawler, website_url)
 
+            analyzed_pages = [page.result for page in pages
+                              if page.result.get('content_length', 0) >= min_content_length]
             return self._format_results(analyzed_pages)
 
         except Exception as e:
             logger.error(f"Subpage analysis error: {str(e)}")
             return "Analysis failed: " + str(e)
 
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> List[str]:
-        """Extract valid internal links from page"""
-        base_domain = urlparse(base_url).netloc
-        links = set()
-        
-        for a in soup.find_all('a', href=True):
-            href = a['href']
-            full_url = urljoin(base_url, href)
-            
-            if urlparse(full_url).netloc == base_domain:
-                links.add(full_url)
-                
-        return list(links)
-
-    def _analyze_page(self, url: str) -> Optional[Dict]:
-        """Analyze a single page"""
+    def _visit(self, url: str, depth: int) -> Tuple[Optional[Dict], List[str]]:
+        """Renders a page of the crawl, returning its metrics (None for the root) and its links"""
         try:
-            # Use browserless.io for consistent page fetching
-            api_url = f'https://chrome.browserless.io/content?token={os.getenv("BROWSERLESS_API_KEY")}'
-            
-            payload = {
-                'url': url,
-                'gotoOptions': {
-                    'waitUntil': 'domcontentloaded',
-                    'timeout': 20000
-                }
-            }
-
-            response = requests.post(api_url, json=payload, timeout=20)
-            
-            if response.status_code != 200:
-                return None
+            # Plain GET or browserless render, cached (the scraper fetches the root too)
+            page = fetch_page(url, timeout=30 if depth == 0 else 20)
+        except BrowserlessError:
+            return None, []
 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            return {
-                'url': url,
-                'title': soup.title.string if soup.title else url,
-                'content_length': len(soup.get_text()),
-                'headings': len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])),
-                'images': len(soup.find_all('img')),
-                'internal_links': len([a for a in soup.find_all('a', href=True) 
-                                    if not a['href'].startswith(('http', 'https'))]),
-                'external_links': len([a for a in soup.find_all('a', href=True) 
-                                    if a['href'].startswith(('http', 'https'))]),
-                'importance_score': self._calculate_importance(soup)
-            }
+        soup = BeautifulSoup(page.html, 'html.parser')
+        links = [a['href'] for a in soup.find_all('a', href=True)]
+        if depth == 0:
+            return None, links
+        try:
+            return self._analyze_page(url, soup), links
         except Exception as e:
             logger.error(f"Page analysis error for {url}: {str(e)}")
-            return None
+            return None, links
+
+    def _analyze_page(self, url: str, soup: BeautifulSoup) -> Dict:
+        """Analyze a single page"""
+        return {
+            'url': url,
+            'title': soup.title.string if soup.title else url,
+            'content_length': len(soup.get_text()),
+            'headings': len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])),
+            'images': len(soup.find_all('img')),
+            'internal_links': len([a for a in soup.find_all('a', href=True)
+                                if not a['href'].startswith(('http', 'https'))]),
+            'external_links': len([a for a in soup.find_all('a', href=True)
+                                if a['href'].startswith(('http', 'https'))]),
+            'importance_score': self._calculate_importance(soup)
+        }
 
     def _calculate_importance(self, soup: BeautifulSoup) -> float:
         """Calculate page importance score"""
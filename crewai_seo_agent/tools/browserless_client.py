@@ -0,0 +1,286 @@
+import os
+import re
+import logging
+import threading
+from urllib.parse import urlsplit
+import httpx
+import requests
+from masumi_agent_server import CachedPage, ResultCache, get_page_cache, get_retry_policy
+
+logger = logging.getLogger(__name__)
+
+BROWSERLESS_HOST = "chrome.browserless.io"
+BROWSERLESS_CONTENT_URL = f"https://{BROWSERLESS_HOST}/content"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Viewport the mobile tests render with (iPhone SE)
+MOBILE_VIEWPORT = {
+    'width': 375,
+    'height': 667,
+    'deviceScaleFactor': 2,
+    'isMobile': True,
+    'hasTouch': True
+}
+
+
+class BrowserlessError(Exception):
+    """Browserless answered with a status other than 200"""
+
+    def __init__(self, status_code: int, text: str, retry_after: str = None):
+        super().__init__(f"Browserless returned status code {status_code}")
+        self.status_code = status_code
+        self.text = text
+        self.retry_after = retry_after
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Throttling, server errors and failed connections are retried; timeouts
+    are not, a page too slow to render once is as slow the next time
+    """
+    if isinstance(error, BrowserlessError):
+        return error.status_code in RETRY_STATUSES
+    return isinstance(error, requests.ConnectionError) and not isinstance(error, requests.Timeout)
+
+
+def counts_as_failure(error: Exception) -> bool:
+    """Timeouts are not retried, but a Browserless that keeps timing out is down"""
+    return isinstance(error, requests.Timeout)
+
+
+def render_options(viewport: dict = None) -> dict:
+    """Returns the page cache options of a Browserless render"""
+    return {'renderer': 'browserless', 'wait_until': 'domcontentloaded', 'viewport': viewport}
+
+
+def page_from_response(response: requests.Response) -> CachedPage:
+    """Turns a Browserless /content response into a cacheable page"""
+    return CachedPage(
+        response.text,
+        status_code=response.status_code,
+        etag=response.headers.get('etag'),
+        last_modified=response.headers.get('last-modified')
+    )
+
+
+def fetch_rendered_page(url: str, timeout: float = 20, goto_timeout: int = None,
+                        viewport: dict = None) -> CachedPage:
+    """
+    Renders a page through Browserless, answering repeat requests from the page cache
+
+    The homepage is requested by several tools of one SEO job; the first
+    render serves all of them and later jobs for the same site. Failed
+    renders are retried under the shared "browserless" retry policy.
+
+    Args:
+        url: Page to render
+        timeout: Seconds for the whole request
+        goto_timeout: Milliseconds Browserless waits for the page (default: timeout)
+        viewport: Browserless viewport, None for the desktop default
+
+    Raises:
+        BrowserlessError: Browserless did not answer with 200
+        requests.RequestException: The request itself failed
+        CircuitOpenError: Browserless failed repeatedly, no request was made
+    """
+    def render():
+        payload = {
+            'url': url,
+            'gotoOptions': {
+                'waitUntil': 'domcontentloaded',
+                'timeout': goto_timeout or int(timeout * 1000)
+            }
+        }
+        if viewport:
+            payload['viewport'] = viewport
+        response = requests.post(
+            BROWSERLESS_CONTENT_URL,
+            params={'token': os.getenv('BROWSERLESS_API_KEY')},
+            json=payload,
+            headers={'Content-Type': 'application/json'},
+            timeout=timeout
+        )
+        if response.status_code != 200:
+            raise BrowserlessError(response.status_code, response.text, response.headers.get('retry-after'))
+        return page_from_response(response)
+
+    def fetch():
+        return get_retry_policy("browserless").call(BROWSERLESS_HOST, render, retryable=is_retryable,
+                                                     counts_as_failure=counts_as_failure)
+
+    return get_page_cache().get_or_fetch(url, fetch, render_options(viewport))
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Static fetch fast path
+# ─────────────────────────────────────────────────────────────────────────────
+
+STATIC_USER_AGENTS = {
+    'desktop': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+               '(KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'mobile': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 '
+              '(KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1'
+}
+
+# Empty mount points of client-side rendered apps (React, Vue, Next.js, Nuxt, Angular, Svelte)
+SPA_ROOT = re.compile(
+    r'<(?:div|main)[^>]*\bid=["\']?(?:root|app|__next|__nuxt|svelte|main-app)["\']?[^>]*>\s*</(?:div|main)>'
+    r'|<app-root[^>]*>\s*</app-root>',
+    re.IGNORECASE
+)
+NOSCRIPT_HINT = re.compile(
+    r'<noscript[^>]*>[^<]*(?:<[^/][^>]*>[^<]*)*?(?:enable|requires?|need|turn on)[^<]{0,40}javascript',
+    re.IGNORECASE
+)
+INVISIBLE = re.compile(r'<(script|style|noscript|template)\b.*?</\1\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r'<[^>]+>')
+
+# Pages with less visible text than this are treated as rendered by JavaScript
+MIN_STATIC_TEXT = 200
+
+_static_client = None
+_static_client_lock = threading.Lock()
+
+# Per domain: 'static' when its pages came back complete from a plain GET,
+# 'render' when they needed Browserless. Kept in memory for STATIC_DECISION_TTL.
+_decisions = ResultCache(path=None, ttl=float(os.getenv('STATIC_DECISION_TTL', '86400')), max_entries=4096)
+
+_stats = {'static': 0, 'rendered': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(field: str) -> None:
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def fetch_stats() -> dict:
+    """Returns the pages served statically (each one a render avoided) and the pages rendered since startup"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _get_static_client() -> httpx.Client:
+    global _static_client
+    with _static_client_lock:
+        if _static_client is None:
+            max_connections = int(os.getenv('STATIC_FETCH_MAX_CONNECTIONS', '20'))
+            _static_client = httpx.Client(
+                timeout=float(os.getenv('STATIC_FETCH_TIMEOUT', '10')),
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+                headers={'Accept': 'text/html,application/xhtml+xml', 'Accept-Language': 'en-US,en;q=0.9'}
+            )
+        return _static_client
+
+
+def needs_rendering(html: str) -> bool:
+    """
+    Returns whether a page fetched without a browser depends on JavaScript
+
+    True for an (almost) empty body, an empty single page app mount point
+    or a <noscript> asking to enable JavaScript.
+    """
+    if SPA_ROOT.search(html) or NOSCRIPT_HINT.search(html):
+        return True
+    text = TAG.sub(' ', INVISIBLE.sub(' ', html))
+    return len(' '.join(text.split())) < MIN_STATIC_TEXT
+
+
+class StaticFetchError(Exception):
+    """The plain GET did not return an HTML page"""
+
+    def __init__(self, message: str, blocked: bool = False):
+        super().__init__(message)
+        self.blocked = blocked
+
+
+def fetch_static_page(url: str, viewport: dict = None) -> CachedPage:
+    """
+    Fetches a page with a plain pooled HTTP GET, through the page cache
+
+    Raises:
+        StaticFetchError: The response is not a 200 HTML page
+        httpx.HTTPError: The request itself failed
+    """
+    device = 'mobile' if viewport and viewport.get('isMobile') else 'desktop'
+
+    def fetch():
+        response = _get_static_client().get(url, headers={'User-Agent': STATIC_USER_AGENTS[device]})
+        if response.status_code != 200:
+            # Bot protection answers plain clients with 403/429/503, a browser gets through
+            raise StaticFetchError(f"status code {response.status_code}",
+                                   blocked=response.status_code in (401, 403, 429, 503))
+        if 'html' not in response.headers.get('content-type', 'text/html'):
+            raise StaticFetchError(f"content type {response.headers.get('content-type')}")
+        return CachedPage(
+            response.text,
+            status_code=response.status_code,
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified')
+        )
+
+    return get_page_cache().get_or_fetch(url, fetch, {'renderer': 'static', 'device': device})
+
+
+def fetch_stylesheet(url: str) -> str | None:
+    """Returns the text of a stylesheet fetched through the page cache, None if it cannot be fetched"""
+    def fetch():
+        response = _get_static_client().get(url, headers={'User-Agent': STATIC_USER_AGENTS['desktop'],
+                                                          'Accept': 'text/css,*/*;q=0.1'})
+        if response.status_code != 200:
+            raise StaticFetchError(f"status code {response.status_code}")
+        return CachedPage(
+            response.text,
+            status_code=response.status_code,
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified')
+        )
+
+    try:
+        return get_page_cache().get_or_fetch(url, fetch, {'renderer': 'static', 'type': 'css'}).html
+    except (StaticFetchError, httpx.HTTPError) as e:
+        logger.info(f"Could not fetch stylesheet {url}: {str(e)}")
+        return None
+
+
+def fetch_page(url: str, timeout: float = 20, goto_timeout: int = None, viewport: dict = None) -> CachedPage:
+    """
+    Returns the HTML of a page, rendering it through Browserless only when needed
+
+    A render already in the page cache is used as is. Otherwise the page is
+    fetched with a plain HTTP GET first; server-rendered pages are returned
+    as they are, pages that depend on JavaScript (see needs_rendering()) or
+    that a plain client cannot fetch are rendered. The decision is
+    remembered per domain, so sites that need rendering skip the GET.
+
+    Raises:
+        The errors of fetch_rendered_page()
+    """
+    cached = get_page_cache().get(url, render_options(viewport))
+    if cached is not None:
+        return cached
+
+    domain = urlsplit(url).netloc.lower()
+    decision = _decisions.get(domain)
+    if decision != 'render':
+        try:
+            page = fetch_static_page(url, viewport)
+            if not needs_rendering(page.html):
+                if decision is None:
+                    _decisions.put(domain, 'static')
+                _count('static')
+                return page
+            logger.info(f"{url} depends on JavaScript, rendering {domain} through Browserless from now on")
+            _decisions.put(domain, 'render')
+        except StaticFetchError as e:
+            logger.info(f"Static fetch of {url} failed ({str(e)}), rendering it")
+            if e.blocked:
+                _decisions.put(domain, 'render')
+        except httpx.HTTPError as e:
+            logger.info(f"Static fetch of {url} failed ({type(e).__name__}), rendering it")
+
+    page = fetch_rendered_page(url, timeout=timeout, goto_timeout=goto_timeout, viewport=viewport)
+    _count('rendered')
+    return page
@@ -0,0 +1,252 @@
+"""
+Concurrent breadth-first crawler for the SEO tools
+
+SubpageAnalyzer used to render the subpages one after another, up to 20 s
+each, so a 10 page crawl could take minutes. The crawler keeps a frontier
+of normalized, deduplicated URLs and visits several of them at once, at
+most `per_host_concurrency` per host, honouring robots.txt (including its
+Crawl-delay). It stops at `max_pages`, `max_depth` or after `time_budget`
+seconds, returning what it has visited, so the job still finishes before
+its submitResultTime.
+"""
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+from masumi_agent_server.progress import as_job, current_job_id
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "MasumiSEOAgent"
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Links to files that are not pages are not rendered
+SKIPPED_EXTENSIONS = re.compile(
+    r"\.(?:pdf|zip|gz|rar|7z|exe|dmg|jpe?g|png|gif|webp|svg|ico|mp3|mp4|mov|avi|webm|css|js|xml|json|txt)$",
+    re.IGNORECASE
+)
+
+# Longest Crawl-delay honoured, a site asking for more still gets crawled within the budget
+MAX_CRAWL_DELAY = 5
+
+ROBOTS_TIMEOUT = 5
+
+
+def normalize_url(url: str, base: str = None) -> Optional[str]:
+    """
+    Returns the canonical form of a link, None if it is not an http(s) URL
+
+    Resolves it against `base`, lowercases scheme and host, drops default
+    ports, user info and the fragment, collapses duplicate and trailing
+    slashes and sorts the query parameters, so different spellings of a
+    page are crawled once.
+    """
+    if base:
+        url = urljoin(base, url.strip())
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc += f":{port}"
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+@dataclass
+class CrawlResult:
+    url: str
+    depth: int
+    result: object
+
+
+class Crawler:
+    """
+    Crawls the pages of a site breadth first, visiting several at once
+
+    `visit(url, depth)` does the actual work in a worker thread (rendering,
+    parsing) and returns (result, links); None results are left out, links
+    are added to the frontier while `max_depth` allows. Only links on the
+    root's host are followed.
+
+    Args:
+        visit: Called for every page, returns (result or None, links found on the page)
+        max_pages: Pages visited besides the root
+        max_depth: Link distance from the root followed
+        per_host_concurrency: Pages of one host visited at the same time
+        time_budget: Seconds after which the crawl stops and returns what it has
+        respect_robots: Skip pages robots.txt disallows and wait its Crawl-delay
+    """
+
+    def __init__(self, visit: Callable[[str, int], Tuple[object, List[str]]], max_pages: int = 10,
+                 max_depth: int = 2, per_host_concurrency: int = 4, time_budget: float = 120,
+                 respect_robots: bool = True):
+        self.visit = visit
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.per_host_concurrency = per_host_concurrency
+        self.time_budget = time_budget
+        self.respect_robots = respect_robots
+        self._robots = {}
+        self._host_limits = {}
+        self._last_request = {}
+
+    async def _robots_for(self, client: httpx.AsyncClient, url: str) -> RobotFileParser:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        if origin not in self._robots:
+            robots = RobotFileParser(f"{origin}/robots.txt")
+            try:
+                response = await client.get(robots.url)
+                # Same rules as RobotFileParser.read()
+                if response.status_code in (401, 403):
+                    robots.disallow_all = True
+                elif response.status_code >= 400:
+                    robots.allow_all = True
+                else:
+                    robots.parse(response.text.splitlines())
+            except httpx.HTTPError as e:
+                logger.info(f"No robots.txt for {origin} ({type(e).__name__}), crawling all pages")
+                robots.allow_all = True
+            self._robots[origin] = robots
+        return self._robots[origin]
+
+    async def _polite(self, client: httpx.AsyncClient, url: str) -> bool:
+        """Returns whether robots.txt allows `url`, after waiting out the host's Crawl-delay"""
+        if not self.respect_robots:
+            return True
+        robots = await self._robots_for(client, url)
+        if not robots.can_fetch(USER_AGENT, url):
+            logger.info(f"robots.txt disallows {url}")
+            return False
+        delay = min(float(robots.crawl_delay(USER_AGENT) or 0), MAX_CRAWL_DELAY)
+        if delay:
+            host = urlsplit(url).netloc
+            # Reserve the next slot before sleeping, so concurrent workers queue up behind each other
+            slot = max(time.monotonic(), self._last_request.get(host, 0) + delay)
+            self._last_request[host] = slot
+            await asyncio.sleep(slot - time.monotonic())
+        return True
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_limits[host]
+
+    async def crawl(self, root: str) -> List[CrawlResult]:
+        """Crawls from `root`, returning the results of the visited pages in the order they were found"""
+        root = root.strip().strip('"')
+        if "://" not in root:
+            root = "https://" + root
+        root_key = normalize_url(root)
+        if root_key is None:
+            return []
+        root_host = urlsplit(root_key).netloc
+        # Entries are (normalized URL, URL to fetch, depth). The root is fetched as given,
+        # so it shares its page cache entry with the other tools.
+        frontier = asyncio.Queue()
+        frontier.put_nowait((root_key, root, 0))
+        seen = {root_key}
+        results = {}
+        order = [root_key]
+        scheduled = 1
+
+        async with httpx.AsyncClient(timeout=ROBOTS_TIMEOUT, follow_redirects=True,
+                                     headers={"User-Agent": USER_AGENT}) as client:
+            async def worker():
+                nonlocal scheduled
+                while True:
+                    key, url, depth = await frontier.get()
+                    try:
+                        # The root is fetched regardless of robots.txt, the user asked for it
+                        if depth == 0 or await self._polite(client, url):
+                            async with self._host_limit(url):
+                                result, links = await asyncio.to_thread(self.visit, url, depth)
+                            if result is not None:
+                                results[key] = CrawlResult(url, depth, result)
+                            if depth < self.max_depth:
+                                for link in links:
+                                    link = normalize_url(link, url)
+                                    if (link is None or link in seen or urlsplit(link).netloc != root_host
+                                            or SKIPPED_EXTENSIONS.search(urlsplit(link).path)):
+                                        continue
+                                    if scheduled > self.max_pages:
+                                        break
+                                    seen.add(link)
+                                    order.append(link)
+                                    scheduled += 1
+                                    frontier.put_nowait((link, link, depth + 1))
+                    except Exception as e:
+                        logger.error(f"Crawling {url} failed: {str(e)}")
+                    finally:
+                        frontier.task_done()
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.per_host_concurrency)]
+            try:
+                await asyncio.wait_for(frontier.join(), self.time_budget)
+            except asyncio.TimeoutError:
+                logger.warning(f"Crawl of {root} stopped after {self.time_budget}s with {len(results)} pages")
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        return [results[key] for key in order if key in results]
+
+
+# Crawls run on one event loop thread; the crew tools calling them are synchronous
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="seo-crawler", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def crawl_sync(crawler: Crawler, root: str) -> List[CrawlResult]:
+    """Blocking Crawler.crawl() for synchronous callers such as crew tools"""
+    return asyncio.run_coroutine_threadsafe(as_job(crawler.crawl(root), current_job_id()), _get_loop()).result()
+
+
+def crawler_from_env(visit: Callable[[str, int], Tuple[object, List[str]]], max_pages: int,
+                     max_depth: int = None) -> Crawler:
+    """
+    Returns a Crawler configured from the environment
+
+    SUBPAGE_CRAWL_MAX_DEPTH: link distance from the root followed (default: 2)
+    SUBPAGE_CRAWL_CONCURRENCY: pages of one host rendered at the same time (default: 4)
+    SUBPAGE_CRAWL_TIME_BUDGET: seconds after which the crawl returns what it has (default: 120)
+    SUBPAGE_CRAWL_RESPECT_ROBOTS: honour robots.txt (default: true)
+    """
+    return Crawler(
+        visit,
+        max_pages=max_pages,
+        max_depth=max_depth if max_depth is not None else int(os.getenv("SUBPAGE_CRAWL_MAX_DEPTH", "2")),
+        per_host_concurrency=int(os.getenv("SUBPAGE_CRAWL_CONCURRENCY", "4")),
+        time_budget=float(os.getenv("SUBPAGE_CRAWL_TIME_BUDGET", "120")),
+        respect_robots=os.getenv("SUBPAGE_CRAWL_RESPECT_ROBOTS", "true").lower() in ("1", "true", "yes")
+    )
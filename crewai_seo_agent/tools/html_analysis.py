@@ -0,0 +1,244 @@
+"""
+Single-pass HTML analysis for the SEO tools
+
+BrowserlessScraper used to parse a page with html.parser and then search
+the whole tree once per aspect (meta tags, six heading levels, keywords,
+links, images, paragraphs). analyze_html() collects all of them in one
+traversal, on an lxml tree when lxml is installed and on a BeautifulSoup
+tree otherwise, and returns the same analysis dict.
+
+lxml repairs invalid nesting (a link inside a link, a paragraph inside a
+paragraph) the way browsers do, where html.parser keeps it. Browserless
+returns the DOM as Chrome serialized it, which never contains such nesting,
+so both give the same results for rendered pages.
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+    LXML = True
+except ImportError:
+    LXML = False
+
+STOP_WORDS = {'the', 'be', 'to', 'of', 'and', 'a', 'in', 'that', 'have', 'i',
+              'it', 'for', 'not', 'on', 'with', 'he', 'as', 'you', 'do', 'at'}
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# Elements whose text is collected on its own (links, headings, paragraphs)
+TEXT_ELEMENTS = frozenset(HEADING_TAGS + ('a', 'p'))
+
+# Elements whose strings BeautifulSoup's get_text() leaves out
+HIDDEN_TEXT = frozenset(('script', 'style', 'template'))
+
+# The text types get_text() returns, not Script, Stylesheet, Comment, ...
+SOUP_TEXT_TYPES = (NavigableString, CData)
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+HTML_TAG = re.compile(r'<html[\s>/]', re.IGNORECASE)
+
+
+class _PageCollector:
+    """Receives the elements and strings of a page in document order"""
+
+    def __init__(self):
+        self.meta = defaultdict(list)
+        self.headings = defaultdict(list)
+        self.links = []
+        self.images = []
+        self.paragraphs = []
+        self.text = []
+        # (result list, index, strings) of the open links, headings and paragraphs
+        self._open = []
+
+    def start(self, tag: str, get) -> None:
+        if tag in TEXT_ELEMENTS:
+            # Reserve the element's place now, results are listed in start order like find_all()
+            if tag == 'p':
+                target = self.paragraphs
+            elif tag == 'a':
+                href = get('href')
+                target = self.links if href is not None else None
+            else:
+                target = self.headings[tag]
+            if target is not None:
+                target.append(href.strip() if tag == 'a' else None)
+                self._open.append((target, len(target) - 1, []))
+            else:
+                self._open.append((None, None, []))
+        elif tag == 'meta':
+            name = get('name')
+            if name is None:
+                name = get('property', '')
+            content = get('content', '')
+            if name and content:
+                self.meta[name].append(content)
+        elif tag == 'img':
+            self.images.append({
+                'src': get('src', ''),
+                'alt': get('alt', ''),
+                'width': get('width', ''),
+                'height': get('height', '')
+            })
+
+    def string(self, text: str) -> None:
+        self.text.append(text)
+        for _, _, strings in self._open:
+            strings.append(text)
+
+    def end(self, tag: str) -> None:
+        if tag not in TEXT_ELEMENTS:
+            return
+        target, index, strings = self._open.pop()
+        if target is None:
+            return
+        text = ''.join(strings).strip()
+        target[index] = (target[index], text) if tag == 'a' else text
+
+    def analysis(self, base_url: str) -> Dict:
+        return {
+            'meta_tags': dict(self.meta),
+            'headings': {level: self.headings[level] for level in HEADING_TAGS if self.headings.get(level)},
+            'keywords': analyze_keywords(''.join(self.text)),
+            'links': classify_links(self.links, base_url),
+            'images': {
+                'total_images': len(self.images),
+                'missing_alt': sum(1 for image in self.images if not image['alt']),
+                'images': self.images
+            },
+            'content_stats': content_stats(self.paragraphs)
+        }
+
+
+def _walk_lxml(document: str, collector: _PageCollector) -> None:
+    root = lxml_html.document_fromstring(document)
+    hidden = 0
+    for event, element in etree.iterwalk(root, events=('start', 'end', 'comment', 'pi')):
+        if event == 'start':
+            tag = element.tag
+            if tag in HIDDEN_TEXT:
+                hidden += 1
+            collector.start(tag, element.get)
+            if element.text and not hidden:
+                collector.string(element.text)
+            continue
+        if event == 'end':
+            collector.end(element.tag)
+            if element.tag in HIDDEN_TEXT:
+                hidden -= 1
+        # Comments and processing instructions only contribute their tail
+        if element.tail and not hidden:
+            collector.string(element.tail)
+
+
+def _walk_soup(soup: BeautifulSoup, collector: _PageCollector) -> None:
+    # Iterative, deep pages would exceed the recursion limit
+    stack = [(None, iter(soup.contents))]
+    while stack:
+        node = next(stack[-1][1], None)
+        if node is None:
+            tag, _ = stack.pop()
+            if tag is not None:
+                collector.end(tag.name)
+        elif isinstance(node, Tag):
+            collector.start(node.name, node.get)
+            stack.append((node, iter(node.contents)))
+        elif type(node) in SOUP_TEXT_TYPES:
+            collector.string(str(node))
+
+
+def analyze_html(document: str, base_url: str, parser: str = None) -> Optional[Dict]:
+    """
+    Analyzes meta tags, headings, keywords, links, images and paragraphs of a page in one pass
+
+    Args:
+        document: HTML of the page
+        base_url: URL of the page, to tell internal from external links
+        parser: "lxml" or "html.parser" (default: lxml when installed)
+
+    Returns:
+        The analysis dict BrowserlessScraper reports on, None if the
+        document has no <html> element
+    """
+    collector = _PageCollector()
+    if parser is None:
+        parser = 'lxml'
+    if parser == 'lxml' and LXML:
+        if not HTML_TAG.search(document):
+            return None
+        try:
+            _walk_lxml(document, collector)
+            return collector.analysis(base_url)
+        except (etree.ParserError, ValueError):
+            # Empty documents, or an XML encoding declaration lxml refuses in a str
+            collector = _PageCollector()
+    soup = BeautifulSoup(document, 'html.parser')
+    if not soup.find('html'):
+        return None
+    _walk_soup(soup, collector)
+    return collector.analysis(base_url)
+
+
+def analyze_keywords(text: str) -> Dict:
+    """Analyzes keyword frequency and density"""
+    words = [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOP_WORDS and len(word) > 2]
+    word_freq = Counter(words)
+    total_words = len(words)
+    top = word_freq.most_common(20)
+    return {
+        'frequencies': dict(top),
+        'density': {word: (count / total_words) * 100 for word, count in top},
+        'total_words': total_words,
+        'unique_words': len(word_freq)
+    }
+
+
+def classify_links(links: list, base_url: str) -> Dict:
+    """Splits (href, text) pairs into internal and external links"""
+    base_domain = urlparse(base_url).netloc
+    internal_links = []
+    external_links = []
+    for href, text in links:
+        if href.startswith(('http://', 'https://')):
+            if urlparse(href).netloc == base_domain:
+                internal_links.append({'url': href, 'text': text})
+            else:
+                external_links.append({'url': href, 'text': text})
+        elif href.startswith('/'):
+            internal_links.append({'url': f"{base_url.rstrip('/')}{href}", 'text': text})
+    return {
+        'internal_links': internal_links,
+        'external_links': external_links,
+        'total_internal': len(internal_links),
+        'total_external': len(external_links)
+    }
+
+
+def content_stats(paragraphs: list) -> Dict:
+    """Analyzes overall content structure and statistics of the paragraph texts"""
+    text_content = ' '.join(paragraphs)
+    return {
+        'paragraph_count': len(paragraphs),
+        'total_length': len(text_content),
+        'average_paragraph_length': len(text_content) / len(paragraphs) if paragraphs else 0,
+        'readability_score': calculate_readability(text_content)
+    }
+
+
+def calculate_readability(text: str) -> float:
+    """Calculates a basic readability score"""
+    sentences = len(re.split(r'[.!?]+', text))
+    words = len(WORD_PATTERN.findall(text))
+    syllables = len(re.findall(r'[aeiou]+', text.lower()))
+
+    if sentences == 0 or words == 0:
+        return 0
+
+    # Simple Flesch Reading Ease score
+    return 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / words)
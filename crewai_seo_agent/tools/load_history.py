@@ -0,0 +1,172 @@
+"""
+Load time history of the audited sites
+
+LoadingTimeTracker.measure_load_time kept its averages in `self.history`,
+which the pydantic tool never declared, and would have lost them with the
+process anyway. LoadHistory appends the summary of every measurement to a
+SQLite file shared by the jobs on the host. Rows are clustered by
+(domain, measured_at), so the series of one domain is read as one
+contiguous range, and are never updated. Trends and regressions are
+computed from the stored points, so a repeat audit can say "load time up
+40% since the last audit" without sampling again.
+"""
+import os
+import time
+import sqlite3
+import statistics
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+# Columns stored per measurement, besides domain and measured_at
+COLUMNS = ('p50', 'p90', 'mean', 'ttfb', 'size', 'samples')
+
+
+def domain_of(url: str) -> str:
+    """Returns the host a URL's timings are kept under"""
+    if '://' not in url:
+        url = 'https://' + url
+    return (urlsplit(url.strip()).hostname or '').removeprefix('www.')
+
+
+class LoadHistory:
+    """
+    Append-only time series of load timings per domain
+
+    Args:
+        path: SQLite file, None to keep the history in memory only
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Measurements are rare, one connection behind a lock is enough
+        self._conn = sqlite3.connect(path or ":memory:", timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if path:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS load_timings (
+                    domain TEXT NOT NULL,
+                    measured_at REAL NOT NULL,
+                    p50 REAL NOT NULL,
+                    p90 REAL NOT NULL,
+                    mean REAL NOT NULL,
+                    ttfb REAL,
+                    size INTEGER,
+                    samples INTEGER NOT NULL,
+                    PRIMARY KEY (domain, measured_at)
+                ) WITHOUT ROWID
+            """)
+
+    def append(self, url: str, summary: Dict, measured_at: float = None) -> None:
+        """Stores the summarize() result of a measurement"""
+        total = summary['total']
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO load_timings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (domain_of(url), measured_at or time.time(), total['p50'], total['p90'], total['mean'],
+                 summary.get('phases', {}).get('ttfb'), int(summary.get('size', 0)), summary['samples'])
+            )
+
+    def series(self, url: str, since: float = None, limit: int = None) -> Dict[str, List]:
+        """
+        Returns the measurements of a domain, oldest first, as columns
+
+        Args:
+            url: URL or domain
+            since: Only measurements taken at or after this timestamp
+            limit: Only the latest `limit` measurements
+        """
+        query = f"SELECT measured_at, {', '.join(COLUMNS)} FROM load_timings WHERE domain = ? AND measured_at >= ?"
+        query += " ORDER BY measured_at DESC"
+        params = [domain_of(url), since or 0]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        rows.reverse()
+        return {column: [row[i] for row in rows] for i, column in enumerate(('measured_at',) + COLUMNS)}
+
+    def last(self, url: str) -> Optional[Dict]:
+        """Returns the latest measurement of a domain, None if it was never measured"""
+        series = self.series(url, limit=1)
+        if not series['measured_at']:
+            return None
+        return {column: values[0] for column, values in series.items()}
+
+    def latest(self) -> Dict[str, float]:
+        """Returns the latest mean load time of every domain"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT domain, mean FROM load_timings AS t
+                WHERE measured_at = (SELECT MAX(measured_at) FROM load_timings WHERE domain = t.domain)
+            """).fetchall()
+        return dict(rows)
+
+    def compare(self, url: str, summary: Dict) -> Optional[Dict]:
+        """
+        Compares a new measurement with the previous one of its domain
+
+        Returns the previous measurement's timestamp and median, and the
+        relative change of the median (0.4 for 40% slower), None if the
+        domain was never measured.
+        """
+        previous = self.last(url)
+        if previous is None or not previous['p50']:
+            return None
+        return {
+            'measured_at': previous['measured_at'],
+            'p50': previous['p50'],
+            'change': summary['total']['p50'] / previous['p50'] - 1
+        }
+
+    def trend(self, url: str, window: int = 10) -> Optional[float]:
+        """
+        Returns the relative change of the median load time per day over the latest `window` measurements
+
+        A least squares fit, so single outliers weigh less than in compare().
+        None with fewer than 3 measurements.
+        """
+        series = self.series(url, limit=window)
+        if len(series['measured_at']) < 3 or len(set(series['measured_at'])) < 2:
+            return None
+        days = [t / 86400 for t in series['measured_at']]
+        slope, _ = statistics.linear_regression(days, series['p50'])
+        return slope / statistics.mean(series['p50'])
+
+    def regression(self, url: str, summary: Dict, window: int = 5, threshold: float = 0.2) -> Optional[Dict]:
+        """
+        Returns whether a new measurement is a regression against the domain's recent baseline
+
+        The baseline is the median p50 of the latest `window` measurements,
+        a regression is more than `threshold` (relative) above it. None
+        without earlier measurements.
+        """
+        series = self.series(url, limit=window)
+        if not series['p50']:
+            return None
+        baseline = statistics.median(series['p50'])
+        change = summary['total']['p50'] / baseline - 1 if baseline else 0
+        return {'baseline': baseline, 'change': change, 'regressed': change > threshold,
+                'measurements': len(series['p50'])}
+
+
+_load_history = None
+_load_history_lock = threading.Lock()
+
+
+def get_load_history() -> LoadHistory:
+    """
+    Returns the process-wide load time history, configured from the environment
+
+    LOAD_HISTORY_PATH: SQLite file, empty to keep the history in memory only (default: data/load_history.db)
+    """
+    global _load_history
+    with _load_history_lock:
+        if _load_history is None:
+            _load_history = LoadHistory(os.getenv("LOAD_HISTORY_PATH", "data/load_history.db") or None)
+        return _load_history
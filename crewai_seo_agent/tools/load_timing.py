@@ -0,0 +1,160 @@
+"""
+Concurrent load timing for LoadingTimeTracker
+
+LoadingTimeTracker used to time Browserless renders one after another with
+a second of sleep in between, so it measured Browserless and took up to
+half a minute. measure() takes its samples at the same time from a thread
+pool, each over a fresh connection of its own, and times the phases of
+the request with time.perf_counter(): DNS lookup, TCP connect, TLS
+handshake, time to first byte (response headers) and download. Redirects
+are followed, their phases add up. The whole measurement takes about as
+long as its slowest sample.
+"""
+import ssl
+import socket
+import statistics
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlsplit
+
+from .browserless_client import STATIC_USER_AGENTS
+
+PHASES = ('dns', 'connect', 'tls', 'ttfb', 'download')
+
+PERCENTILES = (50, 90, 99)
+
+MAX_REDIRECTS = 5
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+@dataclass
+class Sample:
+    """Seconds spent in each phase of one page load; `error` is set if it failed"""
+    url: str
+    phases: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    size: int = 0
+    status_code: Optional[int] = None
+    redirects: int = 0
+    error: Optional[str] = None
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status_code is not None and self.status_code < 400
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Returns the q-th percentile of the values, interpolating linearly between the closest ranks"""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _request(sample: Sample, url: str, timeout: float, context: ssl.SSLContext) -> Optional[str]:
+    """Loads `url` once over a new connection, adds its phases to the sample and returns the redirect target"""
+    parts = urlsplit(url)
+    port = parts.port or DEFAULT_PORTS[parts.scheme]
+    phases = sample.phases
+
+    start = perf_counter()
+    family, kind, proto, _, address = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)[0]
+    resolved = perf_counter()
+    phases['dns'] += resolved - start
+
+    sock = socket.socket(family, kind, proto)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(address)
+        connected = perf_counter()
+        phases['connect'] += connected - resolved
+        if parts.scheme == 'https':
+            sock = context.wrap_socket(sock, server_hostname=parts.hostname)
+            phases['tls'] += perf_counter() - connected
+
+        conn = http.client.HTTPConnection(parts.hostname, port, timeout=timeout)
+        conn.sock = sock
+        sent = perf_counter()
+        target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        conn.request('GET', target, headers={
+            'Host': parts.netloc,
+            'User-Agent': STATIC_USER_AGENTS['desktop'],
+            'Accept': 'text/html,application/xhtml+xml',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'close'
+        })
+        response = conn.getresponse()
+        first_byte = perf_counter()
+        phases['ttfb'] += first_byte - sent
+        body = response.read()
+        phases['download'] += perf_counter() - first_byte
+    finally:
+        sock.close()
+
+    sample.status_code = response.status
+    sample.size += len(body)
+    location = response.getheader('Location')
+    if response.status in (301, 302, 303, 307, 308) and location:
+        return urljoin(url, location)
+    return None
+
+
+def take_sample(url: str, timeout: float = 15) -> Sample:
+    """Loads a page once, following redirects, and returns the timings of its phases"""
+    sample = Sample(url)
+    context = ssl.create_default_context()
+    try:
+        while url is not None:
+            if urlsplit(url).scheme not in DEFAULT_PORTS:
+                raise ValueError(f"Unsupported URL {url}")
+            url = _request(sample, url, timeout, context)
+            if url is not None:
+                sample.redirects += 1
+                if sample.redirects > MAX_REDIRECTS:
+                    raise ValueError(f"More than {MAX_REDIRECTS} redirects")
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        sample.error = f"{type(e).__name__}: {str(e)}"
+    return sample
+
+
+def measure(url: str, samples: int = 3, timeout: float = 15, max_workers: int = 10) -> List[Sample]:
+    """Takes `samples` samples of a page concurrently"""
+    with ThreadPoolExecutor(max_workers=max(1, min(samples, max_workers)), thread_name_prefix='load-timing') as pool:
+        return list(pool.map(lambda _: take_sample(url, timeout), range(samples)))
+
+
+def summarize(samples: List[Sample]) -> Optional[Dict]:
+    """
+    Returns statistics of the successful samples, None if there are none
+
+    'total' holds mean/min/max/stdev and the p50/p90/p99 of the load time,
+    'phases' the median of each phase, all in seconds; 'size' is the mean
+    number of bytes transferred.
+    """
+    successful = [sample for sample in samples if sample.ok]
+    if not successful:
+        return None
+    totals = [sample.total for sample in successful]
+    total = {
+        'mean': statistics.mean(totals),
+        'min': min(totals),
+        'max': max(totals),
+        'stdev': statistics.stdev(totals) if len(totals) > 1 else 0
+    }
+    total.update({f'p{q}': percentile(totals, q) for q in PERCENTILES})
+    return {
+        'samples': len(successful),
+        'failed': len(samples) - len(successful),
+        'total': total,
+        'phases': {phase: statistics.median(sample.phases[phase] for sample in successful) for phase in PHASES},
+        'size': statistics.mean(sample.size for sample in successful),
+        'redirects': successful[0].redirects
+    }
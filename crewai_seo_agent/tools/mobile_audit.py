@@ -0,0 +1,314 @@
+"""
+Mobile audit of pages for MobileOptimizationTool
+
+The tool used to count substrings of the raw HTML ("<a ", "<p", "srcset="),
+so a <param> counted as a paragraph and a srcset mentioned in a script as a
+responsive image. audit_page() parses a page once and walks its elements
+once, collecting the viewport meta tag, tap targets, font-size declarations
+of style attributes and <style> blocks, image sources and the stylesheets
+it links. audit_mobile() then adds the media queries and font sizes of
+those stylesheets and reports the findings. audit_pages() does the same
+for the pages of a crawl, which share their stylesheets.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import html as lxml_html
+    from lxml.etree import ParserError
+    LXML = True
+except ImportError:
+    LXML = False
+
+# Smallest tap target side recommended for touch screens, in CSS pixels
+MIN_TAP_TARGET = 48
+
+# Smallest font size readable on a phone without zooming, in CSS pixels
+MIN_FONT_SIZE = 12
+
+# Minimum zoom a viewport must allow for pinch-zoom to count as enabled
+MIN_MAXIMUM_SCALE = 2
+
+# Relative units are resolved against the browser default of 16px
+FONT_UNITS = {'px': 1, 'pt': 4 / 3, 'pc': 16, 'em': 16, 'rem': 16, '%': 0.16}
+
+TEXT_TAGS = frozenset(('p', 'span', 'li', 'td', 'th', 'label', 'blockquote', 'figcaption',
+                       'h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+FORM_CONTROLS = frozenset(('input', 'select', 'textarea'))
+
+FONT_SIZE = re.compile(
+    r'font(?:-size\s*:\s*|\s*:\s*(?:[\w-]+\s+)*?)(\d*\.?\d+)(px|pt|pc|rem|em|%)',
+    re.IGNORECASE
+)
+MEDIA_QUERY = re.compile(r'@media\b([^{;]*)', re.IGNORECASE)
+IMPORT_MEDIA = re.compile(r'@import\s+(?:url\()?[\'"]?[^\'")\s;]+[\'"]?\)?\s*([^;]+);', re.IGNORECASE)
+WIDTH_QUERY = re.compile(r'\((?:min|max)-(?:device-)?width\s*:|\(\s*width\s*[<>]', re.IGNORECASE)
+CSS_LENGTH = re.compile(r'(?<![\w-])(width|height|min-width|min-height)\s*:\s*(\d*\.?\d+)px', re.IGNORECASE)
+
+
+def parse_viewport(content: str) -> Dict:
+    """Parses the content of a viewport meta tag into its properties"""
+    properties = {}
+    for part in re.split(r'[,;]', content or ''):
+        key, _, value = part.partition('=')
+        if key.strip():
+            properties[key.strip().lower()] = value.strip().lower()
+
+    def scale(name):
+        try:
+            return float(properties[name])
+        except (KeyError, ValueError):
+            return None
+
+    maximum_scale = scale('maximum-scale')
+    return {
+        'content': content,
+        'width': properties.get('width'),
+        'initial_scale': scale('initial-scale'),
+        'maximum_scale': maximum_scale,
+        'device_width': properties.get('width') == 'device-width',
+        'zoom_disabled': (properties.get('user-scalable') in ('no', '0')
+                          or (maximum_scale is not None and maximum_scale < MIN_MAXIMUM_SCALE))
+    }
+
+
+def font_sizes(css: str) -> List[float]:
+    """Returns the font sizes a CSS text declares, in pixels"""
+    return [float(value) * FONT_UNITS[unit.lower()] for value, unit in FONT_SIZE.findall(css)]
+
+
+def media_queries(css: str) -> List[str]:
+    """Returns the media query lists of the @media rules and @import statements of a CSS text"""
+    return [query.strip() for query in MEDIA_QUERY.findall(css) + IMPORT_MEDIA.findall(css) if query.strip()]
+
+
+@dataclass
+class MobilePage:
+    """What a single walk over the elements of a page found"""
+    url: str
+    viewport: Optional[str] = None
+    tap_targets: Counter = field(default_factory=Counter)
+    small_tap_targets: int = 0
+    text_elements: int = 0
+    inline_font_sizes: List[float] = field(default_factory=list)
+    style_blocks: List[str] = field(default_factory=list)
+    images: int = 0
+    responsive_images: int = 0
+    images_with_sizes: int = 0
+    # <source srcset> alternatives of the current <picture>
+    _picture_sources: int = field(default=0, repr=False)
+    media_attributes: List[str] = field(default_factory=list)
+    stylesheets: List[str] = field(default_factory=list)
+
+    def element(self, tag: str, get: Callable, parent: Optional[str], text: Callable[[], str]) -> None:
+        style = get('style')
+        if style:
+            self.inline_font_sizes.extend(font_sizes(style))
+
+        if tag == 'meta':
+            if (get('name') or '').lower() == 'viewport' and self.viewport is None:
+                self.viewport = get('content', '')
+        elif tag == 'style':
+            self.style_blocks.append(text())
+            if get('media'):
+                self.media_attributes.append(get('media'))
+        elif tag == 'link':
+            media = (get('media') or '').strip().lower()
+            # Print stylesheets do not apply to phones
+            if 'stylesheet' in (get('rel') or '').lower().split() and get('href') and media != 'print':
+                self.stylesheets.append(urljoin(self.url, get('href').strip()))
+                if media not in ('', 'all', 'screen'):
+                    self.media_attributes.append(get('media'))
+        elif tag == 'img':
+            self.images += 1
+            # An <img> of a <picture> with <source srcset> alternatives is responsive too
+            # (lxml does not know <source> is empty and nests the <img> in it)
+            if get('srcset') or (parent in ('picture', 'source') and self._picture_sources):
+                self.responsive_images += 1
+            if get('sizes'):
+                self.images_with_sizes += 1
+        elif tag == 'picture':
+            self._picture_sources = 0
+        elif tag == 'source' and parent in ('picture', 'source'):
+            if get('srcset'):
+                self._picture_sources += 1
+            if get('media'):
+                self.media_attributes.append(get('media'))
+        elif tag in TEXT_TAGS:
+            self.text_elements += 1
+
+        if tag == 'a' and get('href') is not None:
+            kind = 'links'
+        elif tag == 'button' or (get('role') or '').lower() == 'button':
+            kind = 'buttons'
+        elif tag in FORM_CONTROLS and (get('type') or '').lower() != 'hidden':
+            kind = 'form_controls'
+        elif get('onclick') is not None:
+            kind = 'other'
+        else:
+            return
+        self.tap_targets[kind] += 1
+        if self._smaller_than(get, MIN_TAP_TARGET):
+            self.small_tap_targets += 1
+
+    @staticmethod
+    def _smaller_than(get: Callable, minimum: float) -> bool:
+        """Whether the element's style or size attributes make it smaller than `minimum` pixels"""
+        sizes = {name.lower(): float(value) for name, value in CSS_LENGTH.findall(get('style') or '')}
+        for name in ('width', 'height'):
+            attribute = (get(name) or '').strip()
+            size = sizes.get(name, float(attribute) if attribute.isdigit() else None)
+            if size is not None and max(size, sizes.get(f'min-{name}', 0)) < minimum:
+                return True
+        return False
+
+
+def _walk_lxml(document: str, page: MobilePage) -> None:
+    root = lxml_html.document_fromstring(document)
+    for element in root.iter():
+        tag = element.tag
+        # Comments and processing instructions have a function as their tag
+        if not isinstance(tag, str):
+            continue
+        parent = element.getparent()
+        page.element(tag.lower(), element.get, parent.tag if parent is not None else None,
+                     lambda: element.text or '')
+
+
+def _walk_soup(document: str, page: MobilePage) -> None:
+    soup = BeautifulSoup(document, 'html.parser')
+    for element in soup.find_all(True):
+        get = element.get
+        page.element(
+            element.name,
+            # BeautifulSoup returns multi-valued attributes such as rel as lists
+            lambda name, default=None, get=get: ' '.join(value) if isinstance(value := get(name, default), list) else value,
+            element.parent.name if element.parent is not None else None,
+            lambda element=element: element.string or ''
+        )
+
+
+def audit_page(document: str, url: str, parser: str = None) -> MobilePage:
+    """
+    Parses a page once and collects what the mobile audit needs
+
+    Args:
+        document: HTML of the page
+        url: URL of the page, to resolve the stylesheet links
+        parser: "lxml" or "html.parser" (default: lxml when installed)
+    """
+    page = MobilePage(url)
+    if (parser or 'lxml') == 'lxml' and LXML:
+        try:
+            _walk_lxml(document, page)
+            return page
+        except (ParserError, ValueError):
+            # Empty documents, or an XML encoding declaration lxml refuses in a str
+            page = MobilePage(url)
+    _walk_soup(document, page)
+    return page
+
+
+def audit_mobile(page: MobilePage, stylesheets: Dict[str, str] = None) -> Dict:
+    """
+    Reports the mobile-friendliness of an audited page
+
+    Args:
+        page: The result of audit_page()
+        stylesheets: CSS text of the stylesheets the page links, by URL;
+            ones missing are left out of the font size and media query checks
+    """
+    stylesheets = stylesheets or {}
+    linked = [stylesheets[url] for url in page.stylesheets if stylesheets.get(url) is not None]
+    inline_css = '\n'.join(page.style_blocks)
+
+    viewport = parse_viewport(page.viewport) if page.viewport is not None else None
+
+    stylesheet_font_sizes = font_sizes(inline_css) + [size for css in linked for size in font_sizes(css)]
+    all_font_sizes = page.inline_font_sizes + stylesheet_font_sizes
+    small_fonts = sum(1 for size in all_font_sizes if size < MIN_FONT_SIZE)
+
+    queries = media_queries(inline_css) + [query for css in linked for query in media_queries(css)]
+    queries += page.media_attributes
+    width_queries = sum(1 for query in queries if WIDTH_QUERY.search(query))
+
+    clickable = sum(page.tap_targets.values())
+    coverage = page.responsive_images / page.images if page.images else 1.0
+
+    issues = []
+    if viewport is None:
+        issues.append("No viewport meta tag, phones render the page at desktop width")
+    else:
+        if not viewport['device_width']:
+            issues.append(f"Viewport width is {viewport['width'] or 'not set'} instead of device-width")
+        if viewport['zoom_disabled']:
+            issues.append("Viewport disables pinch-zoom")
+    if page.small_tap_targets:
+        issues.append(f"{page.small_tap_targets} tap targets are sized below {MIN_TAP_TARGET}px")
+    if small_fonts:
+        issues.append(f"{small_fonts} font-size declarations are below {MIN_FONT_SIZE}px")
+    if page.images and coverage < 0.5:
+        issues.append(f"Only {page.responsive_images} of {page.images} images have srcset or <picture> sources")
+    if not width_queries:
+        issues.append("No width media queries in the page's styles")
+
+    return {
+        "viewport_meta": viewport is not None,
+        "viewport": viewport,
+        "touch_elements": {
+            "clickable_elements": clickable,
+            **{kind: page.tap_targets.get(kind, 0) for kind in ('links', 'buttons', 'form_controls', 'other')},
+            "small_targets": page.small_tap_targets,
+            "status": "success"
+        },
+        "font_sizes": {
+            "text_elements": page.text_elements,
+            "inline_declarations": len(page.inline_font_sizes),
+            "stylesheet_declarations": len(stylesheet_font_sizes),
+            "small_declarations": small_fonts,
+            "min_font_size": min(all_font_sizes) if all_font_sizes else None,
+            "status": "success"
+        },
+        "responsive_images": {
+            "total_images": page.images,
+            "responsive_images": page.responsive_images,
+            "images_with_sizes": page.images_with_sizes,
+            "coverage": round(coverage, 3),
+            "status": "success"
+        },
+        "media_queries": {
+            "count": len(queries),
+            "width_queries": width_queries,
+            "stylesheets_linked": len(page.stylesheets),
+            "stylesheets_checked": len(linked),
+            "status": "success"
+        },
+        "issues": issues
+    }
+
+
+def audit_pages(documents: Dict[str, str], fetch_stylesheet: Callable[[str], Optional[str]] = None,
+                max_stylesheets: int = 10) -> Dict[str, Dict]:
+    """
+    Audits the pages of a crawl in one pass
+
+    Each page is parsed once; the stylesheets they link are fetched once
+    for all of them with `fetch_stylesheet(url)` (None when unavailable),
+    at most `max_stylesheets` per page.
+
+    Returns:
+        The audit_mobile() report of every page, by URL
+    """
+    pages = {url: audit_page(document, url) for url, document in documents.items()}
+    stylesheets = {}
+    if fetch_stylesheet is not None:
+        for page in pages.values():
+            for url in page.stylesheets[:max_stylesheets]:
+                if url not in stylesheets:
+                    stylesheets[url] = fetch_stylesheet(url)
+    return {url: audit_mobile(page, stylesheets) for url, page in pages.items()}
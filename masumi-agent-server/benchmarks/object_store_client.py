@@ -0,0 +1,65 @@
+"""
+Per-job boto3 client construction vs the shared ObjectStore client
+
+    python benchmarks/object_store_client.py [--jobs 20] [--prefix SPACES] [--bucket NAME]
+
+Without --bucket only client construction is timed, which needs no
+network. With --bucket every simulated job also uploads a small object,
+which adds the TLS handshake the per-job client pays on every job.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import boto3
+import botocore.config
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from masumi_agent_server.object_store import ObjectStore  # noqa: E402
+
+
+def per_job_client(prefix: str):
+    """The construction every agent used to run inside each job"""
+    session = boto3.session.Session()
+    return session.client(
+        's3',
+        endpoint_url=os.getenv(f"{prefix}_ENDPOINT"),
+        config=botocore.config.Config(s3={'addressing_style': 'virtual'}),
+        region_name=os.getenv(f"{prefix}_REGION") or "us-east-1",
+        aws_access_key_id=os.getenv(f"{prefix}_KEY") or "benchmark",
+        aws_secret_access_key=os.getenv(f"{prefix}_SECRET") or "benchmark"
+    )
+
+
+def run(label: str, get_client, jobs: int, bucket: str | None) -> None:
+    timings = []
+    for i in range(jobs):
+        start = time.perf_counter()
+        client = get_client()
+        if bucket:
+            client.put_object(Bucket=bucket, Key=f"benchmark/{label}-{i}.txt", Body=b"benchmark")
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:>10}: mean {statistics.mean(timings):8.2f} ms, "
+          f"median {statistics.median(timings):8.2f} ms, first {timings[0]:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--prefix", default="SPACES", help="Environment prefix of the Space settings")
+    parser.add_argument("--bucket", help="Also upload to this bucket (needs credentials)")
+    args = parser.parse_args()
+
+    store = ObjectStore(
+        endpoint_url=os.getenv(f"{args.prefix}_ENDPOINT"),
+        region=os.getenv(f"{args.prefix}_REGION") or "us-east-1",
+        access_key=os.getenv(f"{args.prefix}_KEY") or "benchmark",
+        secret_key=os.getenv(f"{args.prefix}_SECRET") or "benchmark"
+    )
+    run("per-job", lambda: per_job_client(args.prefix), args.jobs, args.bucket)
+    run("shared", lambda: store.client, args.jobs, args.bucket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Shared MIP-003 server for the CrewAI Masumi agents
+
+Each agent only describes its crew and input schema through a MasumiAgent;
+the endpoints, payment flow, job store and worker pool live here.
+"""
+from .agent import MasumiAgent, JobResult
+from .server import AgentServer, StartJobRequest, create_app
+from .host import create_host_app
+from .progress import report_progress
+from .logging_config import setup_logging, get_logger
+from .result_cache import ResultCache
+from .search_cache import SearchCache, get_search_cache
+from .page_cache import CachedPage, PageCache, get_page_cache
+from .object_store import ObjectStore, get_object_store
+from .retry import RetryableError, CircuitOpenError, RetryPolicy, get_retry_policy
+
+__all__ = [
+    "MasumiAgent",
+    "JobResult",
+    "AgentServer",
+    "StartJobRequest",
+    "create_app",
+    "create_host_app",
+    "report_progress",
+    "setup_logging",
+    "get_logger",
+    "ResultCache",
+    "SearchCache",
+    "get_search_cache",
+    "CachedPage",
+    "PageCache",
+    "get_page_cache",
+    "ObjectStore",
+    "get_object_store",
+    "RetryableError",
+    "CircuitOpenError",
+    "RetryPolicy",
+    "get_retry_policy",
+]
@@ -0,0 +1,58 @@
+import os
+
+
+class JobResult:
+    """
+    Result of a crew run plus extra fields kept on the job
+
+    Extra fields are stored next to the result and returned by /status,
+    e.g. the local path of a generated PDF.
+    """
+
+    def __init__(self, result, **extra):
+        self.result = result
+        self.extra = extra
+
+
+class MasumiAgent:
+    """
+    The parts of an agent that differ from one agent to the next
+
+    Everything else (MIP-003 endpoints, payments, job store, worker pool)
+    is provided by masumi_agent_server.
+
+    Args:
+        name: Short unique name, stored on each job so recovered jobs reach the right agent
+        run: Blocking `run(input_data: dict)` executed in the worker pool once the
+             payment is locked. Returns the result, or a JobResult for extra fields.
+        input_schema: MIP-003 input_data field list served by /input_schema
+        example_input: Example input_data shown in the OpenAPI docs
+        required_inputs: Field ids /start_job rejects when missing (default: every
+                         field in input_schema)
+        agent_identifier: Registered agent identifier (default: AGENT_IDENTIFIER)
+        seller_vkey: Seller verification key (default: SELLER_VKEY)
+        payment_amount: Price per job (default: PAYMENT_AMOUNT or 10 ADA)
+        payment_unit: Unit of the price (default: PAYMENT_UNIT or lovelace)
+        allow_force_run: Also expose /force_run, which runs the crew without payment
+    """
+
+    def __init__(self, name: str, run, input_schema: list[dict], example_input: dict = None,
+                 required_inputs: list[str] = None, agent_identifier: str = None,
+                 seller_vkey: str = None, payment_amount: str = None, payment_unit: str = None,
+                 allow_force_run: bool = False):
+        self.name = name
+        self.run = run
+        self.input_schema = input_schema
+        self.example_input = example_input or {}
+        if required_inputs is None:
+            required_inputs = [field["id"] for field in input_schema]
+        self.required_inputs = required_inputs
+        self.agent_identifier = agent_identifier or os.getenv("AGENT_IDENTIFIER")
+        self.seller_vkey = seller_vkey or os.getenv("SELLER_VKEY")
+        self.payment_amount = payment_amount or os.getenv("PAYMENT_AMOUNT", "10000000")  # Default 10 ADA
+        self.payment_unit = payment_unit or os.getenv("PAYMENT_UNIT", "lovelace")
+        self.allow_force_run = allow_force_run
+
+    def missing_inputs(self, input_data: dict) -> list[str]:
+        """Returns the required field ids absent from `input_data`"""
+        return [field for field in self.required_inputs if input_data.get(field) in (None, "")]
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+
+class CrewExecutor:
+    """
+    Bounded worker pool for running blocking crew kickoffs off the event loop
+
+    At most `max_workers` kickoffs run at the same time; up to `queue_depth`
+    further kickoffs may wait for a free worker. Once both are used up,
+    has_capacity() turns False so /start_job can answer 503 instead of taking
+    payment for work it cannot finish before submitResultTime.
+
+    Args:
+        max_workers: Number of kickoffs that may run in parallel
+        queue_depth: Number of kickoffs allowed to wait for a worker
+        mode: "thread" (default) or "process". Process mode needs the
+              submitted function, its arguments and its result to be picklable.
+    """
+
+    def __init__(self, max_workers: int = 2, queue_depth: int = 10, mode: str = "thread"):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.max_workers = max(1, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.mode = mode
+        self._pool = None
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+        self._semaphore = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="crew-worker"
+                )
+        return self._pool
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the loop uvicorn is running
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self._semaphore
+
+    def has_capacity(self) -> bool:
+        """Returns True if a new kickoff would be accepted right now"""
+        with self._lock:
+            return self._running + self._waiting < self.max_workers + self.queue_depth
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs `func(*args, **kwargs)` in the worker pool and awaits its result
+
+        Paid jobs are never rejected here; admission control happens in
+        /start_job through has_capacity() before a payment request is created.
+
+        Args:
+            func: Blocking callable, e.g. a function wrapping crew.kickoff()
+
+        Returns:
+            Whatever `func` returns
+        """
+        semaphore = self._get_semaphore()
+        with self._lock:
+            self._waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), partial(func, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._running -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        """Returns the current pool occupancy"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "running": self._running,
+                "queued": self._waiting
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+
+
+_executor = None
+
+
+def get_executor() -> CrewExecutor:
+    """
+    Returns the process-wide executor, configured from the environment
+
+    CREW_EXECUTOR_MODE: "thread" or "process" (default: thread)
+    CREW_MAX_WORKERS: parallel kickoffs per container (default: 2)
+    CREW_QUEUE_DEPTH: kickoffs allowed to wait for a worker (default: 10)
+    """
+    global _executor
+    if _executor is None:
+        _executor = CrewExecutor(
+            max_workers=int(os.getenv("CREW_MAX_WORKERS", "2")),
+            queue_depth=int(os.getenv("CREW_QUEUE_DEPTH", "10")),
+            mode=os.getenv("CREW_EXECUTOR_MODE", "thread")
+        )
+        logger.info(f"Crew executor started: {_executor.stats()}")
+    return _executor
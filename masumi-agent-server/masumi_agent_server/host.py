@@ -0,0 +1,132 @@
+import os
+import sys
+import logging
+import importlib.util
+from contextlib import asynccontextmanager
+import httpx
+from fastapi import FastAPI
+from .executor import get_executor
+from .job_store import get_job_store
+from .payment_watcher import get_payment_watcher
+from .server import start_background_tasks, stop_background_tasks
+
+logger = logging.getLogger(__name__)
+
+
+def load_agent_app(path: str, name: str) -> FastAPI:
+    """
+    Imports an agent directory's main.py and returns its app
+
+    Agent directories reuse module names (crew_definition, tools, ...), so
+    main.py is loaded under a unique name and the modules it pulled in from
+    its own directory are dropped from sys.modules again afterwards. The
+    agent keeps its references to them, so the next agent gets a clean slate.
+
+    Args:
+        path: Agent directory containing main.py
+        name: Unique name for the loaded main module
+    """
+    path = os.path.abspath(path)
+    module_name = f"masumi_agent_{name.replace('-', '_')}"
+    loaded_before = set(sys.modules)
+    sys.path.insert(0, path)
+    try:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(path, "main.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+        for loaded in set(sys.modules) - loaded_before:
+            module_file = getattr(sys.modules[loaded], "__file__", None) or ""
+            if loaded != module_name and module_file.startswith(path + os.sep):
+                del sys.modules[loaded]
+    return module.app
+
+
+def share_llm_http_client(max_connections: int = 100) -> None:
+    """
+    Points litellm, which CrewAI uses for LLM calls, at one pooled HTTP client
+
+    Without this every agent opens its own connections to the LLM provider.
+    Skipped when litellm is not installed or a client was already set.
+    """
+    try:
+        import litellm
+    except ImportError:
+        return
+    if getattr(litellm, "client_session", None) is None:
+        litellm.client_session = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=600
+        )
+        logger.info(f"Sharing one LLM HTTP client across agents (max_connections={max_connections})")
+
+
+def parse_agents(spec: str) -> dict[str, str]:
+    """Parses "prefix=path,prefix=path" into {prefix: path}"""
+    agents = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        prefix, _, path = entry.partition("=")
+        if not path:
+            raise ValueError(f"Expected prefix=path, got: {entry}")
+        agents[prefix.strip().strip("/")] = path.strip()
+    return agents
+
+
+@asynccontextmanager
+async def host_lifespan(app: FastAPI):
+    """ Runs the background tasks shared by every mounted agent """
+    share_llm_http_client(int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")))
+    await start_background_tasks()
+    yield
+    await stop_background_tasks()
+
+
+def create_host_app(agents: dict[str, str], **fastapi_kwargs) -> FastAPI:
+    """
+    Builds one app serving several agents under path prefixes
+
+    Each agent keeps its MIP-003 endpoints below its prefix, e.g.
+    /seo/start_job and /pr-writer/status. All agents share the process-wide
+    worker pool, job store and payment watcher, and pay the crewai import
+    cost once.
+
+    Per-agent settings (AGENT_IDENTIFIER, SELLER_VKEY, PAYMENT_AMOUNT, ...)
+    are read from each agent's .env while it is loaded. Settings the crews
+    read at run time (API keys, bucket names) are shared by the process.
+    CREW_EXECUTOR_MODE=process relies on the fork start method (the Linux
+    default) for workers to find the hosted agents' modules.
+
+    Args:
+        agents: {path prefix: agent directory}
+        fastapi_kwargs: Passed on to FastAPI()
+    """
+    fastapi_kwargs.setdefault("title", "Masumi Agent Host")
+    fastapi_kwargs.setdefault("description", "Several Masumi agents served from one process")
+    app = FastAPI(lifespan=host_lifespan, **fastapi_kwargs)
+
+    # Create the shared singletons from the host's environment before any
+    # agent's .env is loaded
+    get_executor()
+    get_job_store()
+    get_payment_watcher(os.getenv("PAYMENT_SERVICE_URL"), os.getenv("PAYMENT_API_KEY"), os.getenv("NETWORK", "Preprod"))
+
+    for prefix, path in agents.items():
+        logger.info(f"Mounting agent {path} at /{prefix}")
+        app.mount(f"/{prefix}", load_agent_app(path, prefix))
+
+    @app.get("/health")
+    async def health():
+        """
+        Returns the health of the host and the mounted agents.
+        """
+        return {
+            "status": "healthy",
+            "agents": [f"/{prefix}" for prefix in agents]
+        }
+
+    return app
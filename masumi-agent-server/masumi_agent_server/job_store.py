@@ -0,0 +1,335 @@
+import os
+import json
+import time
+import uuid
+import socket
+import asyncio
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Jobs in these states are owned by a live worker and recovered if it dies
+ACTIVE_STATUSES = ("awaiting_payment", "running")
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Columns kept outside the JSON blob so they can be indexed and queried
+_INDEXED_FIELDS = ("payment_id", "identifier_from_purchaser", "status", "payment_status")
+
+
+class JobStore:
+    """
+    Interface for job persistence backends
+
+    Jobs are plain dicts keyed by job_id. Every backend indexes them by
+    job_id, payment_id and identifier_from_purchaser, and tracks which worker
+    owns an active job through a heartbeat so jobs of a dead worker can be
+    claimed by another one.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def create(self, job_id: str, job: dict) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def merge_extra(self, job_id: str, fields: dict) -> bool:
+        """
+        Adds `fields` to the job's extra fields, returning False if there is no such job
+
+        The default reads and writes the job in two steps; backends override it
+        so concurrent callers cannot overwrite each other's fields.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        self.update(job_id, extra={**job.get("extra", {}), **fields})
+        return True
+
+    def find_by_payment_id(self, payment_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def find_by_purchaser(self, identifier_from_purchaser: str) -> list[dict]:
+        raise NotImplementedError
+
+    def heartbeat(self) -> None:
+        """Marks all active jobs owned by this worker as alive"""
+        raise NotImplementedError
+
+    def claim_stale(self, stale_after: float) -> list[dict]:
+        """Takes over active jobs whose owner has not sent a heartbeat for `stale_after` seconds"""
+        raise NotImplementedError
+
+    def evict_expired(self, ttl: float) -> int:
+        """Deletes finished jobs older than `ttl` seconds, returning how many were removed"""
+        raise NotImplementedError
+
+    def __contains__(self, job_id: str) -> bool:
+        return self.get(job_id) is not None
+
+
+class SQLiteJobStore(JobStore):
+    """
+    SQLite job store in WAL mode
+
+    WAL lets several uvicorn workers on the same host read while one writes.
+    Each thread gets its own connection since sqlite3 connections must not
+    be shared across threads.
+
+    Args:
+        path: Database file, created on first use (":memory:" for tests)
+    """
+
+    def __init__(self, path: str = "data/jobs.db"):
+        super().__init__()
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                payment_id TEXT,
+                identifier_from_purchaser TEXT,
+                status TEXT NOT NULL,
+                payment_status TEXT,
+                data TEXT NOT NULL,
+                worker_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_payment_id ON jobs(payment_id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_purchaser ON jobs(identifier_from_purchaser);
+            CREATE INDEX IF NOT EXISTS idx_jobs_active ON jobs(status, heartbeat_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs(finished_at);
+        """)
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row | None) -> dict | None:
+        if row is None:
+            return None
+        job = json.loads(row["data"])
+        for field in _INDEXED_FIELDS:
+            job[field] = row[field]
+        job["job_id"] = row["job_id"]
+        job["updated_at"] = row["updated_at"]
+        return job
+
+    def create(self, job_id: str, job: dict) -> None:
+        now = time.time()
+        data = {k: v for k, v in job.items() if k not in _INDEXED_FIELDS}
+        self._connect().execute(
+            """INSERT INTO jobs (job_id, payment_id, identifier_from_purchaser, status,
+                                 payment_status, data, worker_id, created_at, updated_at, heartbeat_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (job_id, job.get("payment_id"), job.get("identifier_from_purchaser"), job["status"],
+             job.get("payment_status"), json.dumps(data, default=str), self.worker_id, now, now, now)
+        )
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def update(self, job_id: str, **fields) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                raise KeyError(job_id)
+            now = time.time()
+            data = json.loads(row["data"])
+            data.update({k: v for k, v in fields.items() if k not in _INDEXED_FIELDS})
+            columns = {field: fields.get(field, row[field]) for field in _INDEXED_FIELDS}
+            finished_at = row["finished_at"]
+            if columns["status"] in TERMINAL_STATUSES and finished_at is None:
+                finished_at = now
+            conn.execute(
+                """UPDATE jobs SET payment_id = ?, identifier_from_purchaser = ?, status = ?,
+                                   payment_status = ?, data = ?, updated_at = ?, finished_at = ?
+                   WHERE job_id = ?""",
+                (columns["payment_id"], columns["identifier_from_purchaser"], columns["status"],
+                 columns["payment_status"], json.dumps(data, default=str), now, finished_at, job_id)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def merge_extra(self, job_id: str, fields: dict) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            data = json.loads(row["data"])
+            data["extra"] = {**data.get("extra", {}), **fields}
+            conn.execute("UPDATE jobs SET data = ?, updated_at = ? WHERE job_id = ?",
+                         (json.dumps(data, default=str), time.time(), job_id))
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def find_by_payment_id(self, payment_id: str) -> dict | None:
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE payment_id = ? ORDER BY created_at DESC LIMIT 1", (payment_id,)
+        ).fetchone()
+        return self._row_to_job(row)
+
+    def find_by_purchaser(self, identifier_from_purchaser: str) -> list[dict]:
+        rows = self._connect().execute(
+            "SELECT * FROM jobs WHERE identifier_from_purchaser = ? ORDER BY created_at",
+            (identifier_from_purchaser,)
+        ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def heartbeat(self) -> None:
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        self._connect().execute(
+            f"UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status IN ({placeholders})",
+            (time.time(), self.worker_id, *ACTIVE_STATUSES)
+        )
+
+    def claim_stale(self, stale_after: float) -> list[dict]:
+        now = time.time()
+        placeholders = ", ".join("?" for _ in ACTIVE_STATUSES)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE status IN ({placeholders}) AND heartbeat_at < ?",
+                (*ACTIVE_STATUSES, now - stale_after)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET worker_id = ?, heartbeat_at = ? WHERE job_id = ?",
+                [(self.worker_id, now, row["job_id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return [self._row_to_job(row) for row in rows]
+
+    def evict_expired(self, ttl: float) -> int:
+        cursor = self._connect().execute(
+            "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - ttl,)
+        )
+        return cursor.rowcount
+
+
+def job_etag(job: dict) -> str:
+    """Returns an ETag that changes whenever the stored job changes"""
+    return f'"{job["job_id"]}-{job["updated_at"]:.6f}"'
+
+
+async def wait_for_change(store: JobStore, job_id: str, etag: str, timeout: float,
+                          poll_interval: float = 0.5) -> dict | None:
+    """
+    Waits until the job no longer matches `etag` or `timeout` seconds pass
+
+    Polls the store rather than relying on in-process signals so a change
+    written by another worker wakes the waiting request as well. Finished
+    jobs never change again and return immediately.
+
+    Returns:
+        The latest version of the job (None if it was evicted meanwhile)
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = store.get(job_id)
+        if job is None or job_etag(job) != etag or job["status"] in TERMINAL_STATUSES:
+            return job
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return job
+        await asyncio.sleep(min(poll_interval, remaining))
+
+
+# Backends selectable through JOB_STORE_BACKEND; register_backend() adds more
+BACKENDS = {
+    "sqlite": lambda: SQLiteJobStore(os.getenv("JOB_STORE_PATH", "data/jobs.db")),
+}
+
+
+def register_backend(name: str, factory) -> None:
+    """Registers a zero-argument factory returning a JobStore"""
+    BACKENDS[name] = factory
+
+
+_job_store = None
+
+
+def get_job_store() -> JobStore:
+    """
+    Returns the process-wide job store, configured from the environment
+
+    JOB_STORE_BACKEND: name of a registered backend (default: sqlite)
+    JOB_STORE_PATH: SQLite database file (default: data/jobs.db)
+    """
+    global _job_store
+    if _job_store is None:
+        backend = os.getenv("JOB_STORE_BACKEND", "sqlite")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown job store backend: {backend}")
+        _job_store = BACKENDS[backend]()
+        logger.info(f"Job store started: backend={backend}, worker={_job_store.worker_id}")
+    return _job_store
+
+
+async def maintain_job_store(store: JobStore, recover_job) -> None:
+    """
+    Background loop that keeps the job store healthy
+
+    Sends heartbeats for jobs owned by this worker, hands jobs of dead
+    workers (including this process before a restart) to `recover_job`,
+    and evicts finished jobs once their result TTL has passed.
+
+    JOB_HEARTBEAT_INTERVAL: seconds between maintenance passes (default: 15)
+    JOB_STALE_AFTER: seconds without heartbeat before a job is recovered (default: 60)
+    JOB_RESULT_TTL: seconds finished jobs are kept (default: 7 days)
+    """
+    interval = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))
+    stale_after = float(os.getenv("JOB_STALE_AFTER", "60"))
+    ttl = float(os.getenv("JOB_RESULT_TTL", str(7 * 24 * 3600)))
+    while True:
+        try:
+            store.heartbeat()
+            for job in store.claim_stale(stale_after):
+                logger.info(f"Recovering job {job['job_id']} in state {job['status']}")
+                try:
+                    await recover_job(job)
+                except Exception as e:
+                    logger.error(f"Error recovering job {job['job_id']}: {str(e)}", exc_info=True)
+            evicted = store.evict_expired(ttl)
+            if evicted:
+                logger.info(f"Evicted {evicted} expired jobs")
+        except Exception as e:
+            logger.error(f"Error in job store maintenance: {str(e)}", exc_info=True)
+        await asyncio.sleep(interval)
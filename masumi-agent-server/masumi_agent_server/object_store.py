@@ -0,0 +1,109 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectStore:
+    """
+    Process-wide client for an S3-compatible object store (DigitalOcean Spaces)
+
+    Building a boto3 session and client resolves credentials, loads the
+    service model and sets up the endpoint; the first request then opens a
+    fresh TLS connection. Agents used to pay this on every job. One client
+    is created per configuration and reused by every job of the process
+    (boto3 clients are thread-safe), keeping its connections alive in a
+    pool sized for the crew workers.
+
+    Args:
+        endpoint_url: Object store endpoint, e.g. https://fra1.digitaloceanspaces.com
+        region: Region of the endpoint, also used for public URLs
+        access_key: Access key id
+        secret_key: Secret access key
+        max_connections: Connections kept in the pool (default: OBJECT_STORE_MAX_CONNECTIONS or 20)
+    """
+
+    def __init__(self, endpoint_url: str = None, region: str = None, access_key: str = None,
+                 secret_key: str = None, max_connections: int = None):
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.max_connections = max_connections or int(os.getenv("OBJECT_STORE_MAX_CONNECTIONS", "20"))
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The shared boto3 S3 client, created on first use"""
+        with self._lock:
+            if self._client is None:
+                # boto3 is only needed by the agents that upload results
+                import boto3
+                import botocore.config
+                session = boto3.session.Session()
+                self._client = session.client(
+                    's3',
+                    endpoint_url=self.endpoint_url,
+                    region_name=self.region,
+                    aws_access_key_id=self.access_key,
+                    aws_secret_access_key=self.secret_key,
+                    config=botocore.config.Config(
+                        s3={'addressing_style': 'virtual'},
+                        max_pool_connections=self.max_connections,
+                        tcp_keepalive=True,
+                        retries={'max_attempts': 5, 'mode': 'standard'}
+                    )
+                )
+                logger.info(f"Object store client created for {self.endpoint_url} "
+                            f"(max_connections={self.max_connections})")
+            return self._client
+
+    def put(self, bucket: str, key: str, body, **kwargs) -> None:
+        """Uploads `body` (bytes or a binary file) to `bucket`/`key`; kwargs go to put_object"""
+        self.client.put_object(Bucket=bucket, Key=key, Body=body, **kwargs)
+
+    def public_url(self, bucket: str, key: str) -> str:
+        """Returns the public URL of an object uploaded with ACL public-read"""
+        return f'https://{bucket}.{self.region}.digitaloceanspaces.com/{key}'
+
+    def presigned_url(self, bucket: str, key: str, expires_in: int = 3600) -> str:
+        """Returns a URL granting read access to a private object for `expires_in` seconds"""
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=expires_in
+        )
+
+    def download_url(self, bucket: str, key: str) -> str:
+        """
+        Returns the URL handed to the purchaser
+
+        A presigned URL valid for OBJECT_STORE_PRESIGN_EXPIRY seconds when
+        OBJECT_STORE_PRESIGN is true, otherwise the public URL.
+        """
+        if os.getenv("OBJECT_STORE_PRESIGN", "false").lower() in ("1", "true", "yes"):
+            return self.presigned_url(bucket, key, int(os.getenv("OBJECT_STORE_PRESIGN_EXPIRY", "604800")))
+        return self.public_url(bucket, key)
+
+
+_object_stores: dict[str, ObjectStore] = {}
+_object_stores_lock = threading.Lock()
+
+
+def get_object_store(env_prefix: str = "SPACES") -> ObjectStore:
+    """
+    Returns the process-wide object store configured by `env_prefix`
+
+    Agents name their settings differently (SPACES_ENDPOINT, DO_SPACE_ENDPOINT),
+    so each prefix gets its own client reading:
+    {prefix}_ENDPOINT, {prefix}_REGION, {prefix}_KEY and {prefix}_SECRET.
+    """
+    with _object_stores_lock:
+        if env_prefix not in _object_stores:
+            _object_stores[env_prefix] = ObjectStore(
+                endpoint_url=os.getenv(f"{env_prefix}_ENDPOINT"),
+                region=os.getenv(f"{env_prefix}_REGION"),
+                access_key=os.getenv(f"{env_prefix}_KEY"),
+                secret_key=os.getenv(f"{env_prefix}_SECRET")
+            )
+        return _object_stores[env_prefix]
@@ -0,0 +1,274 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# The on-disk level is trimmed every this many writes rather than on each one
+DISK_EVICT_EVERY = 50
+
+
+def page_cache_key(url: str, options: dict | None = None) -> str:
+    """
+    Returns the cache key of a page fetched with the given render options
+
+    The options (renderer, viewport, js rendering, country, ...) are part
+    of the key, so e.g. a mobile render never answers a desktop request.
+    """
+    normalized = json.dumps({"url": url.strip(), "options": options or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class CachedPage:
+    """
+    A fetched page as stored in the page cache
+
+    Args:
+        html: Page content
+        status_code: HTTP status of the fetch
+        etag: ETag of the page, used to revalidate it once expired
+        last_modified: Last-Modified of the page, used to revalidate it once expired
+        fetched_at: When the page was fetched (default: now)
+    """
+
+    def __init__(self, html: str, status_code: int = 200, etag: str = None,
+                 last_modified: str = None, fetched_at: float = None):
+        self.html = html
+        self.status_code = status_code
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at or time.time()
+
+    def _dump(self) -> tuple:
+        meta = {"status_code": self.status_code, "etag": self.etag,
+                "last_modified": self.last_modified, "fetched_at": self.fetched_at}
+        return zlib.compress(self.html.encode("utf-8")), json.dumps(meta)
+
+    @classmethod
+    def _load(cls, content: bytes, meta: str) -> "CachedPage":
+        return cls(zlib.decompress(content).decode("utf-8"), **json.loads(meta))
+
+
+class PageCache:
+    """
+    Two-level cache for rendered pages
+
+    Rendering a page through Scrapfly or Browserless is slow and paid for
+    per call, while several tools of one job (and later jobs for the same
+    site) ask for the same page. Pages are kept zlib-compressed in an
+    in-memory LRU and, optionally, in a SQLite file shared by the processes
+    on the host. Entries expire after `ttl` seconds; an expired page with an
+    ETag or Last-Modified is revalidated with a cheap conditional request to
+    the site and kept if it did not change. Concurrent requests for the same
+    page wait for a single fetch.
+
+    Args:
+        path: SQLite file for the on-disk level, None to keep the cache in memory only
+        ttl: Seconds a page stays fresh
+        max_entries: Pages kept in memory
+        max_disk_entries: Pages kept on disk
+        revalidate_timeout: Seconds for the conditional request, 0 to refetch expired pages
+    """
+
+    def __init__(self, path: str | None = "data/page_cache.db", ttl: float = 3600,
+                 max_entries: int = 256, max_disk_entries: int = 10000, revalidate_timeout: float = 5):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.revalidate_timeout = revalidate_timeout
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._puts = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # Cache key -> [lock, number of callers holding or waiting for it]
+        self._fetch_locks = {}
+        self._local = threading.local()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._connect().execute("""
+                CREATE TABLE IF NOT EXISTS page_cache (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    content BLOB NOT NULL,
+                    meta TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> tuple | None:
+        """Returns (content, meta, expires_at) of an entry, expired or not"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        if not self.path:
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT content, meta, expires_at FROM page_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE page_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            entry = (row[0], row[1], row[2])
+            self._remember(key, entry)
+            return entry
+        except sqlite3.Error as e:
+            logger.warning(f"Page cache read failed: {str(e)}")
+            return None
+
+    def _store(self, key: str, url: str, content: bytes, meta: str, expires_at: float) -> None:
+        self._remember(key, (content, meta, expires_at))
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache (key, url, content, meta, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, content, meta, expires_at, time.time())
+            )
+            with self._lock:
+                self._puts += 1
+                evict = self._puts % DISK_EVICT_EVERY == 0
+            if evict:
+                # Expired pages are kept for another ttl so they can still be revalidated
+                conn.execute("DELETE FROM page_cache WHERE expires_at <= ?", (time.time() - self.ttl,))
+                excess = conn.execute("SELECT COUNT(*) FROM page_cache").fetchone()[0] - self.max_disk_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM page_cache WHERE key IN "
+                        "(SELECT key FROM page_cache ORDER BY accessed_at LIMIT ?)", (excess,)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"Page cache write failed: {str(e)}")
+
+    def get(self, url: str, options: dict = None) -> CachedPage | None:
+        """Returns the fresh cached page, or None"""
+        entry = self._lookup(page_cache_key(url, options))
+        if entry is None or entry[2] <= time.time():
+            return None
+        return CachedPage._load(entry[0], entry[1])
+
+    def put(self, url: str, page: CachedPage, options: dict = None) -> None:
+        """Caches a fetched page"""
+        content, meta = page._dump()
+        self._store(page_cache_key(url, options), url, content, meta, time.time() + self.ttl)
+
+    def _revalidate(self, url: str, key: str, entry: tuple) -> CachedPage | None:
+        """Returns the expired page if the site answers 304 Not Modified to a conditional request"""
+        page = CachedPage._load(entry[0], entry[1])
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        if not headers or self.revalidate_timeout <= 0:
+            return None
+        try:
+            response = httpx.get(url, headers=headers, timeout=self.revalidate_timeout, follow_redirects=True)
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 304:
+            return None
+        self._store(key, url, entry[0], entry[1], time.time() + self.ttl)
+        return page
+
+    def get_or_fetch(self, url: str, fetch, options: dict = None) -> CachedPage:
+        """
+        Returns the cached page, calling `fetch()` on a miss
+
+        Args:
+            url: Page URL
+            fetch: Zero-argument callable returning a CachedPage; exceptions are
+                   passed on and nothing is cached
+            options: Render options the page was fetched with
+        """
+        key = page_cache_key(url, options)
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, [threading.Lock(), 0])
+            fetch_lock[1] += 1
+        try:
+            with fetch_lock[0]:
+                entry = self._lookup(key)
+                if entry is not None:
+                    if entry[2] > time.time():
+                        with self._lock:
+                            self.hits += 1
+                        return CachedPage._load(entry[0], entry[1])
+                    page = self._revalidate(url, key, entry)
+                    if page is not None:
+                        with self._lock:
+                            self.revalidated += 1
+                        return page
+                with self._lock:
+                    self.misses += 1
+                page = fetch()
+                self.put(url, page, options)
+                return page
+        finally:
+            # Removed by the last caller only, so waiters and newcomers always share one lock
+            with self._lock:
+                fetch_lock[1] -= 1
+                if not fetch_lock[1]:
+                    del self._fetch_locks[key]
+
+    def stats(self) -> dict:
+        """Returns hit, revalidation and miss counts since startup"""
+        with self._lock:
+            return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses,
+                    "memory_entries": len(self._memory)}
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache:
+    """
+    Returns the process-wide page cache, configured from the environment
+
+    PAGE_CACHE_PATH: SQLite file, empty to keep the cache in memory only (default: data/page_cache.db)
+    PAGE_CACHE_TTL: seconds a page stays fresh (default: 1 hour)
+    PAGE_CACHE_MAX_ENTRIES: pages kept in memory (default: 256)
+    PAGE_CACHE_MAX_DISK_ENTRIES: pages kept on disk (default: 10000)
+    """
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache(
+                path=os.getenv("PAGE_CACHE_PATH", "data/page_cache.db") or None,
+                ttl=float(os.getenv("PAGE_CACHE_TTL", "3600")),
+                max_entries=int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256")),
+                max_disk_entries=int(os.getenv("PAGE_CACHE_MAX_DISK_ENTRIES", "10000"))
+            )
+        return _page_cache
@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# onChainState reported by the payment service once the purchaser's funds are locked
+PAID_STATE = "FundsLocked"
+
+
+class WatchedPayment:
+    """A pending payment and when it should next be checked"""
+
+    def __init__(self, payment_id: str, callback, submit_result_time: float | None, on_expired=None):
+        self.payment_id = payment_id
+        self.callback = callback
+        self.on_expired = on_expired
+        self.submit_result_time = submit_result_time
+        self.created_at = time.time()
+        self.next_check_at = self.created_at
+        self.state = None
+
+
+class PaymentWatcher:
+    """
+    Single poller for the status of every pending payment in this process
+
+    Instead of one Payment.start_status_monitoring loop per job, all pending
+    blockchainIdentifiers are checked together through the payment service's
+    paginated payment list, so N pending jobs cost a handful of requests per
+    poll instead of N.
+
+    Each payment is polled on its own adaptive schedule: every `min_interval`
+    seconds right after creation, backing off as it ages up to `max_interval`,
+    but never waiting longer than a quarter of the time left before its
+    submitResultTime. Payments still unpaid after submitResultTime are dropped
+    and their `on_expired` callback is awaited, so the job can be closed.
+
+    Args:
+        payment_service_url: Base URL of the Masumi payment service
+        payment_api_key: API key sent as the `token` header
+        network: "Preprod" or "Mainnet"
+        min_interval: Seconds between checks right after creation
+        max_interval: Upper bound for the backed-off interval
+        page_size: Payments requested per page of the list endpoint
+        max_pages: Pages read per poll before resolving the remaining ids one by one
+    """
+
+    def __init__(self, payment_service_url: str, payment_api_key: str, network: str = "Preprod",
+                 min_interval: float = 5.0, max_interval: float = 60.0,
+                 page_size: int = 100, max_pages: int = 5):
+        self.payment_service_url = (payment_service_url or "").rstrip("/")
+        self.payment_api_key = payment_api_key
+        self.network = network or "Preprod"
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self._watched: dict[str, WatchedPayment] = {}
+        self._states: dict[str, str | None] = {}
+        self._listeners = []
+        self._client = None
+        self._task = None
+        self._wakeup = None
+
+    def watch(self, payment_id: str, callback, submit_result_time=None, on_expired=None) -> None:
+        """
+        Starts watching a payment
+
+        Args:
+            payment_id: blockchainIdentifier returned by create_payment_request
+            callback: `async def callback(payment_id)` awaited once the payment is locked
+            submit_result_time: submitResultTime from the payment request (ms since epoch)
+            on_expired: `async def on_expired(payment_id)` awaited if the payment is not
+                locked before submit_result_time
+        """
+        deadline = float(submit_result_time) / 1000 if submit_result_time else None
+        self._watched[payment_id] = WatchedPayment(payment_id, callback, deadline, on_expired)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def unwatch(self, payment_id: str) -> None:
+        self._watched.pop(payment_id, None)
+
+    def add_listener(self, listener) -> None:
+        """Registers `listener(payment_id, state)`, called whenever a payment changes state"""
+        self._listeners.append(listener)
+
+    def get_state(self, payment_id: str) -> str | None:
+        """Returns the last onChainState seen for a payment (None while pending)"""
+        return self._states.get(payment_id)
+
+    def _interval(self, entry: WatchedPayment, now: float) -> float:
+        # Back off linearly with age: a payment that has not arrived after a
+        # few minutes is unlikely to arrive in the next few seconds
+        interval = min(self.max_interval, max(self.min_interval, (now - entry.created_at) / 10))
+        if entry.submit_result_time is not None:
+            interval = min(interval, max(self.min_interval, (entry.submit_result_time - now) / 4))
+        return interval
+
+    async def _fetch_states(self, payment_ids: set[str]) -> dict[str, str | None]:
+        """
+        Returns the onChainState of the requested payments
+
+        Reads the payment list page by page until every id was seen, then
+        resolves the ids not among the first `max_pages` pages one by one.
+        Ids whose state could not be determined are left out; ids the
+        payment service does not know map to None.
+        """
+        headers = {"token": self.payment_api_key, "accept": "application/json"}
+        found = {}
+        cursor_id = None
+        for _ in range(self.max_pages):
+            params = {"network": self.network, "limit": self.page_size, "includeHistory": "false"}
+            if cursor_id:
+                params["cursorId"] = cursor_id
+            response = await self._client.get(f"{self.payment_service_url}/payment/", params=params, headers=headers)
+            response.raise_for_status()
+            payments = response.json().get("data", {}).get("Payments", [])
+            for payment in payments:
+                if payment.get("blockchainIdentifier") in payment_ids:
+                    found[payment["blockchainIdentifier"]] = payment.get("onChainState")
+            if len(found) == len(payment_ids) or len(payments) < self.page_size:
+                return found
+            cursor_id = payments[-1].get("id")
+
+        for payment_id in payment_ids - found.keys():
+            try:
+                response = await self._client.post(
+                    f"{self.payment_service_url}/payment/resolve-blockchain-identifier",
+                    json={"network": self.network, "blockchainIdentifier": payment_id, "includeHistory": "false"},
+                    headers=headers
+                )
+                if response.status_code == 404:
+                    found[payment_id] = None
+                    continue
+                response.raise_for_status()
+                found[payment_id] = (response.json().get("data") or {}).get("onChainState")
+            except httpx.HTTPError as e:
+                logger.warning(f"Could not resolve payment {payment_id}: {str(e)}")
+        return found
+
+    async def poll_once(self) -> None:
+        """Checks every payment that is due, dispatching callbacks for paid and expired ones"""
+        now = time.time()
+        # Expired payments are checked one last time, they may have been locked since the previous poll
+        due = {pid for pid, entry in self._watched.items()
+               if entry.next_check_at <= now or (entry.submit_result_time is not None and now > entry.submit_result_time)}
+        if not due:
+            return
+
+        states = await self._fetch_states(due)
+        logger.info(f"Checked {len(due)} pending payments, {len(states)} found")
+        for payment_id in due:
+            entry = self._watched.get(payment_id)
+            if entry is None:
+                continue
+            if payment_id not in states:
+                # Unknown, not pending: never expire a payment that may have been paid
+                entry.next_check_at = now + self.min_interval
+                continue
+            state = states[payment_id]
+            self._states[payment_id] = state
+            if state != entry.state:
+                logger.info(f"Payment {payment_id} changed state: {entry.state} -> {state}")
+                entry.state = state
+                for listener in self._listeners:
+                    try:
+                        listener(payment_id, state)
+                    except Exception as e:
+                        logger.error(f"Error in payment state listener: {str(e)}", exc_info=True)
+            if state == PAID_STATE:
+                self.unwatch(payment_id)
+                asyncio.create_task(self._dispatch(entry, entry.callback))
+            elif entry.submit_result_time is not None and now > entry.submit_result_time:
+                logger.warning(f"Payment {payment_id} not received before submitResultTime, no longer watching")
+                self.unwatch(payment_id)
+                if entry.on_expired is not None:
+                    asyncio.create_task(self._dispatch(entry, entry.on_expired))
+            else:
+                entry.next_check_at = now + self._interval(entry, now)
+
+    async def _dispatch(self, entry: WatchedPayment, callback) -> None:
+        try:
+            await callback(entry.payment_id)
+        except Exception as e:
+            logger.error(f"Error in payment callback for {entry.payment_id}: {str(e)}", exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.error(f"Error polling payment status: {str(e)}", exc_info=True)
+            self._wakeup.clear()
+            next_due = min((entry.next_check_at for entry in self._watched.values()), default=None)
+            timeout = self.max_interval if next_due is None else max(0.5, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        """Starts the polling loop on the running event loop"""
+        if self._task is None:
+            self._client = httpx.AsyncClient(timeout=30)
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+_watcher = None
+
+
+def get_payment_watcher(payment_service_url: str, payment_api_key: str, network: str = None) -> PaymentWatcher:
+    """
+    Returns the process-wide payment watcher, configured from the environment
+
+    PAYMENT_POLL_MIN_INTERVAL: seconds between checks of a fresh payment (default: 5)
+    PAYMENT_POLL_MAX_INTERVAL: upper bound of the backed-off interval (default: 60)
+    """
+    global _watcher
+    if _watcher is None:
+        _watcher = PaymentWatcher(
+            payment_service_url,
+            payment_api_key,
+            network=network,
+            min_interval=float(os.getenv("PAYMENT_POLL_MIN_INTERVAL", "5")),
+            max_interval=float(os.getenv("PAYMENT_POLL_MAX_INTERVAL", "60"))
+        )
+    return _watcher
@@ -0,0 +1,63 @@
+import logging
+from contextvars import ContextVar
+from .job_store import get_job_store
+
+logger = logging.getLogger(__name__)
+
+# Job run by the current worker thread (or worker process). A context variable
+# behaves like a thread-local for the workers and also follows asyncio tasks.
+_current_job_id: ContextVar[str | None] = ContextVar("current_job_id", default=None)
+
+
+def run_job(run, job_id: str, input_data: dict):
+    """
+    Calls an agent's `run(input_data)` with `job_id` as the current job
+
+    Submitted to the worker pool in place of `run` itself, so report_progress()
+    knows which job to update. Module-level so process workers can unpickle it.
+    """
+    token = _current_job_id.set(job_id)
+    try:
+        return run(input_data)
+    finally:
+        _current_job_id.reset(token)
+
+
+def current_job_id() -> str | None:
+    """Returns the id of the job the calling worker runs, or None (e.g. for /force_run)"""
+    return _current_job_id.get()
+
+
+async def as_job(coro, job_id: str | None):
+    """
+    Awaits `coro` with `job_id` as the current job
+
+    Coroutines handed to an event loop on another thread (run_coroutine_threadsafe)
+    do not inherit the caller's context; wrap them with the caller's current_job_id().
+    """
+    _current_job_id.set(job_id)
+    return await coro
+
+
+def report_progress(**fields) -> None:
+    """
+    Publishes fields of a running job on /status before its result is ready
+
+    Call it from an agent's `run` (or threads it starts with the job id
+    passed along), e.g. report_progress(partial_result_url=url). The fields
+    are replaced by the result's extra fields once the job completes.
+    Does nothing outside a paid job.
+
+    Args:
+        fields: JSON-serializable values returned by /status next to the job status
+        job_id: Job to update (default: the calling worker's job)
+    """
+    job_id = fields.pop("job_id", None) or current_job_id()
+    if job_id is None:
+        return
+    try:
+        # Merged in one step, so threads reporting different fields do not drop each other's
+        get_job_store().merge_extra(job_id, fields)
+    except Exception as e:
+        # Progress is best effort and must never fail the job
+        logger.warning(f"Could not report progress for job {job_id}: {str(e)}")
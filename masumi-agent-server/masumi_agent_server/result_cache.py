@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# The on-disk level is trimmed every this many writes rather than on each one
+DISK_EVICT_EVERY = 100
+
+
+class ResultCache:
+    """
+    Two-level TTL cache for JSON-serializable results of paid API calls
+
+    An in-memory LRU answers repeats within the process in microseconds;
+    the optional SQLite file is shared by the processes on the host and
+    survives restarts. Entries count as fresh for `ttl` seconds. Expired
+    entries are kept for another `keep_stale` seconds so callers can fall
+    back to them (see lookup()), and both levels evict the least recently
+    used entries once full.
+
+    Args:
+        path: SQLite file for the on-disk level, None to keep the cache in memory only
+        ttl: Seconds an entry stays fresh
+        max_entries: Entries kept in memory
+        max_disk_entries: Entries kept on disk
+        keep_stale: Seconds expired entries are kept for lookup()
+        table: SQLite table holding the entries
+    """
+
+    def __init__(self, path: str | None, ttl: float, max_entries: int = 1024, max_disk_entries: int = 100000,
+                 keep_stale: float = 0, table: str = "result_cache"):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.keep_stale = keep_stale
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._connect().execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, value, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def lookup(self, key: str) -> tuple:
+        """
+        Returns (value, fresh) of an entry, also when it has expired
+
+        Lets callers refresh expired entries themselves and fall back to the
+        old value when the refresh fails. (None, False) if there is no entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry[0], entry[1] > now
+        if self.path:
+            try:
+                conn = self._connect()
+                row = conn.execute(
+                    f"SELECT value, expires_at FROM {self.table} WHERE key = ? AND expires_at > ?",
+                    (key, now - self.keep_stale)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    return value, row[1] > now
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache read failed: {str(e)}")
+        return None, False
+
+    def get(self, key: str):
+        """Returns the fresh cached value of `key`, or None"""
+        value, fresh = self.lookup(key)
+        with self._lock:
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return value if fresh else None
+
+    def put(self, key: str, value) -> None:
+        """Caches `value` under `key`"""
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+        if not self.path:
+            return
+        try:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default=str), expires_at, now)
+            )
+            with self._lock:
+                self._puts += 1
+                evict = self._puts % DISK_EVICT_EVERY == 0
+            if evict:
+                self._evict_disk(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache write failed: {str(e)}")
+
+    def _evict_disk(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now - self.keep_stale,))
+        excess = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+
+    def get_or_fetch(self, key: str, fetch):
+        """Returns the fresh cached value of `key`, calling `fetch()` and caching its result otherwise"""
+        value = self.get(key)
+        if value is None:
+            value = fetch()
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """Returns hit and miss counts since startup"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
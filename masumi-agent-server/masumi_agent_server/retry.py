@@ -0,0 +1,325 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from .progress import current_job_id
+
+logger = logging.getLogger(__name__)
+
+# Jobs whose spent retries are remembered, oldest are forgotten first
+MAX_TRACKED_JOBS = 1024
+
+
+class RetryableError(Exception):
+    """
+    Raised by a call wrapped in a RetryPolicy to ask for another attempt
+
+    Args:
+        message: What went wrong
+        retry_after: Seconds the server asked to wait (a Retry-After value), None to back off
+    """
+
+    def __init__(self, message: str, retry_after: float | str = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """The circuit breaker of a host is open, the call was not attempted"""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a host after `failure_threshold` consecutive failures
+
+    While open, calls fail at once with CircuitOpenError instead of adding
+    load to a struggling service. After `reset_timeout` seconds one trial
+    call is let through: its success closes the circuit, its failure opens
+    it again, and an error that is neither (a 4xx) lets the next call try.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        """Returns whether a call may be attempted now"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def release(self) -> None:
+        """Ends a trial call that neither succeeded nor failed, so another one is let through"""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class RetryBudget:
+    """
+    Caps the retries of one job across every host and policy
+
+    A bad window of an upstream service otherwise multiplies a job's load by
+    the attempts of each of its calls. Calls outside a job (/force_run, local
+    runs) are not capped.
+    """
+
+    def __init__(self, max_retries: int = 50):
+        self.max_retries = max_retries
+        self._spent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def spend(self, job_id: str | None) -> bool:
+        """Takes one retry from the job's budget, False if it is used up"""
+        if job_id is None:
+            return True
+        with self._lock:
+            spent = self._spent.pop(job_id, 0)
+            self._spent[job_id] = spent + (spent < self.max_retries)
+            while len(self._spent) > MAX_TRACKED_JOBS:
+                self._spent.popitem(last=False)
+            return spent < self.max_retries
+
+    def spent(self, job_id: str) -> int:
+        """Returns the retries the job has used"""
+        with self._lock:
+            return self._spent.get(job_id, 0)
+
+
+class RetryPolicy:
+    """
+    Retries failed calls to external APIs with exponential backoff and full jitter
+
+    Wraps calls with call() (sync) or acall() (async). An attempt is retried
+    when it raises an exception `retryable` accepts (by default RetryableError);
+    its retry_after attribute, if set, replaces the backoff. Every host has a
+    circuit breaker and every retry is taken from the job's budget; once the
+    attempts or the budget are used up the last error is raised. Retry counts
+    per host are kept for stats().
+
+    Args:
+        name: Name used in logs and metrics, e.g. "scrapfly"
+        max_attempts: Attempts per call, including the first
+        base_delay: Seconds before the first retry, doubled for each further one
+        max_delay: Upper bound of the backoff
+        budget: Retry budget per job (default: the process-wide one)
+        failure_threshold: Consecutive failures opening a host's circuit
+        reset_timeout: Seconds a circuit stays open
+    """
+
+    def __init__(self, name: str, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30,
+                 budget: RetryBudget = None, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or get_retry_budget()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._metrics = defaultdict(lambda: {"calls": 0, "retries": 0, "failures": 0, "rejected": 0})
+        self._lock = threading.Lock()
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        """Returns the circuit breaker of `host`"""
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    def delay(self, attempt: int, error: Exception = None) -> float:
+        """Returns the seconds to wait after failed attempt number `attempt` (0-based)"""
+        retry_after = getattr(error, "retry_after", None)
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), self.max_delay)
+        except ValueError:
+            # An HTTP date instead of seconds, fall back to the backoff
+            pass
+        # Full jitter keeps parallel workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _count(self, host: str, field: str) -> None:
+        with self._lock:
+            self._metrics[host][field] += 1
+
+    def _before_attempt(self, host: str, breaker: CircuitBreaker) -> None:
+        if not breaker.allow():
+            self._count(host, "rejected")
+            raise CircuitOpenError(f"{self.name}: circuit for {host} is open")
+
+    def _after_failure(self, host: str, breaker: CircuitBreaker, attempt: int, max_attempts: int,
+                       error: Exception, job_id: str | None) -> float | None:
+        """Returns the seconds to wait before the next attempt, None to give up"""
+        breaker.record_failure()
+        if attempt + 1 >= max_attempts:
+            self._count(host, "failures")
+            return None
+        if not self.budget.spend(job_id):
+            logger.warning(f"{self.name}: retry budget of job {job_id} used up, giving up on {host}")
+            self._count(host, "failures")
+            return None
+        self._count(host, "retries")
+        delay = self.delay(attempt, error)
+        logger.warning(f"{self.name}: {host} failed ({str(error)}), retry {attempt + 1}/{max_attempts - 1} "
+                       f"in {delay:.1f}s")
+        return delay
+
+    def _after_final_error(self, host: str, breaker: CircuitBreaker, error: Exception, counts_as_failure) -> None:
+        """Settles the circuit for an error that is not retried"""
+        if counts_as_failure is not None and counts_as_failure(error):
+            breaker.record_failure()
+            self._count(host, "failures")
+        else:
+            # The host answered (a 4xx, a parse error); neither healthy nor failing, but a half-open trial is over
+            breaker.release()
+
+    def call(self, host: str, fn, *args, retryable=None, counts_as_failure=None,
+             max_attempts: int = None, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)`, retrying it as configured
+
+        Args:
+            host: Host the call goes to, each has its own circuit breaker
+            retryable: Returns whether an exception should be retried (default: RetryableError only)
+            counts_as_failure: Returns whether an exception that is not retried still counts
+                against the host's circuit, e.g. a timeout (default: none does)
+            max_attempts: Overrides the policy's attempts for this call
+
+        Raises:
+            CircuitOpenError: The host's circuit is open
+            Exception: The last error once no retry is left
+        """
+        retryable = retryable or _is_retryable_error
+        max_attempts = max_attempts or self.max_attempts
+        breaker = self.breaker(host)
+        job_id = current_job_id()
+        self._count(host, "calls")
+        for attempt in range(max_attempts):
+            self._before_attempt(host, breaker)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not retryable(e):
+                    self._after_final_error(host, breaker, e, counts_as_failure)
+                    raise
+                delay = self._after_failure(host, breaker, attempt, max_attempts, e, job_id)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def acall(self, host: str, fn, *args, retryable=None, counts_as_failure=None,
+                    max_attempts: int = None, **kwargs):
+        """call() for coroutine functions, awaiting `fn(*args, **kwargs)` and sleeping without blocking the loop"""
+        retryable = retryable or _is_retryable_error
+        max_attempts = max_attempts or self.max_attempts
+        breaker = self.breaker(host)
+        job_id = current_job_id()
+        self._count(host, "calls")
+        for attempt in range(max_attempts):
+            self._before_attempt(host, breaker)
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not retryable(e):
+                    self._after_final_error(host, breaker, e, counts_as_failure)
+                    raise
+                delay = self._after_failure(host, breaker, attempt, max_attempts, e, job_id)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    def stats(self) -> dict:
+        """Returns calls, retries, failures and rejected calls per host, with the state of its circuit"""
+        with self._lock:
+            hosts = {host: dict(counts) for host, counts in self._metrics.items()}
+            breakers = dict(self._breakers)
+        for host, counts in hosts.items():
+            counts["circuit"] = breakers[host].state if host in breakers else "closed"
+        return hosts
+
+
+def _is_retryable_error(error: Exception) -> bool:
+    return isinstance(error, RetryableError)
+
+
+_retry_budget = None
+_retry_policies: dict[str, RetryPolicy] = {}
+_retry_lock = threading.Lock()
+
+
+def get_retry_budget() -> RetryBudget:
+    """
+    Returns the process-wide retry budget shared by every policy
+
+    RETRY_BUDGET: retries one job may spend across all external calls (default: 50)
+    """
+    global _retry_budget
+    with _retry_lock:
+        if _retry_budget is None:
+            _retry_budget = RetryBudget(int(os.getenv("RETRY_BUDGET", "50")))
+        return _retry_budget
+
+
+def get_retry_policy(name: str) -> RetryPolicy:
+    """
+    Returns the process-wide retry policy of an external service, configured from the environment
+
+    RETRY_MAX_ATTEMPTS: attempts per call, including the first (default: 4)
+    RETRY_BASE_DELAY: seconds before the first retry (default: 0.5)
+    RETRY_MAX_DELAY: upper bound of the backoff (default: 30)
+    CIRCUIT_FAILURE_THRESHOLD: consecutive failures opening a host's circuit (default: 5)
+    CIRCUIT_RESET_TIMEOUT: seconds a circuit stays open (default: 30)
+    """
+    budget = get_retry_budget()
+    with _retry_lock:
+        if name not in _retry_policies:
+            _retry_policies[name] = RetryPolicy(
+                name,
+                max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "4")),
+                base_delay=float(os.getenv("RETRY_BASE_DELAY", "0.5")),
+                max_delay=float(os.getenv("RETRY_MAX_DELAY", "30")),
+                budget=budget,
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+            )
+        return _retry_policies[name]
@@ -0,0 +1,84 @@
+import os
+import json
+import hashlib
+import threading
+from .result_cache import ResultCache
+
+# Serper's defaults, so {"q": ...} and {"q": ..., "gl": "us", "num": 10} share an entry
+DEFAULT_SEARCH_PARAMS = {"gl": "us", "num": 10}
+
+
+def search_cache_key(query: dict) -> str:
+    """
+    Returns the cache key of a search request body
+
+    The query text is lowercased and its whitespace collapsed, parameters
+    left at Serper's defaults are filled in and the rest (gl, num, hl, type,
+    ...) is part of the key, so only requests asking the same question match.
+    """
+    params = {**DEFAULT_SEARCH_PARAMS, **{k: v for k, v in query.items() if v is not None}}
+    params["q"] = " ".join(str(params.get("q", "")).lower().split())
+    normalized = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class SearchCache(ResultCache):
+    """
+    Two-level cache for search API results
+
+    A ResultCache keyed by search_cache_key(), so the methods take the
+    request body instead of a key. Only successful results are cached,
+    failed searches are retried next time.
+
+    Args:
+        path: SQLite file for the on-disk level, None to keep the cache in memory only
+        ttl: Seconds a result stays valid
+        max_entries: Entries kept in memory
+        max_disk_entries: Entries kept on disk
+    """
+
+    def __init__(self, path: str | None = "data/search_cache.db", ttl: float = 24 * 3600,
+                 max_entries: int = 1024, max_disk_entries: int = 100000):
+        super().__init__(path, ttl, max_entries=max_entries, max_disk_entries=max_disk_entries,
+                         table="search_cache")
+
+    def get(self, query: dict):
+        """Returns the cached result of `query`, or None"""
+        return super().get(search_cache_key(query))
+
+    def put(self, query: dict, value) -> None:
+        """Caches the result of `query`"""
+        super().put(search_cache_key(query), value)
+
+    def get_or_fetch(self, query: dict, fetch):
+        """Returns the cached result of `query`, calling `fetch()` and caching its result on a miss"""
+        value = self.get(query)
+        if value is None:
+            value = fetch()
+            self.put(query, value)
+        return value
+
+
+_search_cache = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """
+    Returns the process-wide search cache, configured from the environment
+
+    SEARCH_CACHE_PATH: SQLite file, empty to keep the cache in memory only (default: data/search_cache.db)
+    SEARCH_CACHE_TTL: seconds a result stays valid (default: 1 day)
+    SEARCH_CACHE_MAX_ENTRIES: entries kept in memory (default: 1024)
+    SEARCH_CACHE_MAX_DISK_ENTRIES: entries kept on disk (default: 100000)
+    """
+    global _search_cache
+    with _search_cache_lock:
+        if _search_cache is None:
+            _search_cache = SearchCache(
+                path=os.getenv("SEARCH_CACHE_PATH", "data/search_cache.db") or None,
+                ttl=float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600))),
+                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024")),
+                max_disk_entries=int(os.getenv("SEARCH_CACHE_MAX_DISK_ENTRIES", "100000"))
+            )
+        return _search_cache
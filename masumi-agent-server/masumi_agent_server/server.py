@@ -0,0 +1,403 @@
+import os
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any
+from fastapi import FastAPI, APIRouter, Body, Query, HTTPException, Request, Response
+from pydantic import BaseModel
+from masumi.config import Config
+from masumi.payment import Payment, Amount
+from .agent import MasumiAgent, JobResult
+from .executor import get_executor
+from .job_store import get_job_store, maintain_job_store, job_etag, wait_for_change
+from .payment_watcher import get_payment_watcher
+from .progress import run_job
+
+logger = logging.getLogger(__name__)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pydantic Models
+# ─────────────────────────────────────────────────────────────────────────────
+class StartJobRequest(BaseModel):
+    identifier_from_purchaser: str
+    input_data: dict[str, Any]
+
+
+def _split_result(result) -> tuple[Any, dict]:
+    """ Separates a crew result into a JSON-friendly value and its extra job fields """
+    extra = {}
+    if isinstance(result, JobResult):
+        result, extra = result.result, result.extra
+    if result is not None and not isinstance(result, (str, int, float, bool, dict, list)):
+        # CrewOutput and similar objects render their raw output through str()
+        result = str(result)
+    return result, extra
+
+
+def _truncate(text: str, length: int = 100) -> str:
+    return text[:length] + "..." if len(text) > length else text
+
+
+# Every AgentServer in this process, by agent name, so recovered jobs reach their agent
+_servers: dict[str, "AgentServer"] = {}
+_maintenance_task = None
+
+
+class AgentServer:
+    """
+    MIP-003 endpoints and payment flow for one agent
+
+    The worker pool, job store and payment watcher are process-wide and
+    shared by every AgentServer in the process; only the crew and its input
+    schema differ. Jobs are tagged with the agent name so a shared job store
+    can hand recovered jobs back to the agent that created them.
+
+    Args:
+        agent: The agent to serve
+    """
+
+    def __init__(self, agent: MasumiAgent):
+        if agent.name in _servers:
+            raise ValueError(f"Agent already registered: {agent.name}")
+        self.agent = agent
+        self.network = os.getenv("NETWORK", "Preprod")
+        payment_service_url = os.getenv("PAYMENT_SERVICE_URL")
+        payment_api_key = os.getenv("PAYMENT_API_KEY")
+        self.config = Config(
+            payment_service_url=payment_service_url,
+            payment_api_key=payment_api_key
+        )
+        self.executor = get_executor()
+        self.job_store = get_job_store()
+        # One poller checks every pending payment in batches instead of one loop per job
+        self.payment_watcher = get_payment_watcher(payment_service_url, payment_api_key, self.network)
+        if not _servers:
+            self.payment_watcher.add_listener(_record_payment_state)
+        # Payment monitors live in this process only; the job store is the source of truth
+        self.payment_instances = {}
+        self.router = self._build_router()
+        _servers[agent.name] = self
+        logger.info(f"Registered agent {agent.name} ({agent.agent_identifier})")
+
+    def _create_payment(self, identifier_from_purchaser: str, input_data: dict, payment_id: str = None) -> Payment:
+        payment = Payment(
+            agent_identifier=self.agent.agent_identifier,
+            config=self.config,
+            identifier_from_purchaser=identifier_from_purchaser,
+            input_data=input_data,
+            network=self.network
+        )
+        if payment_id:
+            payment.payment_ids.add(payment_id)
+        return payment
+
+    def _watch(self, job_id: str, payment_id: str, submit_result_time) -> None:
+        async def payment_callback(payment_id: str):
+            await self.handle_payment_status(job_id, payment_id)
+
+        async def payment_expired(payment_id: str):
+            # Closing the job sets finished_at, so it stops being recovered and is evicted in time
+            logger.warning(f"Job {job_id} expired, payment {payment_id} not received before submitResultTime")
+            job = self.job_store.get(job_id)
+            if job is not None and job["status"] == "awaiting_payment":
+                self.job_store.update(job_id, status="failed", payment_status="expired",
+                                      error="Payment not received before submitResultTime")
+            self.payment_instances.pop(job_id, None)
+
+        self.payment_watcher.watch(payment_id, payment_callback, submit_result_time, payment_expired)
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 1) Start Job (MIP-003: /start_job)
+    # ─────────────────────────────────────────────────────────────────────────
+    async def start_job(self, data: StartJobRequest) -> dict:
+        """ Initiates a job and creates a payment request """
+        if not self.executor.has_capacity():
+            logger.warning(f"Rejecting job, worker pool saturated: {self.executor.stats()}")
+            raise HTTPException(status_code=503, detail="Server is at capacity, please retry later.")
+        missing = self.agent.missing_inputs(data.input_data)
+        if missing:
+            logger.warning(f"Rejecting job, missing input fields: {missing}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bad Request: input_data is missing required fields: {', '.join(missing)}"
+            )
+        try:
+            job_id = str(uuid.uuid4())
+            logger.info(f"Received job request with input: '{_truncate(str(data.input_data))}'")
+            logger.info(f"Starting job {job_id} with agent {self.agent.name}")
+
+            amounts = [Amount(amount=self.agent.payment_amount, unit=self.agent.payment_unit)]
+            logger.info(f"Using payment amount: {self.agent.payment_amount} {self.agent.payment_unit}")
+
+            # Create a payment request using Masumi
+            payment = self._create_payment(data.identifier_from_purchaser, data.input_data)
+            logger.info("Creating payment request...")
+            payment_request = await payment.create_payment_request()
+            payment_id = payment_request["data"]["blockchainIdentifier"]
+            payment.payment_ids.add(payment_id)
+            logger.info(f"Created payment request with ID: {payment_id}")
+
+            # Store job info (Awaiting payment)
+            self.job_store.create(job_id, {
+                "agent": self.agent.name,
+                "status": "awaiting_payment",
+                "submit_result_time": payment_request["data"]["submitResultTime"],
+                "payment_status": "pending",
+                "payment_id": payment_id,
+                "input_data": data.input_data,
+                "result": None,
+                "identifier_from_purchaser": data.identifier_from_purchaser
+            })
+
+            # Hand the payment to the shared status poller
+            self.payment_instances[job_id] = payment
+            logger.info(f"Watching payment status for job {job_id}")
+            self._watch(job_id, payment_id, payment_request["data"]["submitResultTime"])
+
+            # Return the response in the required format
+            return {
+                "status": "success",
+                "job_id": job_id,
+                "blockchainIdentifier": payment_id,
+                "submitResultTime": payment_request["data"]["submitResultTime"],
+                "unlockTime": payment_request["data"]["unlockTime"],
+                "externalDisputeUnlockTime": payment_request["data"]["externalDisputeUnlockTime"],
+                "agentIdentifier": self.agent.agent_identifier,
+                "sellerVkey": self.agent.seller_vkey,
+                "identifierFromPurchaser": data.identifier_from_purchaser,
+                "amounts": amounts,
+                "input_hash": payment.input_hash
+            }
+        except Exception as e:
+            logger.error(f"Error in start_job: {str(e)}", exc_info=True)
+            raise HTTPException(
+                status_code=400,
+                detail="Input_data or identifier_from_purchaser is missing, invalid, or does not adhere to the schema."
+            )
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 2) Process Payment and Execute AI Task
+    # ─────────────────────────────────────────────────────────────────────────
+    async def handle_payment_status(self, job_id: str, payment_id: str) -> None:
+        """ Executes the crew after payment confirmation """
+        try:
+            logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
+
+            # Update job status to running
+            self.job_store.update(job_id, status="running")
+            job = self.job_store.get(job_id)
+
+            # Execute the AI task in the worker pool; progress fields are replaced by the result's
+            result, extra = _split_result(await self.executor.run(run_job, self.agent.run, job_id, job["input_data"]))
+            logger.info(f"Crew task completed for job {job_id}")
+
+            # Mark payment as completed on Masumi
+            output = result if isinstance(result, dict) else str(result)
+            await self.payment_instances[job_id].complete_payment(payment_id, output)
+            logger.info(f"Payment completed for job {job_id}")
+
+            # Update job status
+            self.job_store.update(job_id, status="completed", payment_status="completed",
+                                  result=result, extra=extra)
+
+            # The watcher stopped polling once the payment was locked
+            self.payment_instances.pop(job_id, None)
+        except Exception as e:
+            logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
+            self.job_store.update(job_id, status="failed", error=str(e))
+
+            # Still stop watching to prevent repeated failures
+            self.payment_watcher.unwatch(payment_id)
+            self.payment_instances.pop(job_id, None)
+
+    async def recover_job(self, job: dict) -> None:
+        """ Resumes a job left behind by a dead or restarted worker """
+        job_id = job["job_id"]
+        payment_id = job["payment_id"]
+        self.payment_instances[job_id] = self._create_payment(
+            job["identifier_from_purchaser"], job["input_data"], payment_id
+        )
+
+        if job["status"] == "running":
+            logger.info(f"Re-queuing job {job_id} that was running when its worker stopped")
+            asyncio.create_task(self.handle_payment_status(job_id, payment_id))
+        else:
+            logger.info(f"Resuming payment status watching for job {job_id}")
+            self._watch(job_id, payment_id, job.get("submit_result_time"))
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 3) Check Job and Payment Status (MIP-003: /status)
+    # ─────────────────────────────────────────────────────────────────────────
+    async def get_status(self, request: Request, response: Response, job_id: str, wait: float = 0):
+        """
+        Retrieves the current status of a specific job
+
+        Served from the job store; payment state is kept current by the payment
+        watcher. Clients may send the last ETag as If-None-Match to get a 304,
+        and add wait=N to hold the request until the job changes.
+        """
+        logger.info(f"Checking status for job {job_id}")
+        job = self.job_store.get(job_id)
+        if job is None or job.get("agent", self.agent.name) != self.agent.name:
+            logger.warning(f"Job {job_id} not found")
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        # Long-poll: hold the request while the job still matches what the client has
+        known_etag = request.headers.get("if-none-match")
+        if wait and known_etag == job_etag(job):
+            job = await wait_for_change(self.job_store, job_id, known_etag, wait)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Job not found")
+
+        etag = job_etag(job)
+        if known_etag == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "payment_status": job["payment_status"],
+            "result": job.get("result"),
+            **job.get("extra", {})
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 4) Check Server Availability (MIP-003: /availability)
+    # ─────────────────────────────────────────────────────────────────────────
+    async def check_availability(self) -> dict:
+        """ Checks if the server is operational """
+        return {
+            "status": "available",
+            "type": "masumi-agent",
+            "agentIdentifier": self.agent.agent_identifier,
+            "message": "The server is running smoothly."
+        }
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 5) Retrieve Input Schema (MIP-003: /input_schema)
+    # ─────────────────────────────────────────────────────────────────────────
+    async def input_schema(self) -> dict:
+        """
+        Returns the expected input schema for the /start_job endpoint.
+        Fulfills MIP-003 /input_schema endpoint.
+        """
+        return {"input_data": self.agent.input_schema}
+
+    # ─────────────────────────────────────────────────────────────────────────
+    # 6) Health Check
+    # ─────────────────────────────────────────────────────────────────────────
+    async def health(self) -> dict:
+        """
+        Returns the health of the server.
+        """
+        return {
+            "status": "healthy"
+        }
+
+    async def force_run(self, data: StartJobRequest):
+        """ Runs the crew without a payment (development only) """
+        result, _ = _split_result(await self.executor.run(self.agent.run, data.input_data))
+        return result
+
+    def _build_router(self) -> APIRouter:
+        router = APIRouter()
+        example = {
+            "identifier_from_purchaser": "example_purchaser_123",
+            "input_data": self.agent.example_input
+        }
+
+        async def start_job(data: StartJobRequest = Body(openapi_examples={"example": {"value": example}})):
+            return await self.start_job(data)
+
+        async def get_status(
+            request: Request,
+            response: Response,
+            job_id: str,
+            wait: float = Query(0, ge=0, le=60, description="Seconds to wait for a change when If-None-Match matches")
+        ):
+            return await self.get_status(request, response, job_id, wait)
+
+        router.add_api_route("/start_job", start_job, methods=["POST"], summary="Start Job")
+        router.add_api_route("/status", get_status, methods=["GET"], summary="Get Status")
+        router.add_api_route("/availability", self.check_availability, methods=["GET"])
+        router.add_api_route("/input_schema", self.input_schema, methods=["GET"])
+        router.add_api_route("/health", self.health, methods=["GET"])
+        if self.agent.allow_force_run:
+            router.add_api_route("/force_run", self.force_run, methods=["POST"])
+        return router
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Process-wide background tasks
+# ─────────────────────────────────────────────────────────────────────────────
+async def recover_job(job: dict) -> None:
+    """ Routes a job claimed from a dead worker to the agent that created it """
+    server = _servers.get(job.get("agent"))
+    if server is None and len(_servers) == 1:
+        # Jobs written before agents were tagged belong to the only agent
+        server = next(iter(_servers.values()))
+    if server is None:
+        logger.warning(f"No agent registered for job {job['job_id']} ({job.get('agent')}), skipping recovery")
+        return
+    await server.recover_job(job)
+
+
+async def start_background_tasks() -> None:
+    """ Starts job store maintenance and payment polling once per process """
+    global _maintenance_task
+    if _maintenance_task is None:
+        # Heartbeats, crash recovery and TTL eviction for the job store
+        _maintenance_task = asyncio.create_task(maintain_job_store(get_job_store(), recover_job))
+    for server in _servers.values():
+        server.payment_watcher.start()
+
+
+async def stop_background_tasks() -> None:
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        _maintenance_task = None
+    get_executor().shutdown(wait=False)
+    for server in _servers.values():
+        await server.payment_watcher.stop()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """ FastAPI lifespan running the shared background tasks """
+    await start_background_tasks()
+    yield
+    await stop_background_tasks()
+
+
+def _record_payment_state(payment_id: str, state: str | None) -> None:
+    """ Persists payment state changes seen by the watcher so /status never calls the payment service """
+    store = get_job_store()
+    job = store.find_by_payment_id(payment_id)
+    if job is not None and job["status"] == "awaiting_payment":
+        store.update(job["job_id"], payment_status=state or "pending")
+
+
+def create_app(agent: MasumiAgent, **fastapi_kwargs) -> FastAPI:
+    """
+    Builds the FastAPI app serving one agent under the MIP-003 endpoints
+
+    Args:
+        agent: The agent to serve
+        fastapi_kwargs: Passed on to FastAPI(), e.g. a custom title
+
+    Returns:
+        The app, ready for `uvicorn main:app`
+    """
+    fastapi_kwargs.setdefault("title", "API following the Masumi API Standard")
+    fastapi_kwargs.setdefault("description", "API for running Agentic Services tasks with Masumi payment integration")
+    fastapi_kwargs.setdefault("version", "1.0.0")
+    app = FastAPI(lifespan=lifespan, **fastapi_kwargs)
+
+    server = AgentServer(agent)
+    app.include_router(server.router)
+    app.state.agent_server = server
+    return app